@@ -12,7 +12,8 @@ from pyparsing import srange
 from torch import ScriptDict
 
 from matharena.configs import extract_existing_configs
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, dump_json_zst, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file, save_runs_file
 from matharena.utils import normalize_conversation
 
 """
@@ -83,7 +84,7 @@ def analyze_run(competition, models):
             if not problem_file.endswith(OUTPUT_JSON_SUFFIX):
                 continue
             problem_idx = int(problem_file.removesuffix(OUTPUT_JSON_SUFFIX))
-            data = load_json_zst(os.path.join(model_comp_dir, problem_file))
+            data = load_runs_file(os.path.join(model_comp_dir, problem_file))
             results[f"{human_readable_ids[config_path]}"][problem_idx] = data
     return results
 
@@ -855,7 +856,7 @@ def override_result(model, problem_name, run_idx):
     if not os.path.exists(json_path):
         return redirect(url_for("problem_view", model=model, problem_name=problem_name))
 
-    data = load_json_zst(json_path)
+    data = load_runs_file(json_path)
 
     correct = data.get("correct", [])
     if not isinstance(correct, list) or run_idx >= len(correct):
@@ -892,7 +893,7 @@ def override_result(model, problem_name, run_idx):
     except Exception:
         data["pass_at_1"] = data.get("pass_at_1")
 
-    dump_json_zst(data, json_path, ensure_ascii=False, indent=4)
+    save_runs_file(data, json_path)
 
     if model in results and int(problem_name) in results[model]:
         results[model][int(problem_name)]["correct"] = correct
@@ -974,7 +975,7 @@ def override_judgment(model, problem_name, run_idx, judge_idx):
 
     config_path = model_id_to_config_path[model]
     json_path = os.path.join(args.output_folder, current_comp, config_path, f"{problem_name}{OUTPUT_JSON_SUFFIX}")
-    data = load_json_zst(json_path)
+    data = load_runs_file(json_path)
 
     judgment_rows, legacy_shape = _judgment_rows(data.get("judgment", []))
     judge_pos = judge_idx - 1
@@ -1007,7 +1008,7 @@ def override_judgment(model, problem_name, run_idx, judge_idx):
     data.pop("judgment_manual_overwrite", None)
     _sync_manual_judgment_override(data, run_idx, updated_entry)
 
-    dump_json_zst(data, json_path, ensure_ascii=False, indent=4)
+    save_runs_file(data, json_path)
 
     if model in results and int(problem_name) in results[model]:
         results[model][int(problem_name)]["judgment"] = data["judgment"]
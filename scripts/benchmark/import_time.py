@@ -0,0 +1,111 @@
+"""
+Import-time benchmark: imports matharena entry points in fresh interpreters, reports the slowest imports and fails
+if an import takes longer than --max-seconds or loads a backend/tool dependency that should only load on use.
+
+Example:
+    uv run python scripts/benchmark/import_time.py
+    uv run python scripts/benchmark/import_time.py --modules matharena.runner --max-seconds 2 --top 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MODULES = ["matharena.runner", "matharena.api_client", "matharena.grader", "matharena.solvers.judges"]
+
+# Provider SDKs and tool dependencies that must only be imported once a config uses them
+LAZY_DEPENDENCIES = [
+    "anthropic",
+    "aristotlelib",
+    "axle",
+    "datasets",
+    "docker",
+    "fitz",
+    "httpx",
+    "lean_explore",
+    "modal",
+    "openai",
+    "together",
+    "transformers",
+    "vllm",
+]
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Returns (module, self_us, cumulative_us) for each line of `python -X importtime` output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure(module, env):
+    """Imports module in a fresh interpreter.
+
+    Returns:
+        tuple: (seconds, loaded module names, importtime entries), or None if the import failed.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SNIPPET.format(module=module)],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        errors = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+        print("\n".join(errors)[-3000:], file=sys.stderr)
+        return None
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    return result["seconds"], result["modules"], parse_importtime(process.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure and check the import time of matharena modules.")
+    parser.add_argument("--modules", type=str, nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh imports per module; the fastest one counts")
+    parser.add_argument("--max-seconds", type=float, default=3.0, help="Fail if an import takes longer")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to report per module")
+    args = parser.parse_args()
+
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join([os.path.join(REPO_ROOT, "src"), env.get("PYTHONPATH", "")])
+
+    report, failures = {}, []
+    for module in args.modules:
+        runs = [measure(module, env) for _ in range(args.repeat)]
+        if any(run is None for run in runs):
+            failures.append(f"{module}: import failed")
+            continue
+        seconds, loaded, entries = min(runs, key=lambda run: run[0])
+        eager = [dep for dep in LAZY_DEPENDENCIES if dep in loaded]
+        slowest = sorted(entries, key=lambda entry: entry[2], reverse=True)[: args.top]
+        report[module] = {
+            "seconds": round(seconds, 3),
+            "modules_loaded": len(loaded),
+            "eager_dependencies": eager,
+            "slowest_imports": [{"module": name, "cumulative_ms": round(cum / 1000, 1)} for name, _, cum in slowest],
+        }
+        if seconds > args.max_seconds:
+            failures.append(f"{module}: import took {seconds:.2f}s (limit {args.max_seconds}s)")
+        if eager:
+            failures.append(f"{module}: imports {', '.join(eager)} at module load")
+
+    print(json.dumps(report, indent=4))
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
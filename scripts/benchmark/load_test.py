@@ -0,0 +1,207 @@
+"""
+Load test of the full scripts/run.py pipeline (runner -> solver -> grader -> Runs) against the local mock provider.
+
+Example:
+    uv run python scripts/benchmark/load_test.py --concurrency 200 --n-problems 50 --n 8 --ttft lognormal:2,0.5
+    uv run python scripts/benchmark/load_test.py --serve-only --port 8000  # point a model config at it yourself
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+from loguru import logger
+
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.mock_provider import MockProvider, start_mock_provider
+from matharena.runs import load_runs_file
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EXECUTE_CODE_TOOL = {
+    "tool_spec": {
+        "type": "function",
+        "function": {
+            "name": "execute_code",
+            "description": "Executes the code in the given language and returns the standard output and error.",
+            "parameters": {
+                "type": "object",
+                "properties": {"code": {"type": "string"}, "lang": {"type": "string"}},
+                "required": ["code", "lang"],
+            },
+        },
+    }
+}
+
+
+def _percentile(values, q):
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * q // 100)]
+
+
+def write_synthetic_competition(root, n_problems, tools):
+    """Writes a final-answer competition whose problems carry the answer hint understood by the mock provider."""
+    data_dir = os.path.join(root, "data")
+    os.makedirs(os.path.join(data_dir, "problems"), exist_ok=True)
+    with open(os.path.join(data_dir, "answers.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "answer"])
+        for problem_idx in range(1, n_problems + 1):
+            answer = random.randint(0, 999)
+            writer.writerow([problem_idx, answer])
+            with open(os.path.join(data_dir, "problems", f"{problem_idx}.tex"), "w") as f_problem:
+                f_problem.write(f"Synthetic load test problem {problem_idx}. [mock answer: {answer}]")
+
+    config = {
+        "instruction": "Put your final answer within \\boxed{{}}.",
+        "strict_parsing": False,
+        "n_problems": n_problems,
+        "dataset_path": data_dir,
+    }
+    if tools:
+        config["tools"] = [EXECUTE_CODE_TOOL]
+        config["max_tool_calls"] = 3
+    os.makedirs(os.path.join(root, "comp_configs", "mock"), exist_ok=True)
+    with open(os.path.join(root, "comp_configs", "mock", "load_test.yaml"), "w") as f:
+        yaml.safe_dump(config, f)
+
+
+def write_model_config(root, args, base_url):
+    config = {
+        "model": "mock-model",
+        "human_readable_id": "mock-model",
+        "api": "anthropic" if args.wire_format == "messages" else "custom",
+        "base_url": base_url,
+        "max_tokens": args.max_tokens,
+        "read_cost": 1,
+        "write_cost": 1,
+        "concurrent_requests": args.concurrency,
+        "use_openai_responses_api": args.wire_format == "responses",
+        "stream_openai_chat_completions": args.wire_format == "stream",
+        "async_backend": args.async_backend,
+    }
+    config.update(json.loads(args.model_args))
+    os.makedirs(os.path.join(root, "model_configs", "mock"), exist_ok=True)
+    with open(os.path.join(root, "model_configs", "mock", "mock-model.yaml"), "w") as f:
+        yaml.safe_dump(config, f)
+
+
+def collect_run_stats(output_dir):
+    """Returns per-run request latencies and the number of correct runs from the saved Runs files."""
+    request_times, n_correct, n_runs = [], 0, 0
+    for path in glob.glob(os.path.join(output_dir, "**", f"*{OUTPUT_JSON_SUFFIX}"), recursive=True):
+        runs = load_runs_file(path)
+        n_runs += runs["N"]
+        n_correct += sum(1 for c in runs["correct"] if c is True)
+        request_times.extend(dc.get("request_time", 0) for dc in runs["detailed_costs"])
+    return n_runs, n_correct, request_times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark scripts/run.py against a local mock provider.")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent_requests of the model config")
+    parser.add_argument("--n-problems", type=int, default=30)
+    parser.add_argument("--n", type=int, default=4, help="Number of runs per problem")
+    parser.add_argument(
+        "--wire-format", type=str, default="chat", choices=["chat", "stream", "responses", "messages"]
+    )
+    parser.add_argument("--async-backend", action="store_true")
+    parser.add_argument("--tools", action="store_true", help="Offer execute_code (needs the code execution setup)")
+    parser.add_argument("--max-tokens", type=int, default=32000)
+    parser.add_argument("--model-args", type=str, default="{}", help="JSON dict of extra model config entries")
+
+    # Mock provider behaviour
+    parser.add_argument("--ttft", type=str, default="lognormal:0.5,0.5", help="e.g. fixed:1, uniform:0.5,2")
+    parser.add_argument("--output-tokens", type=int, default=2000, help="Mean generated tokens per turn")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Fraction answered with 500")
+    parser.add_argument("--tool-call-rate", type=float, default=0.0)
+    parser.add_argument("--correct-rate", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--serve-only", action="store_true", help="Only run the mock provider until interrupted")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    provider = MockProvider(
+        ttft=args.ttft,
+        output_tokens=args.output_tokens,
+        tokens_per_second=args.tokens_per_second,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate,
+        tool_call_rate=args.tool_call_rate,
+        correct_rate=args.correct_rate,
+        seed=args.seed,
+    )
+    server = start_mock_provider(provider, args.host, args.port)
+    base_url = f"http://{args.host}:{server.server_port}/v1"
+    if args.wire_format == "messages":
+        base_url = f"http://{args.host}:{server.server_port}"  # the Anthropic SDK appends /v1/messages itself
+
+    if args.serve_only:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory(prefix="matharena_load_test_") as root:
+        write_synthetic_competition(root, args.n_problems, args.tools)
+        write_model_config(root, args, base_url)
+        output_dir = os.path.join(root, "outputs")
+        command = [
+            sys.executable,
+            os.path.join(REPO_ROOT, "scripts", "run.py"),
+            "--comp", "mock/load_test",
+            "--models", "mock/mock-model",
+            "--n", str(args.n),
+            "--comp-configs-dir", os.path.join(root, "comp_configs"),
+            "--model-configs-dir", os.path.join(root, "model_configs"),
+            "--output-dir", output_dir,
+        ]  # fmt: skip
+        env = os.environ.copy()
+        env.setdefault("ANTHROPIC_API_KEY", "mock")
+        env["PYTHONPATH"] = os.pathsep.join([os.path.join(REPO_ROOT, "src"), env.get("PYTHONPATH", "")])
+
+        logger.info(f"Running {args.n_problems} problems x {args.n} runs at concurrency {args.concurrency}.")
+        start = time.time()
+        with open(os.path.join(root, "run.log"), "w") as log_file:
+            process = subprocess.run(command, cwd=root, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+        returncode = process.returncode
+        wall_time = time.time() - start
+        if returncode != 0:
+            with open(os.path.join(root, "run.log"), "r") as log_file:
+                print(log_file.read()[-5000:])
+            logger.error(f"scripts/run.py exited with code {returncode}.")
+
+        n_runs, n_correct, request_times = collect_run_stats(output_dir)
+
+    server_stats = provider.stats()
+    report = {
+        "wall_time": round(wall_time, 2),
+        "runs": n_runs,
+        "runs_expected": args.n_problems * args.n,
+        "runs_per_second": round(n_runs / wall_time, 3),
+        "accuracy": round(n_correct / n_runs, 3) if n_runs > 0 else None,
+        "run_latency_p50": _percentile(request_times, 50),
+        "run_latency_p90": _percentile(request_times, 90),
+        "run_latency_p99": _percentile(request_times, 99),
+        "run_latency_max": max(request_times) if request_times else None,
+        "provider_requests": server_stats["counts"],
+        "provider_latency_p50": server_stats["p50_latency"],
+        "provider_latency_p99": server_stats["p99_latency"],
+    }
+    print(json.dumps(report, indent=4))
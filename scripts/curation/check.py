@@ -9,7 +9,8 @@ from dotenv import load_dotenv
 from loguru import logger
 
 from matharena.api_client import APIClient
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, dump_json_zst, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file, save_runs_file
 from matharena.tools.lean_execution import get_executed_lean_submission_parts
 
 def _parse_bool(text):
@@ -147,7 +148,7 @@ def main():
 
     for json_path in _iter_json_files(output_root):
         total_files += 1
-        data = load_json_zst(json_path)
+        data = load_runs_file(json_path)
         file_cache[json_path] = data
 
         correct = data.get("correct", [])
@@ -194,7 +195,7 @@ def main():
                 continue
             data = file_cache[json_path]
             data["llm_annotation"][run_idx] = parsed
-            dump_json_zst(data, json_path, ensure_ascii=False, indent=4)
+            save_runs_file(data, json_path)
         logger.info(f"Processed {len(pending)} runs, total cost: {total_cost:.4f}")
 
 if __name__ == "__main__":
@@ -31,6 +31,7 @@ from pathlib import Path
 from typing import Any, Dict, List, Set
 
 from matharena.json_zst import OUTPUT_JSON_SUFFIX, dump_json_zst, load_json_zst
+from matharena.runs import compact_run_log
 
 TEXT_DIRECTORIES = ("problems", "original", "proofs")
 
@@ -258,6 +259,8 @@ def reorder_json_outputs(outputs_dir: str, permutation: List[int]):
     for subdir in outputs_path.rglob("*"):
         if subdir.is_dir() and any(subdir.glob(f"*{OUTPUT_JSON_SUFFIX}")):
             print(f"Processing JSON files in {subdir}")
+            for json_file in subdir.glob(f"*{OUTPUT_JSON_SUFFIX}"):
+                compact_run_log(json_file)  # run logs are named after the problem too
             reorder_files(str(subdir), permutation, OUTPUT_JSON_SUFFIX, update_json_content=True)
 
 def update_csv_files(source_csv_path: str, source_metadata_csv_path: str, answers_csv_path: str,
@@ -456,6 +459,8 @@ def update_json_outputs(outputs_dir: str, ids_to_remove: Set[int],
     for subdir in outputs_path.rglob("*"):
         if subdir.is_dir() and any(subdir.glob(f"*{OUTPUT_JSON_SUFFIX}")):
             print(f"Processing JSON files in {subdir}")
+            for json_file in subdir.glob(f"*{OUTPUT_JSON_SUFFIX}"):
+                compact_run_log(json_file)  # run logs are named after the problem too
             
             # Remove files for deleted problems
             for problem_id in ids_to_remove:
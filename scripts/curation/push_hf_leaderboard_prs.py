@@ -8,7 +8,8 @@ from huggingface_hub import CommitOperationAdd, HfApi
 from loguru import logger
 
 from matharena.configs import load_configs
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file
 
 
 def load_pr_registry(state_file: Path) -> dict:
@@ -60,7 +61,7 @@ def compute_average_score(output_dir: Path, n_problems: int) -> float | None:
             logger.warning(f"Missing output file {result_path}, skipping this model/competition pair.")
             return None
 
-        problem_result = load_json_zst(result_path)
+        problem_result = load_runs_file(result_path)
 
         correct_values = problem_result.get("correct")
         if not isinstance(correct_values, list):
@@ -5,7 +5,8 @@ import yaml
 import json
 from loguru import logger
 import sys
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file
 # only log errors
 logger.remove()
 logger.add(sys.stderr, level="ERROR")
@@ -31,7 +32,7 @@ if __name__ == "__main__":
         path_to_json_files = os.path.join(args.output_folder, comp, f"**/*{OUTPUT_JSON_SUFFIX}")
         json_files = glob.glob(path_to_json_files, recursive=True)
         for json_file in json_files:
-            data = load_json_zst(json_file)
+            data = load_runs_file(json_file)
             gold_answer = data["gold_answer"]
             list_answer = "," in str(gold_answer)
             try:
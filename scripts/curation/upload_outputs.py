@@ -7,7 +7,8 @@ from loguru import logger
 import yaml
 import shutil
 
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file
 
 
 if __name__ == "__main__":
@@ -68,7 +69,7 @@ if __name__ == "__main__":
                 continue
             file_name = os.path.join(folder_model, file)
             problem_name = file.removesuffix(OUTPUT_JSON_SUFFIX)
-            data = load_json_zst(file_name)
+            data = load_runs_file(file_name)
             gold_answer = data["gold_answer"]
             problem = data["problem"] if not args.visual_dataset else f"{problem_name}.png"
             problem_key = "problem" if not args.visual_dataset else "file_name"
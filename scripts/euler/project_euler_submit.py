@@ -21,7 +21,8 @@ from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 import pandas as pd
 import subprocess
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file
 
 load_dotenv()
 
@@ -173,7 +174,7 @@ def main():
 
     all_answers = []
     for file in files:
-        data = load_json_zst(file)
+        data = load_runs_file(file)
         print(file, data.get("answers", []))
         all_answers.extend(data.get("answers", []))
 
@@ -11,7 +11,8 @@ from matplotlib import rcParams
 from human_score_data import human_scores
 from datetime import datetime
 
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file
 
 rcParams['pdf.fonttype'] = 42
 rcParams['ps.fonttype'] = 42
@@ -109,7 +110,7 @@ def get_scores(comps, output_folder, competition_config_folder, all_existing_con
                 if not os.path.exists(output_path):
                     logger.warning(f"File {output_path} does not exist")
                     break
-                results_prob = load_json_zst(output_path)
+                results_prob = load_runs_file(output_path)
                 correct = results_prob["correct"] if "usamo" not in comp else [
                     judgment["points"] / 7 for judgment in results_prob["judgment"][0]
                 ]
@@ -4,7 +4,8 @@ import os
 import glob
 import numpy as np
 
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file
 
 output_folder = "outputs/imo/imo_2025"
 
@@ -12,7 +13,7 @@ results = dict()
 costs = dict()
 
 for file in glob.glob(os.path.join(output_folder, f"**/*{OUTPUT_JSON_SUFFIX}"), recursive=True):
-    data = load_json_zst(file)
+    data = load_runs_file(file)
     problem_idx = os.path.basename(file).removesuffix(OUTPUT_JSON_SUFFIX)
     model_name = os.path.basename(os.path.dirname(file))
     if model_name not in results:
@@ -4,7 +4,8 @@ import os
 import glob
 import numpy as np
 import yaml
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file
 output_folders = [
     "outputs/aime/aime_2025",
     "outputs/hmmt/hmmt_feb_2025",
@@ -17,7 +18,7 @@ output_tokens = dict()
 
 for output_folder in output_folders:
     for file in glob.glob(os.path.join(output_folder, f"**/*{OUTPUT_JSON_SUFFIX}"), recursive=True):
-        data = load_json_zst(file)
+        data = load_runs_file(file)
         problem_idx = os.path.basename(file).removesuffix(OUTPUT_JSON_SUFFIX)
         config_path_model = os.path.dirname(file).replace(output_folder, "configs/models") + ".yaml"
         with open(config_path_model, "r") as cf:
@@ -10,7 +10,8 @@ import pandas as pd
 from collections import Counter
 from itertools import chain
 
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file
 
 
 def get_latex_model_name(model):
@@ -95,7 +96,7 @@ def analyze_run(args, competition):
                 if not problem_file.endswith(OUTPUT_JSON_SUFFIX):
                     continue
                 problem_idx = int(problem_file.removesuffix(OUTPUT_JSON_SUFFIX))
-                data = load_json_zst(os.path.join(model_comp_dir, problem_file))
+                data = load_runs_file(os.path.join(model_comp_dir, problem_file))
                 results[f"{human_readable_ids[config_path]}"][problem_idx] = data
         return results
     else:
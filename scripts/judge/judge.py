@@ -8,9 +8,9 @@ from datasets import load_dataset
 from dotenv import load_dotenv
 from loguru import logger
 
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, dump_json_zst, load_json_zst, output_json_stem
+from matharena.json_zst import OUTPUT_JSON_SUFFIX, output_json_stem
+from matharena.runs import load_runs_file, save_runs_file
 from matharena.solvers.judges import JudgePool
-from matharena.tools.code_execution import execute_code
 
 
 def load_original_statement(dataset_path, problem_idx):
@@ -149,7 +149,7 @@ def main():
 
     runs_cache = {}
     for path in sorted(output_root.glob(f"**/*{OUTPUT_JSON_SUFFIX}"), key=output_json_stem):
-        runs_cache[path] = load_json_zst(path)
+        runs_cache[path] = load_runs_file(path)
 
     problem_filter = set(args.problem_ids) if args.problem_ids else None
 
@@ -245,7 +245,7 @@ def main():
                 continue
             run_data["judgment"][write_slot][run_idx] = parsed
             recompute_correct_and_pass_at_1(run_data)
-            dump_json_zst(run_data, path, indent=4, ensure_ascii=False)
+            save_runs_file(run_data, path)
             touched.add(path)
             cost = float(judge_response.detailed_cost.get("cost", 0.0))
             total_cost += cost
@@ -1,13 +1,23 @@
 import argparse
+import functools
 import json
+import time
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from loguru import logger
 
 
+from matharena.batch_ordering import order_batch, ordering_policies
+from matharena.grading_pipeline import DEFAULT_GRADING_WORKERS, grading_pipeline
+from matharena.image_store import image_store
+from matharena.progress import DEFAULT_PROGRESS_PATH, progress_tracker
 from matharena.request_logger import request_logger
+from matharena.response_cache import response_cache
 from matharena.runner import Runner
 from matharena.solvers import PureModelSolver, SolverResponse
+from matharena.work_queue import DEFAULT_CLAIM_SIZE, DEFAULT_LEASE_SECONDS, WorkQueue
 
 def _client_signature(client_args):
     # Share one run_queries call only for compatible APIClient configs.
@@ -24,20 +34,48 @@ def _client_signature(client_args):
     return json.dumps(normalized, sort_keys=True, default=str)
 
 
-def _run_combined_pure_model_group(model_name, group):
+def _provider(client_args):
+    # Jobs of one provider share its rate limits; OpenAI-compatible endpoints are told apart by host
+    base_url = client_args.get("base_url")
+    if base_url:
+        return urlparse(base_url).netloc or base_url
+    return client_args.get("api", "openai")
+
+
+def _positive_int(value):
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return n
+
+
+def _run_combined_pure_model_group(model_name, group, ordering="problem", set_request_metadata=True):
     combined_queries = []
     combined_meta = []
+    combined_sample_indices = []
     global_batch_idx_to_problem_idx = {}
     shared_client = group[0][1]["solver"].client
 
-    for runner, prepared in group:
+    # Each batch is already ordered; order the runs of all competitions together so the policy spans the group
+    entries = [
+        (runner, prepared, local_idx) for runner, prepared in group for local_idx in range(len(prepared["batch"]))
+    ]
+    if len(group) > 1:
+        problems = [(runner.comp_name, prepared["batch_idx_to_problem_idx"][i]) for runner, prepared, i in entries]
+        estimates = [prepared["batch_estimates"][i] for _, prepared, i in entries]
+        entries = [entries[i] for i in order_batch(ordering, problems, estimates)]
+
+    for runner, prepared, local_idx in entries:
         solver = prepared["solver"]
-        for local_idx, stmt in enumerate(prepared["batch"]):
-            combined_queries.append(solver.build_query(stmt[0], stmt[1]))
-            combined_meta.append((runner, prepared, local_idx))
-            global_batch_idx_to_problem_idx[len(combined_meta) - 1] = prepared["batch_idx_to_problem_idx"][local_idx]
+        stmt = prepared["batch"][local_idx]
+        combined_queries.append(solver.build_query(stmt[0], stmt[1]))
+        combined_meta.append((runner, prepared, local_idx))
+        combined_sample_indices.append(prepared["batch_idx_to_sample_idx"][local_idx])
+        global_batch_idx_to_problem_idx[len(combined_meta) - 1] = prepared["batch_idx_to_problem_idx"][local_idx]
 
-    if len(group) > 1:
+    if not set_request_metadata:
+        pass
+    elif len(group) > 1:
         request_logger.set_metadata("multi", model_name, global_batch_idx_to_problem_idx)
     else:
         request_logger.set_metadata(group[0][0].comp_name, model_name, global_batch_idx_to_problem_idx)
@@ -45,10 +83,13 @@ def _run_combined_pure_model_group(model_name, group):
         f"Running a shared run_queries call for model {model_name}: {len(combined_queries)} queries across {len(group)} competitions."
     )
 
-    for global_idx, conversation, detailed_cost in shared_client.run_queries(combined_queries):
+    futures = []
+    for global_idx, conversation, detailed_cost in shared_client.run_queries(
+        combined_queries, sample_indices=combined_sample_indices
+    ):
         runner, prepared, local_idx = combined_meta[global_idx]
         solver_response = SolverResponse(local_idx, conversation, detailed_cost, history=None)
-        runner.process_solver_responses(
+        futures += runner.process_solver_responses(
             solver_name=prepared["solver_name"],
             solver=prepared["solver"],
             all_runs=prepared["all_runs"],
@@ -56,10 +97,113 @@ def _run_combined_pure_model_group(model_name, group):
             status_path=prepared["status_path"],
             solver_responses=[solver_response],
             print_final_status=False,
+            wait=False,
+            batch_idx_to_sample_idx=prepared["batch_idx_to_sample_idx"],
         )
+    grading_pipeline.wait(futures)
     for runner, prepared in group:
+        runner.compact_runs(prepared["all_runs"])
         runner.print_final_status(prepared["status_path"])
 
+def _run_agent_job(model_name, runner, prepared, set_request_metadata=True):
+    # Agent solvers cannot be merged into one run_queries call.
+    if set_request_metadata:
+        request_logger.set_metadata(runner.comp_name, model_name, prepared["batch_idx_to_problem_idx"])
+    responses = prepared["solver"].solve_batch(
+        prepared["batch"],
+        prepared["batch_idx_to_problem_idx"],
+        prepared["batch_idx_to_run_idx"],
+        sample_indices=[prepared["batch_idx_to_sample_idx"][i] for i in range(len(prepared["batch"]))],
+    )
+    runner.process_solver_responses(
+        solver_name=prepared["solver_name"],
+        solver=prepared["solver"],
+        all_runs=prepared["all_runs"],
+        batch_idx_to_problem_idx=prepared["batch_idx_to_problem_idx"],
+        status_path=prepared["status_path"],
+        solver_responses=responses,
+        batch_idx_to_sample_idx=prepared["batch_idx_to_sample_idx"],
+    )
+
+
+def _prepare_groups(model_name, runners):
+    """Prepares the model on every competition and groups the batches that can share one run_queries call.
+    Returns (group type, [(runner, prepared)]) pairs."""
+    prepared_runs = []
+    for runner in runners:
+        prepared = runner.prepare_run(model_name, set_request_metadata=False)
+        if prepared is not None:
+            prepared_runs.append((runner, prepared))
+
+    grouped = defaultdict(list)
+    for runner, prepared in prepared_runs:
+        solver = prepared["solver"]
+        if not isinstance(solver, PureModelSolver):
+            grouped[("agent", id(runner))].append((runner, prepared))
+            continue
+        signature = _client_signature(solver.default_api_client_args)
+        grouped[("pure_model", signature)].append((runner, prepared))
+    return [(group_key[0], group) for group_key, group in grouped.items()]
+
+
+def _run_group(model_name, group_type, group, ordering, set_request_metadata):
+    if group_type == "pure_model":
+        _run_combined_pure_model_group(model_name, group, ordering, set_request_metadata)
+    else:
+        _run_agent_job(model_name, *group[0], set_request_metadata)
+
+
+def _run_queue_job(model_name, runners, ordering, set_request_metadata, work_queue):
+    # Rounds of run slots claimed from the work queue, until every slot of the sweep is done; slots leased by other
+    # workers are waited for, and taken over if their lease expires
+    while True:
+        groups = _prepare_groups(model_name, runners)
+        for group_type, group in groups:
+            try:
+                _run_group(model_name, group_type, group, ordering, set_request_metadata)
+            finally:
+                for runner, prepared in group:
+                    runner.release_claims(prepared)
+        if len(groups) > 0:
+            continue
+        outstanding = sum(work_queue.outstanding(runner.comp_name, model_name) for runner in runners)
+        if outstanding == 0:
+            logger.info(f"All run slots of {model_name} in the work queue are done.")
+            return
+        logger.info(f"{outstanding} run slots of {model_name} are leased by other workers, waiting for them.")
+        time.sleep(work_queue.lease_seconds / 3)
+
+
+def _run_jobs(jobs, max_concurrent_jobs, provider_limits, default_provider_limit):
+    """Runs (name, provider, fn) jobs concurrently, at most max_concurrent_jobs in total and at most the provider's
+    limit per provider, starting them in the given order. Returns the names of the jobs that failed."""
+    pending, running, failed = list(jobs), {}, []
+    running_per_provider = defaultdict(int)
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrent_jobs), thread_name_prefix="run-job") as executor:
+        while len(pending) > 0 or len(running) > 0:
+            for job in list(pending):
+                if len(running) >= max_concurrent_jobs:
+                    break
+                name, provider, fn = job
+                if running_per_provider[provider] >= provider_limits.get(provider, default_provider_limit):
+                    continue
+                pending.remove(job)
+                running_per_provider[provider] += 1
+                logger.info(f"Starting {name} (provider {provider}, {len(running) + 1} jobs running).")
+                running[executor.submit(fn)] = job
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, provider, _ = running.pop(future)
+                running_per_provider[provider] -= 1
+                try:
+                    future.result()
+                    logger.info(f"Finished {name}.")
+                except Exception as e:
+                    logger.opt(exception=True).error(f"{name} failed: {e}")
+                    failed.append(name)
+    return failed
+
+
 if __name__ == "__main__":
     load_dotenv()
 
@@ -98,7 +242,113 @@ if __name__ == "__main__":
     parser.add_argument("--comp-configs-dir", type=str, default="configs/competitions")
     parser.add_argument("--model-configs-dir", type=str, default="configs/models")
     parser.add_argument("--output-dir", type=str, default="outputs")
+
+    # Response cache (see matharena/response_cache.py)
+    parser.add_argument(
+        "--cache", action="store_true", help="Serve identical requests from the response cache and store new responses"
+    )
+    parser.add_argument(
+        "--replay", action="store_true", help="Serve all requests from the response cache, failing on a miss"
+    )
+    parser.add_argument("--cache-dir", type=str, default="logs/cache")
+
+    # Submission order of the runs (see matharena/batch_ordering.py)
+    parser.add_argument(
+        "--ordering",
+        type=str,
+        default="problem",
+        choices=ordering_policies(),
+        help="Order in which runs are submitted, estimated from the detailed costs of earlier runs",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=None,
+        help="Maximum expected cost in USD per competition and model (with --ordering cheapest_first)",
+    )
+    parser.add_argument(
+        "--grading-workers",
+        type=int,
+        default=DEFAULT_GRADING_WORKERS,
+        help="Processes that grade responses while the API calls continue (0 grades on the consuming threads)",
+    )
+    parser.add_argument(
+        "--progress-port",
+        type=int,
+        default=None,
+        help="Serve the JSON progress feed of all competitions and models on http://127.0.0.1:PORT/",
+    )
+    parser.add_argument("--progress-file", type=str, default=DEFAULT_PROGRESS_PATH, help="Where to write the feed")
+    parser.add_argument(
+        "--image-max-pixels",
+        type=int,
+        default=None,
+        help="Downscale problem images with more pixels to at most this many before sending them",
+    )
+    parser.add_argument(
+        "--image-max-bytes",
+        type=int,
+        default=None,
+        help="Re-encode (and if needed downscale) problem images larger than this many bytes to fit",
+    )
+
+    # Scheduling of the (model, competition) jobs
+    parser.add_argument(
+        "--max-concurrent-jobs",
+        type=_positive_int,
+        default=1,
+        help="Models (jobs) running at the same time across all providers; 1 runs models one after another. With "
+        "more, request logs of concurrent jobs go to logs/requests/multi/multi",
+    )
+    parser.add_argument(
+        "--provider-concurrency",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Per-provider job limits in the form provider=n (e.g. openai=2); providers are APIs or base URL hosts",
+    )
+    parser.add_argument(
+        "--default-provider-concurrency",
+        type=_positive_int,
+        default=1,
+        help="Jobs running at the same time per provider",
+    )
+
+    # Work queue shared by several workers (see matharena/work_queue.py)
+    parser.add_argument(
+        "--work-queue",
+        type=str,
+        default=None,
+        help="Directory on a shared filesystem; all run.py processes given the same directory split the sweep",
+    )
+    parser.add_argument(
+        "--worker-id",
+        type=str,
+        default=None,
+        help="Name of this worker in the work queue leases and journals, unique per worker and kept across restarts "
+        "(required with --work-queue)",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+        help="Seconds without a heartbeat after which other workers take over a claimed run slot",
+    )
+    parser.add_argument(
+        "--claim-size",
+        type=int,
+        default=DEFAULT_CLAIM_SIZE,
+        help="Run slots a worker claims per competition and model at a time",
+    )
     args = parser.parse_args()
+    grading_pipeline.configure(workers=args.grading_workers)
+    progress_tracker.configure(feed_path=args.progress_file, port=args.progress_port)
+    image_store.configure(max_pixels=args.image_max_pixels, max_bytes=args.image_max_bytes)
+
+    if args.replay:
+        response_cache.configure("replay", args.cache_dir)
+    elif args.cache:
+        response_cache.configure("readwrite", args.cache_dir)
 
     comp_n_overrides = {}
     for override in args.comp_n:
@@ -112,6 +362,15 @@ if __name__ == "__main__":
         except ValueError as exc:
             raise ValueError(f"Invalid n in --comp-n override '{override}'.") from exc
 
+    work_queue = None
+    if args.work_queue is not None:
+        if args.worker_id is None:
+            # A restarted worker finds its leases and the responses it journaled (see matharena/response_journal.py)
+            # only under the same ID
+            raise ValueError("--work-queue requires a --worker-id that stays the same when the worker is restarted.")
+        work_queue = WorkQueue(args.work_queue, args.worker_id, args.lease_seconds, args.claim_size)
+        logger.info(f"Running as worker {work_queue.worker_id} of the work queue in {args.work_queue}")
+
     logger.info(f"Initializing runners for competitions: {args.comp}")
     runners = [
         Runner(
@@ -122,47 +381,52 @@ if __name__ == "__main__":
             args.model_configs_dir,
             args.output_dir,
             args.redo_all,
+            ordering=args.ordering,
+            budget=args.budget,
+            work_queue=work_queue,
         )
         for comp in args.comp
     ]
 
-    # Run each model
+    provider_limits = {}
+    for limit in args.provider_concurrency:
+        if "=" not in limit:
+            raise ValueError(f"Invalid --provider-concurrency entry '{limit}'. Expected format provider=n.")
+        provider, n_value = limit.split("=", 1)
+        try:
+            provider_limits[provider] = _positive_int(n_value)
+        except (ValueError, argparse.ArgumentTypeError) as exc:
+            raise ValueError(f"Invalid job limit in --provider-concurrency entry '{limit}'.") from exc
+
+    # Prepare all (model, competition) pairs up front, then run the jobs of different providers concurrently
+    jobs = []
     for model in args.models:
+        if work_queue is not None:
+            # One job per model that claims rounds of run slots on all competitions
+            model_config = runners[0].load_solver_config(f"{args.model_configs_dir}/{model}.yaml")["model_config"]
+            jobs.append((model, ", ".join(args.comp), "queue", _provider(model_config), runners))
+            continue
         logger.info(f"Calling runner for model: {model}")
-        prepared_runs = []
-        for runner in runners:
-            prepared = runner.prepare_run(model)
-            if prepared is not None:
-                prepared_runs.append((runner, prepared))
-
-        if len(prepared_runs) == 0:
+        groups = _prepare_groups(model, runners)
+        if len(groups) == 0:
             logger.info(f"No pending runs for model {model} in the selected competitions.")
             continue
+        for group_type, group in groups:
+            comps = ", ".join(runner.comp_name for runner, _ in group)
+            provider = _provider(group[0][1]["solver"].default_api_client_args)
+            jobs.append((model, comps, group_type, provider, group))
 
-        grouped = defaultdict(list)
-        for runner, prepared in prepared_runs:
-            solver = prepared["solver"]
-            if not isinstance(solver, PureModelSolver):
-                grouped[("agent", id(runner))].append((runner, prepared))
-                continue
-            signature = _client_signature(solver.default_api_client_args)
-            grouped[("pure_model", signature)].append((runner, prepared))
-
-        for group_key, group in grouped.items():
-            group_type = group_key[0]
-            if group_type == "pure_model":
-                _run_combined_pure_model_group(model, group)
-            else:
-                # Agent solvers cannot be merged into one run_queries call.
-                runner, prepared = group[0]
-                responses = prepared["solver"].solve_batch(
-                    prepared["batch"], prepared["batch_idx_to_problem_idx"], prepared["batch_idx_to_run_idx"]
-                )
-                runner.process_solver_responses(
-                    solver_name=prepared["solver_name"],
-                    solver=prepared["solver"],
-                    all_runs=prepared["all_runs"],
-                    batch_idx_to_problem_idx=prepared["batch_idx_to_problem_idx"],
-                    status_path=prepared["status_path"],
-                    solver_responses=responses,
-                )
+    # The request logger holds one global batch mapping, so only sequential runs get per-batch request logs
+    sequential = args.max_concurrent_jobs <= 1 or len(jobs) <= 1
+    if not sequential:
+        request_logger.set_metadata("multi", "multi", None)
+    scheduled = []
+    for model, comps, group_type, provider, group in jobs:
+        if group_type == "queue":
+            fn = functools.partial(_run_queue_job, model, group, args.ordering, sequential, work_queue)
+        else:
+            fn = functools.partial(_run_group, model, group_type, group, args.ordering, sequential)
+        scheduled.append((f"{model} on {comps}", provider, fn))
+    failed = _run_jobs(scheduled, args.max_concurrent_jobs, provider_limits, args.default_provider_concurrency)
+    if len(failed) > 0:
+        raise RuntimeError(f"{len(failed)} of {len(scheduled)} jobs failed: {', '.join(failed)}")
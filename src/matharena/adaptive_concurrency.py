@@ -0,0 +1,210 @@
+"""
+Adaptive (AIMD) concurrency limits per provider endpoint, shared by all APIClients in the process.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+from loguru import logger
+
+
+def classify_api_error(e):
+    """Classifies an API exception for congestion control.
+
+    Args:
+        e (Exception): The exception raised by an SDK call.
+
+    Returns:
+        str: "rate_limited" for 429s, "server_error" for 5xx, "connection_error" for connection failures and
+            timeouts, "error" otherwise.
+    """
+    status_code = getattr(e, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(e, "response", None), "status_code", None)
+    if status_code == 429 or type(e).__name__ == "RateLimitError":
+        return "rate_limited"
+    if isinstance(status_code, int) and status_code >= 500:
+        return "server_error"
+    if "rate limit" in str(e).lower() or "429" in str(e):
+        return "rate_limited"
+    if isinstance(e, (ConnectionError, TimeoutError)) or any(
+        kind in type(e).__name__ for kind in ["Connection", "Timeout"]
+    ):
+        return "connection_error"
+    return "error"
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Bounds the number of in-flight requests to one provider endpoint with an AIMD window.
+    The window grows on every success (doubling per round trip until the first congestion signal, then by one per
+    round trip) and is cut multiplicatively on rate limits and server errors. Usable from threads and coroutines.
+    """
+
+    def __init__(self, name, initial_window, max_window, min_window=1, decrease_factor=0.5, throughput_period=60):
+        """
+        Args:
+            name (str): Name of the endpoint, for logging.
+            initial_window (int): The starting number of allowed in-flight requests.
+            max_window (int): The ceiling for the window.
+            min_window (int, optional): The floor for the window. Defaults to 1.
+            decrease_factor (float, optional): Multiplier applied to the window on congestion. Defaults to 0.5.
+            throughput_period (int, optional): Seconds over which throughput is measured. Defaults to 60.
+        """
+        self.name = name
+        self.min_window = min_window
+        self.max_window = max(max_window, min_window)
+        self.window = float(min(max(initial_window, min_window), self.max_window))
+        self.decrease_factor = decrease_factor
+        self.throughput_period = throughput_period
+
+        self._lock = threading.Lock()
+        self._waiters = deque()  # threading.Event or (loop, future)
+        self._in_flight = 0
+        self._slow_start = True
+        self._last_decrease = 0.0
+        self._completions = deque()
+        self._counts = {"success": 0, "rate_limited": 0, "server_error": 0, "error": 0}
+
+    def raise_ceiling(self, max_window):
+        """Raises the window ceiling if another client allows more concurrency for this endpoint."""
+        with self._lock:
+            self.max_window = max(self.max_window, max_window)
+            self._wake_waiters()
+
+    def acquire(self):
+        """Blocks until a slot in the window is free.
+
+        Returns:
+            float: The acquisition time, to be passed back to release.
+        """
+        with self._lock:
+            if len(self._waiters) == 0 and self._in_flight < int(self.window):
+                self._in_flight += 1
+                return time.monotonic()
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+        return time.monotonic()
+
+    async def acquire_async(self):
+        """Waits on the running event loop until a slot in the window is free.
+
+        Returns:
+            float: The acquisition time, to be passed back to release.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if len(self._waiters) == 0 and self._in_flight < int(self.window):
+                self._in_flight += 1
+                return time.monotonic()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:  # the slot was already handed to us
+                    self._in_flight -= 1
+                    self._wake_waiters()
+            raise
+        return time.monotonic()
+
+    def release(self, acquired_at, outcome):
+        """Frees a slot and updates the window.
+
+        Args:
+            acquired_at (float): The value returned by acquire.
+            outcome (str): "success", "rate_limited", "server_error", or another error (no window change).
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self._counts[outcome] = self._counts.get(outcome, 0) + 1
+            now = time.monotonic()
+            if outcome == "success":
+                self._completions.append(now)
+                if self._slow_start:
+                    self.window = min(self.window + 1, self.max_window)
+                else:
+                    self.window = min(self.window + 1 / self.window, self.max_window)
+            elif outcome in ["rate_limited", "server_error"] and acquired_at >= self._last_decrease:
+                # Only requests sent after the last cut count, so one burst of errors cuts the window once
+                old_window = self.window
+                self.window = max(self.window * self.decrease_factor, self.min_window)
+                self._slow_start = False
+                self._last_decrease = now
+                logger.warning(
+                    f"[{self.name}] Got {outcome}, reducing concurrency window {old_window:.1f} -> {self.window:.1f}."
+                )
+            self._wake_waiters()
+
+    def _wake_waiters(self):
+        # Must hold self._lock
+        while len(self._waiters) > 0 and self._in_flight < int(self.window):
+            waiter = self._waiters.popleft()
+            self._in_flight += 1
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                try:
+                    loop.call_soon_threadsafe(_resolve_future, future)
+                except RuntimeError:  # the waiting event loop is gone
+                    self._in_flight -= 1
+
+    def throughput(self):
+        """Returns the number of successful requests per minute over the last throughput_period seconds."""
+        with self._lock:
+            cutoff = time.monotonic() - self.throughput_period
+            while len(self._completions) > 0 and self._completions[0] < cutoff:
+                self._completions.popleft()
+            return len(self._completions) * 60 / self.throughput_period
+
+    def stats(self):
+        """Returns the current window, in-flight count, throughput and outcome counts."""
+        throughput = self.throughput()
+        with self._lock:
+            return {
+                "name": self.name,
+                "window": round(self.window, 2),
+                "max_window": self.max_window,
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiters),
+                "requests_per_minute": throughput,
+                **self._counts,
+            }
+
+
+def _resolve_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_adaptive_limiter(api, base_url, initial_window, max_window):
+    """Returns the process-wide limiter for a provider endpoint, creating it on first use.
+
+    Args:
+        api (str): The API of the client.
+        base_url (str): The base URL of the client (None for the SDK default).
+        initial_window (int): The starting window if the limiter is created.
+        max_window (int): The window ceiling requested by the client.
+
+    Returns:
+        AdaptiveConcurrencyLimiter: The limiter shared by all clients with this (api, base_url).
+    """
+    key = (api, base_url)
+    with _LIMITERS_LOCK:
+        if key not in _LIMITERS:
+            name = api if base_url is None else f"{api} @ {base_url}"
+            _LIMITERS[key] = AdaptiveConcurrencyLimiter(name, initial_window, max_window)
+            return _LIMITERS[key]
+    _LIMITERS[key].raise_ceiling(max_window)
+    return _LIMITERS[key]
@@ -1,32 +1,61 @@
 """This module provides a unified API for querying various large language models."""
 
+import asyncio
+import hashlib
 import inspect
 import json
 import os
-import tempfile
+import queue
+import threading
 import time
 import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ThreadPoolExecutor, wait
+from contextlib import nullcontext
 from datetime import datetime
 
-import anthropic
-import requests
-from anthropic.types import TextBlock, ThinkingBlock
-from anthropic.types.message_create_params import MessageCreateParamsNonStreaming
-from anthropic.types.messages.batch_create_params import Request
 from loguru import logger
-from openai import OpenAI, RateLimitError
-from together import Together
 from tqdm import tqdm
-from transformers import AutoTokenizer
 
+from matharena.adaptive_concurrency import classify_api_error, get_adaptive_limiter
+from matharena.batch_manager import AnthropicBatchBackend, BatchJobManager, OpenAIBatchBackend, batch_custom_id
+from matharena.circuit_breaker import CircuitOpenError, backoff_delay, get_circuit_breaker
+from matharena.client_pool import connection_stats, get_event_loop, get_http_session, get_sdk_client
+from matharena.hedging import HEDGE_CHECK_INTERVAL, HedgeCancelled, HedgePolicy, HedgeTicket
+from matharena.image_store import image_store, is_image_ref
+from matharena.plugins import lazy_import
+from matharena.prefix_cache import PrefixWarmup, group_by_prefix, prefix_group_stats, prefix_key, prompt_text
+from matharena.rate_limiter import estimate_request_tokens, get_rate_limiter
 from matharena.request_logger import request_logger
+from matharena.response_cache import response_cache
+from matharena.stream_watchdog import (
+    RequestMetrics,
+    StreamStalledError,
+    StreamTimer,
+    consume_stream,
+    consume_stream_async,
+    open_stream,
+    open_stream_async,
+    stream_timeout,
+)
+from matharena.token_counter import get_token_counter
+from matharena.tool_executor import tool_executor
 from matharena.utils import check_for_extra_keys
 
-try:
-    from vllm import LLM, SamplingParams
-except ImportError:
-    LLM = None
+# Provider SDKs are imported on first use, so only the backend a model config selects is loaded
+anthropic = lazy_import("anthropic")
+anthropic_types = lazy_import("anthropic.types")
+anthropic_message_params = lazy_import("anthropic.types.message_create_params")
+openai = lazy_import("openai")
+
+
+def _apportion(total, weights):
+    """Splits an integer total in proportion to weights, into integers that sum to total (largest remainders)."""
+    exact = [total * w / sum(weights) for w in weights]
+    shares = [int(x) for x in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: exact[i] - shares[i], reverse=True)
+    for i in by_remainder[: total - sum(shares)]:
+        shares[i] += 1
+    return shares
 
 
 class APIClient:
@@ -36,6 +65,8 @@ class APIClient:
         self,
         model,
         timeout=30000,
+        stall_timeout=None,
+        min_tokens_per_second=10,
         max_tokens=None,
         api="openai",
         api_key_env=None,
@@ -43,13 +74,29 @@ class APIClient:
         max_retries=3,
         max_retries_inner=25,
         concurrent_requests=30,
+        adaptive_concurrency=False,
+        max_concurrent_requests=None,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_connections=None,
+        max_keepalive_connections=None,
         no_system_messages=False,
         context_limit=None,
+        tokenizer=None,
         background=False,
         read_cost=1,
         cache_read_cost=None,
         write_cost=1,
         sleep_on_error=60,
+        circuit_breaker_threshold=5,
+        retry_budget_ratio=0.2,
+        max_circuit_wait=3600,
+        hedge_after=None,
+        hedge_percentile=90,
+        prefix_caching=False,
+        prefix_warmup=5,
+        min_prefix_chars=1000,
+        max_choices_per_request=1,
         sleep_after_request=0.1,
         include_max_tool_calls=True,
         throw_error_on_failure=False,
@@ -59,7 +106,11 @@ class APIClient:
         use_openai_responses_api=False,
         use_gdm_tools=False,
         stream_openai_chat_completions=False,
+        async_backend=False,
         max_tool_calls=0,
+        tool_concurrency=None,
+        tool_timeouts=None,
+        max_parallel_tool_calls=8,
         cache_write_cost=0,
         tools=None,
         **kwargs,
@@ -69,15 +120,58 @@ class APIClient:
         Args:
             model (str): The name of the model to use.
             timeout (int, optional): The timeout for API requests in seconds. Defaults to 9000.
+            stall_timeout (float, optional): Seconds without a stream event (counted from when the request is sent,
+                so it also bounds the wait for the first byte) after which a streamed request is aborted and retried.
+                Non-streaming requests get their timeout lowered to stall_timeout plus the time to
+                generate max_tokens at min_tokens_per_second. Defaults to None (only timeout applies).
+            min_tokens_per_second (float, optional): Slowest output throughput expected from the provider, used to
+                bound non-streaming requests when stall_timeout is set. Defaults to 10.
             max_tokens (int, optional): The maximum number of tokens to generate. Defaults to None.
             api (str, optional): The API to use. Defaults to 'openai'.
             max_retries (int, optional): The maximum number of retries for a failed query. Defaults to 50.
             concurrent_requests (int, optional): The number of concurrent requests to make. Defaults to 30.
+            adaptive_concurrency (bool, optional): Whether to adapt the number of in-flight requests to the provider
+                (AIMD, shared per api and base_url), starting from concurrent_requests. Defaults to False.
+            max_concurrent_requests (int, optional): The ceiling for adaptive concurrency.
+                Defaults to 4 * concurrent_requests.
+            requests_per_minute (int, optional): Request budget shared by all clients with the same API key and
+                base URL in this process. Defaults to None (no limit).
+            tokens_per_minute (int, optional): Token budget (estimated input + max output tokens reserved per
+                request, unused tokens refunded) shared like requests_per_minute. Defaults to None (no limit).
+            max_connections (int, optional): Size of the HTTP connection pool of the shared SDK client.
+            max_keepalive_connections (int, optional): Idle connections kept alive by the shared SDK client.
+                Defaults to the maximum number of in-flight requests (at least 100).
             no_system_messages (bool, optional): Whether to disable system messages. Defaults to False.
+            context_limit (int, optional): Context window (prompt + output tokens) of the model. Queries whose prompt
+                alone exceeds it are not sent, and max output tokens are lowered so requests fit. Defaults to None.
+            tokenizer (str, optional): tiktoken encoding (e.g. "o200k_base") or Hugging Face tokenizer used to count
+                prompt tokens locally. Defaults to the encoding of OpenAI model families, otherwise an estimate from
+                the text length.
             read_cost (int, optional): The cost of reading a token. Defaults to 1.
             cache_read_cost (int, optional): The cost of reading a cached input token. Defaults to read_cost.
             write_cost (int, optional): The cost of writing a token. Defaults to 1.
-            sleep_on_error (int, optional): The number of seconds to sleep on an error. Defaults to 60.
+            sleep_on_error (int, optional): The maximum backoff in seconds between retries (backoff is exponential with
+                jitter). Defaults to 60.
+            circuit_breaker_threshold (int, optional): Consecutive 5xx/connection errors after which the circuit breaker
+                of this api and base_url opens and requests wait for a successful probe. 0 disables it. Defaults to 5.
+            retry_budget_ratio (float, optional): Retries allowed per request sent to this api and base_url,
+                beyond which retries wait for budget. Defaults to 0.2.
+            max_circuit_wait (int, optional): Seconds a request waits for an open circuit before failing.
+                Defaults to 3600.
+            hedge_after (float, optional): Fraction of a run_queries batch that must be finished before straggling
+                queries are duplicated (the first copy to finish wins). Defaults to None (no hedging).
+            hedge_percentile (float, optional): Percentile of the batch's finished request times a query must exceed
+                to be duplicated. Defaults to 90.
+            prefix_caching (bool, optional): Whether to group queries by their first min_prefix_chars prompt characters,
+                send one query per group first so it warms the provider's prompt cache, and add prompt cache hints
+                (prompt_cache_key for OpenAI, cache_control for Anthropic). Defaults to False.
+            prefix_warmup (float, optional): Seconds the rest of a group waits after its first query started (or
+                until it finished). Defaults to 5.
+            min_prefix_chars (int, optional): Length of the shared prompt prefix that puts queries in one group.
+                Defaults to 1000.
+            max_choices_per_request (int, optional): Identical queries of a batch are sent as one chat completions
+                request with up to this many choices (n), and the request's usage is split across them. Only for
+                OpenAI-compatible chat completions without tools. Defaults to 1 (one request per query).
             sleep_after_request (float, optional): The number of seconds to sleep after a request. Defaults to 0.1.
             throw_error_on_failure (bool, optional): Whether to throw an error on failure. Defaults to False.
             max_tokens_param (str, optional): The name of the max_tokens parameter for the API. Defaults to "max_tokens".
@@ -85,8 +179,16 @@ class APIClient:
             batch_processing (bool, optional): Whether to use batch processing. Defaults to False.
             use_openai_responses_api (bool, optional): Whether to use OpenAI responses. Defaults to False.
             stream_openai_chat_completions (bool, optional): Whether to stream OpenAI chat completions internally.
+            async_backend (bool, optional): Whether to run standard API queries on an asyncio event loop with the
+                async SDK clients instead of one thread per query. Defaults to False.
             max_tool_calls (int|dict, optional): The maximum number of tool calls to make. Defaults to 0.
                 Could also be a dict that specifies max calls per tool name.
+            tool_concurrency (dict, optional): Maximum concurrent calls per tool name in this process. Tool calls run
+                on their own worker pools and do not hold a concurrent_requests slot. Defaults to 32 per tool.
+            tool_timeouts (dict, optional): Seconds per tool name after which a tool call fails with an error the
+                model sees. Defaults to None (no timeout).
+            max_parallel_tool_calls (int, optional): How many tool calls from one model turn run at the same time;
+                outputs are returned to the model in the original order. Defaults to 8.
             tools (list, optional): A list of tools to use. Defaults to None.
             **kwargs: Additional keyword arguments for the API.
         """
@@ -125,10 +227,13 @@ class APIClient:
         self.kwargs = kwargs
         self.max_tokens_param = max_tokens_param
         self.context_limit = context_limit
+        self.tokenizer_name = tokenizer
         self.max_tokens = max_tokens
         if max_tokens is not None:
             self.kwargs[max_tokens_param] = max_tokens
         self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.min_tokens_per_second = min_tokens_per_second
         self.max_retries = max_retries
         self.max_retries_inner = max_retries_inner
         self.throw_error_on_failure = throw_error_on_failure
@@ -145,6 +250,7 @@ class APIClient:
         self.use_gdm_tools = use_gdm_tools
         self.use_google_internal_tools = False
         self.stream_openai_chat_completions = stream_openai_chat_completions
+        self.async_backend = async_backend
         self.include_max_tool_calls = include_max_tool_calls
         self.cache_write_cost = cache_write_cost
         self.background = background
@@ -164,6 +270,13 @@ class APIClient:
             tool_desc["function"]["name"]: func for func, tool_desc in self.tools if "function" in tool_desc
         }
         self.tool_descriptions = [tool_desc for _, tool_desc in self.tools]
+        self.max_parallel_tool_calls = max_parallel_tool_calls
+        for tool_name in self.tool_functions:
+            tool_executor.configure(
+                tool_name,
+                max_workers=(tool_concurrency or {}).get(tool_name),
+                timeout=(tool_timeouts or {}).get(tool_name),
+            )
         if (not self.tool_calls_allowed or len(self.tool_descriptions) == 0) and "tool_choice" in self.kwargs:
             del self.kwargs["tool_choice"]
 
@@ -175,13 +288,65 @@ class APIClient:
         self.terminated = False
         self._initialize_api_keys()
 
+        # Adaptive concurrency: threads/coroutines are capped at the ceiling, the shared window decides the rest
+        self.max_in_flight = self.concurrent_requests
+        self.concurrency_limiter = None
+        if adaptive_concurrency and self.api != "vllm":
+            self.max_in_flight = max_concurrent_requests or 4 * self.concurrent_requests
+            self.concurrency_limiter = get_adaptive_limiter(
+                self.api, self.base_url, self.concurrent_requests, self.max_in_flight
+            )
+
+        # Queries executing tools hold no API slot: they get extra threads/coroutines, API calls take a slot each
+        self.tool_slots = sum(tool_executor.limit(tool_name) for tool_name in self.tool_functions)
+        self._api_slots = threading.BoundedSemaphore(self.max_in_flight) if self.tool_slots > 0 else None
+        self._api_slots_async = None
+
+        # Connection pool limits of the shared SDK client
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections or max(100, self.max_in_flight)
+
+        # Circuit breaker and retry budget shared across clients using the same endpoint
+        self.circuit_breaker = None
+        self.max_circuit_wait = max_circuit_wait
+        if circuit_breaker_threshold > 0 and self.api != "vllm":
+            self.circuit_breaker = get_circuit_breaker(
+                self.api, self.base_url, circuit_breaker_threshold, retry_budget_ratio
+            )
+
+        # Hedged requests for stragglers (standard API only)
+        self.hedge_after = hedge_after
+        self.hedge_percentile = hedge_percentile
+
+        # Prompt-cache-aware ordering of queries sharing a prefix (standard API only)
+        self.prefix_caching = prefix_caching
+        self.prefix_warmup = prefix_warmup
+        self.min_prefix_chars = min_prefix_chars
+
+        # Identical queries sent as one request with several choices (OpenAI-compatible chat completions only)
+        self.max_choices_per_request = max_choices_per_request
+        if max_choices_per_request > 1 and (
+            self.api not in ["openai", "together", "openrouter"]
+            or self.use_openai_responses_api
+            or self.stream_openai_chat_completions
+        ):
+            logger.warning("Multiple choices per request are only supported for OpenAI-compatible chat completions.")
+            self.max_choices_per_request = 1
+
+        # Requests/tokens per minute budgets shared across clients using the same key
+        self.rate_limiter = None
+        if (requests_per_minute or tokens_per_minute) and self.api != "vllm":
+            self.rate_limiter = get_rate_limiter(self.api_key, self.base_url, requests_per_minute, tokens_per_minute)
         
         # VLLM-specific initialization
         if self.api == "vllm":
             self.vllm_model = None
 
     def _initialize_vllm(self):
-            if LLM is None:
+            try:
+                from transformers import AutoTokenizer
+                from vllm import LLM, SamplingParams
+            except ImportError:
                 raise ImportError("vllm is not installed. pip install vllm")
             self.tokenizer = AutoTokenizer.from_pretrained(self.model)
             vllm_args = {}
@@ -289,7 +454,8 @@ class APIClient:
             raise ValueError(f"API {self.api} not supported.")
 
 
-        assert self.api_key is not None, "API key not found."
+        # Replaying from the response cache sends no requests, so it works without keys
+        assert self.api_key is not None or response_cache.replay, "API key not found."
 
     class InternalRequestResult:
         """A class to hold the result of a request internally (below run_queries)."""
@@ -302,8 +468,63 @@ class APIClient:
             self.cached_write_tokens = cached_write_tokens
             self.n_retries = n_retries
             self.time = time
+            self.hedge = None  # usage of the losing copy if the query was hedged
+            self.choices = []  # results of the other choices if the request sampled several
+            self.timing = None  # time to first token, throughput and stalls of the API calls (RequestMetrics)
+
+    """
+        Request steps: the standard API query loops are generators that yield these instead of performing I/O
+        themselves, so the same loop can be driven by a thread (_drive) or by an event loop (_drive_async).
+    """
+
+    class ApiCall:
+        """A call to the provider SDK client, e.g. method="chat.completions.create"."""
+
+        def __init__(self, method, *args, **kwargs):
+            self.method = method
+            self.args = args
+            self.kwargs = kwargs
+
+    class StreamCall(ApiCall):
+        """An SDK call returning a stream; the driver consumes it and sends back the list of events."""
+
+    class Sleep:
+        """A pause between retries."""
+
+        def __init__(self, seconds):
+            self.seconds = seconds
+
+    class Backoff:
+        """A pause before retrying after the given number of failures (jittered exponential, within the retry budget)."""
+
+        def __init__(self, attempt):
+            self.attempt = attempt
+
+    class ToolCall:
+        """An execution of one of the tool functions given to this client."""
+
+        def __init__(self, tool_name, arguments, messages):
+            self.tool_name = tool_name
+            self.arguments = arguments
+            self.messages = messages
+
+    class ToolCalls:
+        """Several independent ToolCall steps of one model turn, run concurrently; the driver sends back the list of
+        their outputs (or the exceptions they raised), in order."""
 
-    def run_queries(self, queries, no_tqdm=False, ignore_tool_calls=False, custom_indices=None):
+        def __init__(self, calls, max_parallel):
+            self.calls = calls
+            self.max_parallel = max_parallel
+
+    class BlockingCall:
+        """Any other blocking function call (run in a worker thread by the async driver)."""
+
+        def __init__(self, fn, *args, **kwargs):
+            self.fn = fn
+            self.args = args
+            self.kwargs = kwargs
+
+    def run_queries(self, queries, no_tqdm=False, ignore_tool_calls=False, custom_indices=None, sample_indices=None):
         """Only entry point: runs a given list of queries through the API.
 
         Args:
@@ -311,11 +532,15 @@ class APIClient:
             the right format for this API.
             no_tqdm (bool, optional): Whether to disable the tqdm progress bar. Defaults to False.
             ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction. Defaults to False.
+            custom_indices (list[int], optional): Indices to report to the request logger instead of [0, len-1].
+            sample_indices (list[int], optional): Which sample of its prompt each query is, used to key the response
+                cache and batch jobs. Defaults to numbering identical queries within this call 0, 1, ...
 
         Yields:
             tuple: An (idx, conversation, detailed_cost) tuple.
                 idx: Integer index of the query this response corresponds to in [0, len(queries)-1].
                 conversation: Full list of messages (including those from the query) in the API format (incl. CoT).
+                    Images are data URLs; references into the image store are only used for requests in flight.
                 detailed_cost: A dict with total "cost" ($), "input_tokens", "output_tokens", and "time" (seconds).
         """
         if not no_tqdm:
@@ -337,18 +562,59 @@ class APIClient:
             yield from self._run_vllm_queries(queries)
             return
 
-        # Case 2: Batch API
+        if sample_indices is None:
+            sample_indices = self._default_sample_indices(queries)
+
+        # Serve cached responses first, only the rest is sent to the API
+        pending = list(range(len(queries)))
+        cache_keys = {}  # id(query) -> response cache key
+        if response_cache.enabled:
+            keys = self._response_cache_keys(queries, ignore_tool_calls, sample_indices)
+            entries = [response_cache.get(key) for key in keys]
+            pending = [pos for pos, entry in enumerate(entries) if entry is None]
+            if response_cache.replay and len(pending) > 0:
+                raise RuntimeError(
+                    f"Replay mode: {len(pending)}/{len(queries)} queries to {self.model} are not in the response cache."
+                )
+            for pos, entry in enumerate(entries):
+                if entry is not None:
+                    result = self.InternalRequestResult(**entry["result"])
+                    conversation = image_store.resolve(result.conversation)
+                    yield (pos if self.batch_processing else indices[pos]), conversation, self._detailed_cost(result, 0)
+            cache_keys = {id(queries[pos]): keys[pos] for pos in pending}
+            if not no_tqdm:
+                logger.info(f"Response cache: {len(queries) - len(pending)} hits, {len(pending)} misses.")
+            if len(pending) == 0:
+                return
+
+        # Preflight: count prompt tokens locally, so requests that can never fit are not sent
+        pending, rejected = self._preflight(queries, pending, log=not no_tqdm)
+        for pos in rejected:
+            conversation = [m.copy() for m in queries[pos]] + [{"role": "assistant", "content": ""}]
+            result = self.InternalRequestResult(conversation, input_tokens=0, output_tokens=0)
+            detailed_cost = {**self._detailed_cost(result, 0), "context_limit_exceeded": True}
+            conversation = image_store.resolve(result.conversation)
+            yield (pos if self.batch_processing else indices[pos]), conversation, detailed_cost
+        if len(pending) == 0:
+            return
+
+        # Case 2: Batch API; results stream back as each batch ends
         if self.batch_processing:
             start_time = time.time()
+            pending_queries = [queries[pos] for pos in pending]
             if self.api == "openai":
-                results_batch = self._openai_batch_processing(queries, indices)
+                process_batch = self._openai_batch_processing
             else:
-                results_batch = self._anthropic_batch_processing(queries, indices)
-            end_time = time.time()  # pack all time into first index (since batch)
-            for idx, result in enumerate(results_batch):
+                process_batch = self._anthropic_batch_processing
+            for i, result in process_batch(
+                pending_queries, [indices[pos] for pos in pending], [sample_indices[pos] for pos in pending]
+            ):
+                pos, query = pending[i], pending_queries[i]
                 if result is None:
-                    conversation = [m.copy() for m in queries[idx]] + [{"role": "assistant", "content": ""}]
+                    conversation = [m.copy() for m in query] + [{"role": "assistant", "content": ""}]
                     result = self.InternalRequestResult(conversation, input_tokens=0, output_tokens=0)
+                elif id(query) in cache_keys:
+                    self._store_in_response_cache(cache_keys[id(query)], result)
                 detailed_cost = {
                     "cost": self._get_cost(
                         result.input_tokens, result.output_tokens, result.cached_input_tokens, result.cached_write_tokens
@@ -357,43 +623,450 @@ class APIClient:
                     "cached_input_tokens": result.cached_input_tokens,
                     "cached_write_tokens": result.cached_write_tokens,
                     "output_tokens": result.output_tokens,
-                    "time": end_time - start_time,
+                    "time": time.time() - start_time,
                     "n_retries": result.n_retries,
                 }
-                yield idx, result.conversation, detailed_cost
+                yield pos, image_store.resolve(result.conversation), detailed_cost
             return
 
-        # Case 3: Standard API; parallelize manually
+        # Case 3: Standard API; parallelize manually (threads or asyncio)
         start_time = time.time()
-        with ThreadPoolExecutor(max_workers=self.concurrent_requests) as executor:
-            future_to_index = {
-                executor.submit(self._run_query_with_retry, idx, query, ignore_tool_calls): idx
-                for idx, query in zip(indices, queries)
-            }
-
-            iterator = as_completed(future_to_index)
-            if not no_tqdm:
-                iterator = tqdm(iterator, total=len(future_to_index))
+        pending_queries, pending_indices = [queries[pos] for pos in pending], [indices[pos] for pos in pending]
+        n_choices, members = None, {}
+        if self.max_choices_per_request > 1 and (ignore_tool_calls or not self.tool_calls_allowed):
+            pending_queries, pending_indices, n_choices, members = self._merge_identical_queries(
+                pending_queries, pending_indices
+            )
+        groups, warmup, group_costs = None, None, {}
+        if self.prefix_caching and len(pending_queries) > 1:
+            groups = group_by_prefix(pending_queries, self.min_prefix_chars)
+            warmup = PrefixWarmup(groups, self.prefix_warmup)
+            pending_pos = {id(query): pos for pos, query in enumerate(pending_queries)}
+        if self.async_backend:
+            completed = self._run_queries_async(
+                pending_queries, pending_indices, ignore_tool_calls, warmup=warmup, n_choices=n_choices
+            )
+        else:
+            completed = self._run_queries_threaded(
+                pending_queries, pending_indices, ignore_tool_calls, warmup=warmup, n_choices=n_choices
+            )
+        if not no_tqdm:
+            completed = tqdm(completed, total=len(pending_queries))
 
-            for future in iterator:
-                idx = future_to_index[future]
-                result = future.result()
+        for request_idx, request_query, request_result in completed:
+            for idx, query, result in self._split_choices(members, request_idx, request_query, request_result):
                 if result is None:
-                    conversation = [m.copy() for m in queries[idx]] + [{"role": "assistant", "content": ""}]
+                    conversation = [m.copy() for m in query] + [{"role": "assistant", "content": ""}]
                     result = self.InternalRequestResult(conversation, input_tokens=0, output_tokens=0)
-                detailed_cost = {
-                    "cost": self._get_cost(
-                        result.input_tokens, result.output_tokens, result.cached_input_tokens
-                    ),
-                    "input_tokens": result.input_tokens,
-                    "cached_input_tokens": result.cached_input_tokens,
-                    "cached_write_tokens": result.cached_write_tokens,
-                    "output_tokens": result.output_tokens,
-                    "n_retries": result.n_retries,
-                    "time": time.time() - start_time,
-                    "request_time": result.time,
-                }
-                yield idx, result.conversation, detailed_cost
+                elif id(query) in cache_keys:
+                    self._store_in_response_cache(cache_keys[id(query)], result)
+                detailed_cost = self._detailed_cost(result, time.time() - start_time)
+                if groups is not None and id(query) in pending_pos:
+                    group_costs[pending_pos[id(query)]] = detailed_cost
+                yield idx, image_store.resolve(result.conversation), detailed_cost
+
+        if self.concurrency_limiter is not None and not no_tqdm:
+            logger.info(f"Adaptive concurrency: {self.concurrency_limiter.stats()}")
+        if self.rate_limiter is not None and not no_tqdm:
+            logger.info(f"Rate limits: {self.rate_limiter.stats()}")
+        if self.circuit_breaker is not None and not no_tqdm:
+            logger.info(f"Circuit breaker: {self.circuit_breaker.stats()}")
+        if groups is not None and not no_tqdm:
+            logger.info(f"Prefix cache: {prefix_group_stats(groups, group_costs)}")
+        if self.tool_slots > 0 and not no_tqdm:
+            logger.info(f"Tool execution: {tool_executor.stats()}")
+        if not no_tqdm:
+            logger.info(f"Connections: {connection_stats()}")
+
+    def _detailed_cost(self, result, elapsed):
+        """Builds the detailed_cost dict reported by run_queries for a standard API result."""
+        return {
+            "cost": self._get_cost(result.input_tokens, result.output_tokens, result.cached_input_tokens),
+            "input_tokens": result.input_tokens,
+            "cached_input_tokens": result.cached_input_tokens,
+            "cached_write_tokens": result.cached_write_tokens,
+            "output_tokens": result.output_tokens,
+            "n_retries": result.n_retries,
+            "time": elapsed,
+            "request_time": result.time,
+            **(result.timing or {}),
+            **(result.hedge or {}),
+        }
+
+    def _preflight(self, queries, pending, log=True):
+        """Counts the prompt tokens of the pending queries locally and logs the estimated input tokens and cost.
+
+        Args:
+            queries (list[MessageList]): The prepared queries.
+            pending (list[int]): Positions of the queries that would be sent.
+            log (bool, optional): Whether to log the estimate. Defaults to True.
+
+        Returns:
+            tuple: (positions to send, positions whose prompt alone exceeds context_limit)
+        """
+        counter = get_token_counter(self.model, self.tokenizer_name)
+        tools = self.tool_descriptions if len(self.tool_descriptions) > 0 else None
+        max_output_tokens = self.kwargs.get(self.max_tokens_param) or self.max_tokens or 0
+        to_send, rejected, input_tokens, n_trimmed = [], [], 0, 0
+        for pos in pending:
+            n_tokens = counter.count(queries[pos], tools)
+            lower, upper = counter.bounds(n_tokens)
+            if self.context_limit is not None and lower >= self.context_limit:
+                rejected.append(pos)
+                continue
+            if self.context_limit is not None and upper + max_output_tokens > self.context_limit:
+                n_trimmed += 1
+            to_send.append(pos)
+            input_tokens += n_tokens
+
+        if len(rejected) > 0:
+            logger.warning(
+                f"{len(rejected)} queries to {self.model} have prompts longer than the context limit of "
+                f"{self.context_limit} tokens and are not sent."
+            )
+        if log and len(to_send) > 0:
+            message = (
+                f"Preflight ({counter.name} token counts): {len(to_send)} queries, {input_tokens} prompt tokens, "
+                f"${self._get_cost(input_tokens, 0):.4f} input cost"
+            )
+            if max_output_tokens > 0:
+                max_cost = self._get_cost(input_tokens, max_output_tokens * len(to_send))
+                message += f", at most ${max_cost:.4f} for the first turn with max_tokens output"
+            if n_trimmed > 0:
+                message += f"; {n_trimmed} get fewer output tokens to fit the context limit"
+            logger.info(message + ".")
+        return to_send, rejected
+
+    def _merge_identical_queries(self, queries, indices):
+        """Merges identical queries into requests of up to max_choices_per_request choices.
+
+        Args:
+            queries (list[MessageList]): The queries to send.
+            indices (list[int]): Their batch indices.
+
+        Returns:
+            tuple: (queries, indices, n_choices, members) with one query per request and the number of choices to
+                request for it; members maps id(query) of each merged request to the (idx, query) pairs its choices
+                are returned for, the request's own query first.
+        """
+        groups = {}
+        for idx, query in zip(indices, queries):
+            groups.setdefault(json.dumps(query, sort_keys=True, default=str), []).append((idx, query))
+        merged_queries, merged_indices, n_choices, members = [], [], [], {}
+        for group in groups.values():
+            for start in range(0, len(group), self.max_choices_per_request):
+                chunk = group[start : start + self.max_choices_per_request]
+                idx, query = chunk[0]
+                merged_queries.append(query)
+                merged_indices.append(idx)
+                n_choices.append(len(chunk))
+                if len(chunk) > 1:
+                    members[id(query)] = chunk
+        if len(merged_queries) < len(queries):
+            logger.info(f"Sending {len(queries)} queries as {len(merged_queries)} requests with several choices.")
+        return merged_queries, merged_indices, n_choices, members
+
+    def _split_choices(self, members, idx, query, result):
+        """Yields (idx, query, result) for each query answered by one finished request."""
+        chunk = members.get(id(query))
+        if chunk is None:
+            yield idx, query, result
+            return
+        choices = [result] + result.choices if result is not None else []
+        for i, (member_idx, member_query) in enumerate(chunk):
+            choice = choices[i] if i < len(choices) else None
+            if choice is not None and i > 0:
+                choice.n_retries, choice.time, choice.timing = result.n_retries, result.time, result.timing
+            yield member_idx, member_query, choice
+
+    def _default_sample_indices(self, queries):
+        """Numbers identical queries 0, 1, ... so that repeated samples of one prompt can be told apart."""
+        sample_indices, seen = [], {}
+        for query in queries:
+            query_key = json.dumps(query, sort_keys=True, default=str)
+            sample_indices.append(seen.get(query_key, 0))
+            seen[query_key] = sample_indices[-1] + 1
+        return sample_indices
+
+    def _response_cache_keys(self, queries, ignore_tool_calls, sample_indices):
+        """Computes the response cache key of each (prepared) query.
+
+        Args:
+            queries (list[MessageList]): The prepared queries.
+            ignore_tool_calls (bool): Whether tool calls are ignored in this interaction.
+            sample_indices (list[int]): The sample index of each query.
+
+        Returns:
+            list[str]: One key per query.
+        """
+        keys = []
+        for query, sample_idx in zip(queries, sample_indices):
+            request = {
+                "api": self.api,
+                "base_url": self.base_url,
+                "model": self.model,
+                "kwargs": self.kwargs,
+                "messages": query,
+                "tools": self.tool_descriptions,
+                "max_tool_calls": self.max_tool_calls,
+                "ignore_tool_calls": ignore_tool_calls,
+                "use_openai_responses_api": self.use_openai_responses_api,
+            }
+            keys.append(response_cache.key(request, sample_idx))
+        return keys
+
+    def _store_in_response_cache(self, key, result):
+        """Stores a finished result in the response cache (failures are logged, never raised)."""
+        try:
+            response_cache.put(
+                key,
+                {
+                    "model": self.model,
+                    "result": {
+                        "conversation": image_store.resolve(result.conversation),
+                        "input_tokens": result.input_tokens,
+                        "output_tokens": result.output_tokens,
+                        "cached_input_tokens": result.cached_input_tokens,
+                        "cached_write_tokens": result.cached_write_tokens,
+                        "n_retries": result.n_retries,
+                        "time": result.time,
+                    },
+                },
+            )
+        except Exception as e:
+            logger.warning(f"Could not store response in the cache: {e}")
+
+    def _hedge_policy(self, n_queries):
+        """Returns the hedging policy for a batch of n_queries, or None if hedging is disabled."""
+        if self.hedge_after is None or n_queries == 0:
+            return None
+        return HedgePolicy(n_queries, after_fraction=self.hedge_after, percentile=self.hedge_percentile)
+
+    def _finish_copy(self, copies, running, pos, copy, result, error):
+        """Bookkeeping when one copy of a (possibly hedged) query ends.
+
+        Args:
+            copies (dict): pos -> {copy: HedgeTicket or None} of all copies started for each query.
+            running (dict): pos -> set of copies still running, for unfinished queries; updated in place.
+            pos (int): The position of the query.
+            copy (int): 0 for the original, 1 for the hedge.
+            result (InternalRequestResult or None): The result of the copy.
+            error (Exception or None): The exception the copy raised.
+
+        Returns:
+            tuple: (is_final, tickets of the losing copies to cancel). A failed copy is only final if no other copy
+                of the query is still running.
+        """
+        if pos not in running or isinstance(error, HedgeCancelled):
+            return False, []  # the other copy already won
+        running[pos].discard(copy)
+        if (error is not None or result is None) and len(running[pos]) > 0:
+            return False, []  # let the other copy finish instead
+        if error is not None:
+            raise error
+        losers = [copies[pos][other] for other in running.pop(pos)]
+        if result is not None and len(copies[pos]) > 1:
+            # Usage of the other copy up to now; calls it still has in flight are not counted
+            others = [ticket for other, ticket in copies[pos].items() if other != copy]
+            hedge_input = sum(ticket.input_tokens for ticket in others)
+            hedge_output = sum(ticket.output_tokens for ticket in others)
+            hedge_cached = sum(ticket.cached_input_tokens for ticket in others)
+            result.hedge = {
+                "hedged": True,
+                "hedge_won": copy == 1,
+                "hedge_cost": self._get_cost(hedge_input, hedge_output, hedge_cached),
+                "hedge_input_tokens": hedge_input,
+                "hedge_output_tokens": hedge_output,
+            }
+        return True, losers
+
+    def _run_queries_threaded(self, queries, indices, ignore_tool_calls=False, warmup=None, n_choices=None):
+        """Runs queries with one thread per in-flight query, duplicating stragglers if hedging is enabled.
+
+        Args:
+            queries (list[MessageList]): The queries to run.
+            indices (list[int]): Their batch indices.
+            ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction.
+            warmup (PrefixWarmup, optional): Holds back queries until their prefix group leader warmed the cache.
+            n_choices (list[int], optional): The number of choices to request for each query. Defaults to one each.
+
+        Yields:
+            tuple: An (idx, query, InternalRequestResult or None) tuple per query, in completion order.
+        """
+        choices = n_choices if n_choices is not None else [1] * len(queries)
+        policy = self._hedge_policy(len(queries))
+        check_interval = HEDGE_CHECK_INTERVAL if policy is not None else None
+        started_at, started_lock = {}, threading.Lock()
+
+        def _run_copy(pos, copy, ticket):
+            if warmup is not None and copy == 0:
+                warmup.wait(pos)
+                warmup.start(pos)
+            if ticket is not None:
+                with started_lock:
+                    started_at.setdefault(pos, time.time())
+            return self._run_query_with_retry(
+                indices[pos], queries[pos], ignore_tool_calls, ticket=ticket, n_choices=choices[pos]
+            )
+
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight + self.tool_slots)
+        hedge_executor = None
+        copies, running, futures = {}, {}, {}
+        try:
+            for pos in warmup.order() if warmup is not None else range(len(queries)):
+                copies[pos] = {0: HedgeTicket() if policy is not None else None}
+                running[pos] = {0}
+                futures[executor.submit(_run_copy, pos, 0, copies[pos][0])] = (pos, 0)
+            not_done = set(futures)
+            while len(running) > 0:
+                done, not_done = wait(not_done, timeout=check_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pos, copy = futures[future]
+                    error = future.exception()
+                    result = future.result() if error is None else None
+                    is_final, losers = self._finish_copy(copies, running, pos, copy, result, error)
+                    if not is_final:
+                        continue
+                    for loser in losers:
+                        loser.cancel()
+                    if warmup is not None:
+                        warmup.finish(pos)
+                    with started_lock:
+                        started_at.pop(pos, None)
+                    if policy is not None and result is not None:
+                        policy.record(result.time)
+                    yield indices[pos], queries[pos], result
+
+                if policy is None:
+                    continue
+                with started_lock:
+                    if len(started_at) < len(running):
+                        continue  # hedge only once every query has started
+                    stragglers = [(pos, started_at[pos]) for pos in policy.stragglers(started_at, time.time())]
+                for pos, start in stragglers:
+                    if hedge_executor is None:
+                        hedge_executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+                    logger.info(f"Hedging query {indices[pos]} after {time.time() - start:.0f}s.")
+                    copies[pos][1] = HedgeTicket()
+                    running[pos].add(1)
+                    future = hedge_executor.submit(_run_copy, pos, 1, copies[pos][1])
+                    futures[future] = (pos, 1)
+                    not_done.add(future)
+        finally:
+            # Losing copies stop at their next step; do not wait for requests stuck in flight
+            for pos in running:
+                for copy in running[pos]:
+                    if copies[pos][copy] is not None:
+                        copies[pos][copy].cancel()
+            executor.shutdown(wait=policy is None, cancel_futures=True)
+            if hedge_executor is not None:
+                hedge_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_queries_async(self, queries, indices, ignore_tool_calls=False, warmup=None, n_choices=None):
+        """Runs queries as coroutines on an event loop in a background thread, using the async SDK clients.
+        At most max_in_flight queries are in flight; tool functions and other blocking calls run in threads.
+        If hedging is enabled, stragglers are duplicated and the losing copy is cancelled.
+
+        Args:
+            queries (list[MessageList]): The queries to run.
+            indices (list[int]): Their batch indices.
+            ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction.
+            warmup (PrefixWarmup, optional): Holds back queries until their prefix group leader warmed the cache.
+            n_choices (list[int], optional): The number of choices to request for each query. Defaults to one each.
+
+        Yields:
+            tuple: An (idx, query, InternalRequestResult or None) tuple per query, in completion order.
+        """
+        completed = queue.Queue()
+        choices = n_choices if n_choices is not None else [1] * len(queries)
+        policy = self._hedge_policy(len(queries))
+        check_interval = HEDGE_CHECK_INTERVAL if policy is not None else None
+
+        async def _run_copy(semaphore, client, pos, ticket, started_at):
+            if pos in started_at:  # hedges of queries that are already running skip the queue
+                return await self._run_query_with_retry_async(
+                    client, indices[pos], queries[pos], ignore_tool_calls, ticket=ticket, n_choices=choices[pos]
+                )
+            if warmup is not None:
+                await warmup.wait_async(pos)
+            async with semaphore:
+                if warmup is not None:
+                    warmup.start(pos)
+                started_at[pos] = time.time()
+                return await self._run_query_with_retry_async(
+                    client, indices[pos], queries[pos], ignore_tool_calls, ticket=ticket, n_choices=choices[pos]
+                )
+
+        async def _run_all():
+            semaphore = asyncio.Semaphore(self.max_in_flight + self.tool_slots)
+            client = self._make_client(async_client=True)
+            started_at, copies, running, tasks = {}, {}, {}, {}
+            for pos in warmup.order() if warmup is not None else range(len(queries)):
+                copies[pos] = {0: HedgeTicket() if policy is not None else None}
+                running[pos] = {0}
+                tasks[asyncio.ensure_future(_run_copy(semaphore, client, pos, copies[pos][0], started_at))] = (pos, 0)
+            not_done = set(tasks)
+            try:
+                while len(running) > 0:
+                    done, not_done = await asyncio.wait(
+                        not_done, timeout=check_interval, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        pos, copy = tasks[task]
+                        error = HedgeCancelled() if task.cancelled() else task.exception()
+                        result = task.result() if error is None else None
+                        try:
+                            is_final, _ = self._finish_copy(copies, running, pos, copy, result, error)
+                        except Exception as e:
+                            completed.put((indices[pos], queries[pos], e))
+                            return
+                        if not is_final:
+                            continue
+                        for other_task in not_done:
+                            if tasks[other_task][0] == pos:
+                                other_task.cancel()
+                        if warmup is not None:
+                            warmup.finish(pos)
+                        started_at.pop(pos, None)
+                        if policy is not None and result is not None:
+                            policy.record(result.time)
+                        completed.put((indices[pos], queries[pos], result))
+
+                    if policy is None or len(started_at) < len(running):
+                        continue  # hedge only once every query has started
+                    for pos in policy.stragglers(started_at, time.time()):
+                        logger.info(f"Hedging query {indices[pos]} after {time.time() - started_at[pos]:.0f}s.")
+                        copies[pos][1] = HedgeTicket()
+                        running[pos].add(1)
+                        task = asyncio.ensure_future(_run_copy(semaphore, client, pos, copies[pos][1], started_at))
+                        tasks[task] = (pos, 1)
+                        not_done.add(task)
+            finally:
+                for task in not_done:
+                    task.cancel()
+
+        # All async clients live on one process-wide loop so their connection pools are reused across calls
+        all_done = asyncio.run_coroutine_threadsafe(_run_all(), get_event_loop())
+
+        def _on_done(future):
+            # Wakes the consumer if _run_all failed before every result was queued
+            if not future.cancelled() and future.exception() is not None:
+                completed.put((None, None, future.exception()))
+
+        all_done.add_done_callback(_on_done)
+        try:
+            for _ in range(len(queries)):
+                idx, query, result = completed.get()
+                if isinstance(result, Exception):
+                    raise result
+                yield idx, query, result
+        finally:
+            # Cancels the queries still in flight if the consumer stopped early; a no-op once all of them finished
+            all_done.cancel()
+            try:
+                all_done.result()
+            except CancelledError:
+                pass
 
     def _validate_and_prepare_query(self, query):
         """Prepares a query for the API.
@@ -453,9 +1126,14 @@ class APIClient:
                 for block in m["content"]:
                     if isinstance(block, dict) and block.get("type", "") == "input_image" and "image_url" in block:
                         b64_full = block["image_url"]
-                        tag = "data:image/png;base64,"
-                        assert b64_full.startswith(tag)
-                        source = {"type": "base64", "media_type": "image/png", "data": b64_full[len(tag) :]}
+                        if is_image_ref(b64_full):
+                            # Stays a reference until the call is made, see image_store.resolve
+                            media_type = image_store.media_type(b64_full)
+                            source = {"type": "base64", "media_type": media_type, "data": b64_full}
+                        else:
+                            tag = "data:image/png;base64,"
+                            assert b64_full.startswith(tag)
+                            source = {"type": "base64", "media_type": "image/png", "data": b64_full[len(tag) :]}
                         new_content.append({"type": "image", "source": source})
                     elif isinstance(block, dict) and block.get("type", "") == "input_text" and "text" in block:
                         new_content.append({"type": "text", "text": block["text"]})
@@ -534,9 +1212,9 @@ class APIClient:
         """
         messages = []
         for content_block in content:
-            if isinstance(content_block, ThinkingBlock):
+            if isinstance(content_block, anthropic_types.ThinkingBlock):
                 messages.append({"role": "assistant", "type": "cot", "content": content_block.thinking})
-            elif isinstance(content_block, TextBlock):
+            elif isinstance(content_block, anthropic_types.TextBlock):
                 messages.append({"role": "assistant", "type": "response", "content": content_block.text})
                 break
         return messages
@@ -649,260 +1327,545 @@ class APIClient:
         Case 2: Batch API
     """
 
-    def _openai_batch_processing(self, queries, indices, retry_idx=0):
-        """Processes a batch of queries  using the OpenAI API.
+    def _batch_manager(self):
+        """Returns the batch-job manager for this client's provider and model."""
+        client = self._make_client()
+        backend = OpenAIBatchBackend(client) if self.api == "openai" else AnthropicBatchBackend(client)
+        endpoint = hashlib.sha256(str(self.base_url).encode("utf-8")).hexdigest()[:8]
+        name = f"{self.api}_{endpoint}_{self.model.replace('/', '_')}"
+        return BatchJobManager(backend, name, max_retries=self.max_retries)
+
+    def _openai_batch_processing(self, queries, indices, sample_indices):
+        """Processes a batch of queries using the OpenAI batch API.
 
         Args:
             queries (list[MessageList]): A list of queries to run, each is a MessageList in API format.
-            retry_idx (int, optional): Current retry index starting from 0.
+            indices (list[int]): The batch indices of the queries, for the request logger.
+            sample_indices (list[int]): The sample index of each query, to tell identical queries apart.
 
-        Returns:
-            list: A list of InternalRequestResult or None.
+        Yields:
+            tuple: (position in queries, InternalRequestResult or None) as soon as the batch holding the query ends.
         """
-        if retry_idx >= self.max_retries:
-            return [None for _ in range(len(queries))]
-
-        jsonl_queries = []
-        for idx, query in zip(indices, queries):
-            request = {
-                "custom_id": f"apiquery-{idx}",
-                "method": "POST",
-                "url": "/v1/chat/completions",
-                "body": {"model": self.model, "messages": self._drop_cot(query), **self.kwargs},
-            }
-            jsonl_queries.append(request)
-
-        client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
-
-        # create temp file
-        tmp = tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False)
-        with open(tmp.name, "wb") as f:
-            for i, query in enumerate(jsonl_queries):
-                f.write(json.dumps(query).encode("utf-8"))
-                f.write(b"\n")
-
-        batch_input_file = client.files.create(file=open(tmp.name, "rb"), purpose="batch")
-
-        batch = client.batches.create(
-            input_file_id=batch_input_file.id,
-            endpoint="/v1/chat/completions",
-            completion_window="24h",
-        )
-        # close tmp file
-        tmp.close()
-
-        logger.info(
-            f"Running {len(queries)} queries with batch ID {batch.id} using file with File ID {batch_input_file.id}."
-        )
-
-        request_counts = dict(batch.request_counts)
-
-        while True:
-            try:
-                batch = client.batches.retrieve(batch.id)
-            except Exception as e:  # noqa: E722 F841
-                logger.warning(f"Error connecting to batch OpenAI. Retrying in 10s. Exception: {e}")
-                pass
-            if any([request_counts[key] != dict(batch.request_counts)[key] for key in request_counts]):
-                request_counts = dict(batch.request_counts)
-                logger.info(
-                    f"Completed Requests Progress: {request_counts['completed']}/{len(queries)}. Errors: {request_counts['failed']}/{len(queries)}"
-                )
-            if batch.status == "completed":
-                break
-            time.sleep(10)
-
-        results = [None for _ in range(len(queries))]
-        repeat_indices = []
-
-        if batch.output_file_id is None:
-            return results
-        while True:
-            try:
-                file_response = client.files.content(file_id=batch.output_file_id)
-                break
-            except Exception as e:
-                logger.error(f"Error connecting to batch OpenAI. Retrying in 10s. Exception: {e}")
-                time.sleep(10)
-                continue
-
-        json_response = []
-        for line in file_response.iter_lines():
-            json_response.append(json.loads(line))
-
-        for result in json_response:
-            index = int(result["custom_id"].split("-")[-1])
-            if result["response"]["status_code"] != 200:
-                repeat_indices.append(index)
-                logger.error(f"Error: {result['response']['status_code']}")
-            else:
+        requests, positions = {}, {}
+        for pos, (query, sample_idx) in enumerate(zip(queries, sample_indices)):
+            body = {"model": self.model, "messages": self._drop_cot(query), **self.kwargs}
+            custom_id = batch_custom_id(body, sample_idx)
+            requests[custom_id] = image_store.resolve(body)
+            positions.setdefault(custom_id, []).append(pos)
+
+        logger.info(f"Running {len(queries)} queries through the OpenAI batch API.")
+        for custom_id, body, attempt in self._batch_manager().run(requests):
+            result = None
+            if body is not None:
                 try:
-                    content = result["response"]["body"]["choices"][0]["message"]["content"]
-                    conversation = [m.copy() for m in queries[index]] + [{"role": "assistant", "content": content}]
-                    usage = result["response"]["body"]["usage"]
+                    content = body["choices"][0]["message"]["content"]
+                    usage = body["usage"]
                     input_tokens, output_tokens, cached_input_tokens, _ = self._extract_usage_tokens(usage)
-                    results[index] = self.InternalRequestResult(
+                except Exception as e:
+                    logger.error(f"Error when unpacking batch OpenAI response. Exception: {e}")
+                    content = None
+            for pos in positions[custom_id]:
+                if body is not None and content is not None:
+                    conversation = [m.copy() for m in queries[pos]] + [{"role": "assistant", "content": content}]
+                    result = self.InternalRequestResult(
                         conversation,
                         input_tokens,
                         output_tokens,
                         cached_input_tokens=cached_input_tokens,
-                        n_retries=retry_idx,
+                        n_retries=attempt,
                     )
-                except Exception as e:
-                    logger.error(f"Error when unpacking batch OpenAI response, will repeat. Exception: {e}")
-                    repeat_indices.append(index)
-
-        for i in range(len(results)):
-            if results[i] is None:
-                repeat_indices.append(i)
-        if len(repeat_indices) > 0:
-            logger.info(f"Repeating {len(repeat_indices)} queries.")
-            repeat_queries = [queries[i] for i in repeat_indices]
-            repeat_results = self._openai_batch_processing(repeat_queries, retry_idx + 1)
-            for i, result in zip(repeat_indices, repeat_results):
-                results[i] = result
-
-        return results
+                yield pos, result
 
-    def _anthropic_batch_processing(self, queries, indices, retry_idx=0):
-        """Processes a batch of queries using the Anthropic API.
+    def _anthropic_batch_processing(self, queries, indices, sample_indices):
+        """Processes a batch of queries using the Anthropic message batches API.
 
         Args:
             queries (list[MessageList]): A list of queries to run, each is a MessageList in API format.
-            retry_idx (int, optional): Current retry index starting from 0.
+            indices (list[int]): The batch indices of the queries, for the request logger.
+            sample_indices (list[int]): The sample index of each query, to tell identical queries apart.
 
-        Returns:
-            list: A list of InternalRequestResult or None.
+        Yields:
+            tuple: (position in queries, InternalRequestResult or None) as soon as the batch holding the query ends.
         """
-        if retry_idx >= self.max_retries:
-            return [None for _ in range(len(queries))]
-
-        client = anthropic.Anthropic(
-            api_key=self.api_key,
-            max_retries=0,
-        )
-
-        requests = []
+        requests, positions = {}, {}
         ts = time.strftime("%m%d-%H:%M:%S", time.localtime(time.time()))
         ts += f".{datetime.now().microsecond:06d}"
-        for idx, query in zip(indices, queries):
+        for pos, (idx, query, sample_idx) in enumerate(zip(indices, queries, sample_indices)):
             system_message, anthropic_messages = self._convert_to_anthropic_messages(query)
             kwargs_here = self.kwargs.copy()
             if system_message is not anthropic.NOT_GIVEN:
                 kwargs_here["system"] = system_message
+            params = anthropic_message_params.MessageCreateParamsNonStreaming(model=self.model, messages=anthropic_messages, **kwargs_here)
+            custom_id = batch_custom_id(params, sample_idx)
+            request_logger.log_request(ts=ts, batch_idx=idx, request={"custom_id": custom_id, "params": params})
+            requests[custom_id] = image_store.resolve(params)
+            positions.setdefault(custom_id, []).append(pos)
+
+        logger.info(f"Running {len(queries)} queries through the Anthropic batch API.")
+        for custom_id, message, attempt in self._batch_manager().run(requests):
+            for pos in positions[custom_id]:
+                result = None
+                if message is not None:
+                    request_logger.log_response(ts=ts, batch_idx=indices[pos], response=message.model_dump())
+                    new_messages = self._get_messages_from_anthropic_content(message.content)
+                    conversation = [m.copy() for m in queries[pos]] + new_messages
+                    input_tokens, output_tokens, cached_input_tokens, _ = self._extract_usage_tokens(message.usage)
+                    result = self.InternalRequestResult(
+                        conversation,
+                        input_tokens,
+                        output_tokens,
+                        cached_input_tokens=cached_input_tokens,
+                        n_retries=attempt,
+                    )
+                yield pos, result
 
-            payload = {
-                "custom_id": f"apiquery-{idx}",
-                "params": {"model": self.model, "messages": anthropic_messages, **kwargs_here},
-            }
-            request_logger.log_request(ts=ts, batch_idx=idx, request=payload)
-            request = Request(
-                custom_id=f"apiquery-{idx}",
-                params=MessageCreateParamsNonStreaming(model=self.model, messages=anthropic_messages, **kwargs_here),
-            )
-            requests.append(request)
+    """
+        Case 3: Standard API
+    """
 
-        message_batch = client.messages.batches.create(requests=requests)
+    def _make_client(self, async_client=False):
+        """Returns the shared SDK client used for the standard API of this client.
 
-        logger.info(f"Running {len(queries)} queries with batch ID {message_batch.id}")
+        Args:
+            async_client (bool, optional): Whether to create the asyncio variant of the client.
 
-        current_request_counts = dict(message_batch.request_counts)
+        Returns:
+            The SDK client, or None if the API does not go through an SDK client.
+        """
+        if self.api == "google":
+            return None
+        api = self.api if self.api in ["anthropic", "together"] else "openai"
+        return get_sdk_client(
+            api,
+            self.api_key,
+            self.base_url,
+            self.timeout,
+            async_client=async_client,
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+        )
 
-        while True:
+    def _resolve_client_method(self, client, method):
+        target = client
+        for attr in method.split("."):
+            target = getattr(target, attr)
+        return target
+
+    def _reserve_rate_limit(self, step):
+        """Reserves request and token budget for an ApiCall step.
+
+        Returns:
+            tuple: The number of reserved tokens and the seconds to wait before sending.
+        """
+        if self.rate_limiter is None or not step.method.endswith("create"):
+            return 0, 0.0
+        max_output_tokens = step.kwargs.get(self.max_tokens_param) or self.max_tokens or 0
+        n_tokens = estimate_request_tokens(step.kwargs) + max_output_tokens
+        return n_tokens, self.rate_limiter.reserve(n_tokens)
+
+    def _settle_rate_limit(self, reserved_tokens, value):
+        """Refunds reserved tokens that the request did not use (all of them if it failed, i.e. value is None)."""
+        if self.rate_limiter is None or reserved_tokens == 0:
+            return
+        if value is None:
+            self.rate_limiter.refund(reserved_tokens)
+            return
+        usage = self._response_usage(value)
+        if usage is not None:
+            input_tokens, output_tokens, _, _ = self._extract_usage_tokens(usage)
+            self.rate_limiter.refund(reserved_tokens - input_tokens - output_tokens)
+
+    def _response_usage(self, value):
+        """Returns the usage of an ApiCall/StreamCall result (the last event carrying one for streams), or None."""
+        events = value if isinstance(value, list) else [value]
+        return next((e.usage for e in reversed(events) if getattr(e, "usage", None) is not None), None)
+
+    def _add_ticket_usage(self, ticket, value):
+        """Counts the usage of an ApiCall result towards a hedged copy."""
+        if ticket is None:
+            return
+        usage = self._response_usage(value)
+        if usage is not None:
+            input_tokens, output_tokens, cached_input_tokens, _ = self._extract_usage_tokens(usage)
+            ticket.add_usage(input_tokens, output_tokens, cached_input_tokens)
+
+    def _add_cache_hints(self, step):
+        """Adds prompt cache hints to a generation call if prefix caching is enabled."""
+        if not self.prefix_caching:
+            return
+        if self.api == "anthropic" and step.method == "messages.create":
+            step.kwargs.setdefault("cache_control", {"type": "ephemeral"})
+        elif self.api == "openai" and self.base_url is None and step.method.endswith("create"):
+            # Requests with the same key are routed to the same cache; derive it like the prefix groups
+            messages = step.kwargs.get("messages", step.kwargs.get("input"))
+            if isinstance(messages, list) and "prompt_cache_key" not in step.kwargs:
+                step.kwargs["prompt_cache_key"] = prefix_key(prompt_text(messages), self.min_prefix_chars)
+
+    def _fit_context_limit(self, step):
+        """Lowers the max output tokens of a generation call so that its prompt and output fit in context_limit."""
+        if self.context_limit is None or not step.method.endswith("create"):
+            return
+        max_output_tokens = step.kwargs.get(self.max_tokens_param)
+        messages = step.kwargs.get("messages", step.kwargs.get("input"))
+        if max_output_tokens is None or not isinstance(messages, list):
+            return
+        counter = get_token_counter(self.model, self.tokenizer_name)
+        extra = [step.kwargs.get(key) for key in ["system", "tools"] if isinstance(step.kwargs.get(key), (str, list))]
+        _, prompt_tokens = counter.bounds(counter.count(messages, extra))
+        room = self.context_limit - prompt_tokens
+        thinking = step.kwargs.get("thinking")
+        thinking_budget = thinking.get("budget_tokens", 0) if isinstance(thinking, dict) else 0
+        if thinking_budget < room < max_output_tokens:
+            step.kwargs[self.max_tokens_param] = room
+
+    def _bound_timeout(self, step):
+        """Lowers the timeout of a non-streaming generation call to stall_timeout plus the time its max output tokens
+        take at min_tokens_per_second, since a hung call shows no progress before it times out. Calls without an
+        explicit timeout (e.g. Anthropic messages) otherwise use the client's timeout."""
+        if self.stall_timeout is None or isinstance(step, self.StreamCall):
+            return
+        max_output_tokens = step.kwargs.get(self.max_tokens_param)
+        if max_output_tokens is None:
+            return
+        deadline = self.stall_timeout + max_output_tokens / self.min_tokens_per_second
+        step.kwargs["timeout"] = min(step.kwargs.get("timeout", self.timeout), deadline)
+
+    def _record_call(self, metrics, started_at, value, timer):
+        """Adds a finished API call to the timing metrics of its query."""
+        if metrics is None:
+            return
+        usage = self._response_usage(value)
+        output_tokens = self._extract_usage_tokens(usage)[1] if usage is not None else 0
+        metrics.add_call(started_at, time.monotonic(), output_tokens, timer)
+
+    def _record_stall(self, metrics, step):
+        logger.warning(f"Stream of {self.model} stalled for {self.stall_timeout}s, retrying ({step.method}).")
+        if metrics is not None:
+            metrics.n_stalls += 1
+
+    def _retry_delay(self, attempt):
+        """Returns the seconds to wait before a retry after attempt + 1 failures."""
+        if self.circuit_breaker is None:
+            return backoff_delay(attempt, cap=self.sleep_on_error)
+        return self.circuit_breaker.retry_delay(attempt, cap=self.sleep_on_error)
+
+    def _circuit_wait(self, waited):
+        """Returns the seconds to wait before the circuit breaker lets a request through (0 to send it now)."""
+        if self.circuit_breaker is None:
+            return 0.0
+        wait = self.circuit_breaker.check()
+        if wait > 0 and waited >= self.max_circuit_wait:
+            raise CircuitOpenError(f"Circuit breaker of {self.circuit_breaker.name} stayed open for {waited:.0f}s.")
+        return wait
+
+    def _record_outcome(self, outcome):
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(outcome)
+
+    def _call_api(self, client, step, metrics=None):
+        """Performs an ApiCall/StreamCall step with the sync client, within the circuit breaker, rate limits, API slots
+        and adaptive concurrency. Streams are consumed under the stall watchdog; timings are added to metrics."""
+        self._add_cache_hints(step)
+        self._fit_context_limit(step)
+        self._bound_timeout(step)
+        waited = 0.0
+        while (wait := self._circuit_wait(waited)) > 0:
+            time.sleep(wait)
+            waited += wait
+        reserved_tokens, wait = self._reserve_rate_limit(step)
+        if wait > 0:
+            time.sleep(wait)
+        limiter = self.concurrency_limiter
+        with self._api_slots if self._api_slots is not None else nullcontext():
+            acquired_at = limiter.acquire() if limiter is not None else None
+            started_at, timer = time.monotonic(), None
             try:
-                message_batch = client.messages.batches.retrieve(
-                    message_batch_id=message_batch.id,
-                )
-            except Exception as e:  # noqa: E722 E841
-                logger.warning(f"Error connecting to Anthropic. Retrying in 10s. Exception: {e}")
-                pass
-            if any(
-                [
-                    current_request_counts[key] != dict(message_batch.request_counts)[key]
-                    for key in current_request_counts
-                ]
-            ):
-                current_request_counts = dict(message_batch.request_counts)
-                error_sum = sum([current_request_counts[key] for key in current_request_counts if "succeeded" != key])
-                logger.info(
-                    f"Succeeded Requests Progress: {current_request_counts['succeeded']}/{len(queries)}. Errors: {error_sum}"
-                )
-            if message_batch.processing_status == "ended":
-                break
-            time.sleep(10)
+                kwargs = image_store.resolve(step.kwargs)
+                method = self._resolve_client_method(client, step.method)
+                if isinstance(step, self.StreamCall):
+                    timer = StreamTimer(self.stall_timeout)
+                    timeout = stream_timeout(kwargs.get("timeout", self.timeout), self.stall_timeout)
+                    kwargs = {**kwargs, "timeout": timeout}
+                    value = consume_stream(open_stream(lambda: method(*step.args, **kwargs), timer), timer)
+                else:
+                    value = method(*step.args, **kwargs)
+            except Exception as e:
+                if isinstance(e, StreamStalledError):
+                    self._record_stall(metrics, step)
+                outcome = classify_api_error(e)
+                if limiter is not None:
+                    limiter.release(acquired_at, outcome)
+                self._record_outcome(outcome)
+                self._settle_rate_limit(reserved_tokens, None)
+                raise
+            if limiter is not None:
+                limiter.release(acquired_at, "success")
+        self._record_call(metrics, started_at, value, timer)
+        self._record_outcome("success")
+        self._settle_rate_limit(reserved_tokens, value)
+        return value
+
+    async def _call_api_async(self, client, step, metrics=None):
+        """Performs an ApiCall/StreamCall step with the async client, within the circuit breaker, rate limits, API
+        slots and adaptive concurrency. Streams are consumed under the stall watchdog; timings are added to metrics."""
+        self._add_cache_hints(step)
+        self._fit_context_limit(step)
+        self._bound_timeout(step)
+        waited = 0.0
+        while (wait := self._circuit_wait(waited)) > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+        reserved_tokens, wait = self._reserve_rate_limit(step)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if self._api_slots is not None and self._api_slots_async is None:
+            self._api_slots_async = asyncio.Semaphore(self.max_in_flight)  # all async clients share one loop
+        limiter = self.concurrency_limiter
+        async with self._api_slots_async if self._api_slots is not None else nullcontext():
+            acquired_at = await limiter.acquire_async() if limiter is not None else None
+            started_at, timer = time.monotonic(), None
+            try:
+                kwargs = image_store.resolve(step.kwargs)
+                method = self._resolve_client_method(client, step.method)
+                if isinstance(step, self.StreamCall):
+                    timer = StreamTimer(self.stall_timeout)
+                    timeout = stream_timeout(kwargs.get("timeout", self.timeout), self.stall_timeout)
+                    kwargs = {**kwargs, "timeout": timeout}
+                    stream = await open_stream_async(lambda: method(*step.args, **kwargs), timer)
+                    value = await consume_stream_async(stream, timer)
+                else:
+                    value = await method(*step.args, **kwargs)
+            except BaseException as e:
+                if isinstance(e, StreamStalledError):
+                    self._record_stall(metrics, step)
+                outcome = classify_api_error(e)
+                if limiter is not None:
+                    limiter.release(acquired_at, outcome)
+                if not isinstance(e, asyncio.CancelledError):
+                    self._record_outcome(outcome)
+                elif self.circuit_breaker is not None:
+                    self.circuit_breaker.release_probe()
+                self._settle_rate_limit(reserved_tokens, None)
+                raise
+            if limiter is not None:
+                limiter.release(acquired_at, "success")
+        self._record_call(metrics, started_at, value, timer)
+        self._record_outcome("success")
+        self._settle_rate_limit(reserved_tokens, value)
+        return value
+
+    def _tool_executor_calls(self, step):
+        """Converts a ToolCalls step to the (tool_name, fn, args) triples of the tool executor."""
+        return [
+            (call.tool_name, self._execute_tool_function, (call.tool_name, call.arguments, call.messages))
+            for call in step.calls
+        ]
+
+    def _plan_tool_calls(self, calls, nb_executed_tool_calls, max_tool_calls, max_tool_calls_mode, count_refused):
+        """Returns the tool calls of one model turn that the turn's loop will execute, given the tool call budget.
 
-        results = []
-        repeat_indices = []
+        Args:
+            calls (list[tuple]): (key, tool_name, arguments) of each tool call, in the order the model made them.
+            nb_executed_tool_calls (dict): Tool calls executed so far per budget key.
+            max_tool_calls (dict): The budget per key ("any" in total mode, tool names otherwise).
+            max_tool_calls_mode (str): "total" or "per_tool".
+            count_refused (bool): Whether the loop also counts calls refused for exceeding the budget.
+
+        Returns:
+            list[tuple]: The (key, tool_name, arguments) of the calls that will be executed.
+        """
+        planned = dict(nb_executed_tool_calls)
+        to_execute = []
+        for key, tool_name, arguments in calls:
+            if tool_name not in self.tool_functions:
+                continue
+            tool_key = "any" if max_tool_calls_mode == "total" else tool_name
+            if planned[tool_key] < max_tool_calls[tool_key]:
+                to_execute.append((key, tool_name, arguments))
+                planned[tool_key] += 1
+            elif count_refused:
+                planned[tool_key] += 1
+        return to_execute
+
+    def _prefetch_tool_calls(self, calls, conversation):
+        """Request steps running the tool calls of one model turn concurrently, before the turn's loop consumes the
+        outputs in order with _tool_call_step. A single call is left to run inline.
 
+        Args:
+            calls (list[tuple]): (key, tool_name, arguments) of the calls to execute, as given by _plan_tool_calls.
+                The key is the position of the call in the turn, since providers may repeat or omit call IDs.
+                Arguments that could not be parsed are given as the exception; it is raised before any call starts,
+                as the turn's loop would abort at that call anyway.
+            conversation (MessageList): The conversation at this turn, given to the tools.
+
+        Returns:
+            dict: key -> output of the tool call, or the exception it raised.
+        """
+        for _, _, arguments in calls:
+            if isinstance(arguments, Exception):
+                raise arguments
+        if len(calls) <= 1 or self.max_parallel_tool_calls <= 1:
+            return {}
+        steps = [self.ToolCall(tool_name, arguments, conversation) for _, tool_name, arguments in calls]
+        outputs = yield self.ToolCalls(steps, self.max_parallel_tool_calls)
+        return {key: output for (key, _, _), output in zip(calls, outputs)}
+
+    def _tool_call_step(self, prefetched, key, tool_name, arguments, conversation):
+        """Request steps for one tool call: returns its prefetched output, or executes it now."""
+        if key in prefetched:
+            output = prefetched.pop(key)
+            if isinstance(output, Exception):
+                raise output
+            return output
+        return (yield self.ToolCall(tool_name, arguments, conversation))
+
+    def _with_timing(self, result, metrics):
+        if isinstance(result, self.InternalRequestResult) and metrics.n_calls > 0:
+            result.timing = metrics.summary()
+        return result
+
+    def _drive(self, steps, client, ticket=None):
+        """Runs a request step generator to completion on the calling thread.
+
+        Args:
+            steps (generator): A generator yielding request steps (ApiCall, Sleep, ToolCall, ...).
+            client: The sync SDK client to perform ApiCall steps with.
+            ticket (HedgeTicket, optional): If this is one copy of a hedged query, its ticket; the run stops with
+                HedgeCancelled at the next step once the ticket is cancelled.
+
+        Returns:
+            The return value of the generator; an InternalRequestResult gets the timing of its API calls.
+        """
+        value, error, metrics = None, None, RequestMetrics()
         while True:
+            if ticket is not None and ticket.cancelled.is_set():
+                steps.close()
+                raise HedgeCancelled()
             try:
-                raw_results = client.messages.batches.results(
-                    message_batch_id=message_batch.id,
-                )
-                break
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration as stop:
+                return self._with_timing(stop.value, metrics)
+            value, error = None, None
+            try:
+                if isinstance(step, self.Sleep):
+                    time.sleep(step.seconds)
+                elif isinstance(step, self.Backoff):
+                    time.sleep(self._retry_delay(step.attempt))
+                elif isinstance(step, self.ToolCall):
+                    value = tool_executor.run(
+                        step.tool_name, self._execute_tool_function, step.tool_name, step.arguments, step.messages
+                    )
+                elif isinstance(step, self.ToolCalls):
+                    value = tool_executor.run_many(self._tool_executor_calls(step), step.max_parallel)
+                elif isinstance(step, self.BlockingCall):
+                    value = step.fn(*step.args, **step.kwargs)
+                elif isinstance(step, self.ApiCall):
+                    value = self._call_api(client, step, metrics)
+                    self._add_ticket_usage(ticket, value)
+                else:
+                    raise ValueError(f"Unknown request step {step}")
             except Exception as e:
-                logger.error(f"Error connecting to batch Anthropic. Retrying in 10 seconds. Exception: {e}")
-                time.sleep(10)
-
-        for i, raw_result in enumerate(raw_results):
-            request_logger.log_response(ts=ts, batch_idx=i, response=raw_result.model_dump())
-            if raw_result.result.type == "succeeded":
-                new_messages = self._get_messages_from_anthropic_content(raw_result.result.message.content)
-                conversation = [m.copy() for m in queries[i]] + new_messages
-                input_tokens, output_tokens, cached_input_tokens, _ = self._extract_usage_tokens(
-                    raw_result.result.message.usage
-                )
-                results.append(
-                    self.InternalRequestResult(
-                        conversation,
-                        input_tokens,
-                        output_tokens,
-                        cached_input_tokens=cached_input_tokens,
-                        n_retries=retry_idx,
+                error = e
+
+    async def _drive_async(self, steps, client, ticket=None):
+        """Runs a request step generator to completion on the running event loop.
+
+        Args:
+            steps (generator): A generator yielding request steps (ApiCall, Sleep, ToolCall, ...).
+            client: The async SDK client to perform ApiCall steps with.
+            ticket (HedgeTicket, optional): If this is one copy of a hedged query, its ticket to count usage on
+                (the losing copy is stopped by cancelling its task).
+
+        Returns:
+            The return value of the generator; an InternalRequestResult gets the timing of its API calls.
+        """
+        value, error, metrics = None, None, RequestMetrics()
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration as stop:
+                return self._with_timing(stop.value, metrics)
+            value, error = None, None
+            try:
+                if isinstance(step, self.Sleep):
+                    await asyncio.sleep(step.seconds)
+                elif isinstance(step, self.Backoff):
+                    await asyncio.sleep(self._retry_delay(step.attempt))
+                elif isinstance(step, self.ToolCall):
+                    value = await tool_executor.run_async(
+                        step.tool_name, self._execute_tool_function, step.tool_name, step.arguments, step.messages
                     )
-                )
-            else:
-                results.append(None)
-                repeat_indices.append(i)
-                if raw_result.result.type == "errored":
-                    logger.error(raw_result.result.error)
+                elif isinstance(step, self.ToolCalls):
+                    value = await tool_executor.run_many_async(self._tool_executor_calls(step), step.max_parallel)
+                elif isinstance(step, self.BlockingCall):
+                    value = await asyncio.to_thread(step.fn, *step.args, **step.kwargs)
+                elif isinstance(step, self.ApiCall):
+                    value = await self._call_api_async(client, step, metrics)
+                    self._add_ticket_usage(ticket, value)
+                else:
+                    raise ValueError(f"Unknown request step {step}")
+            except Exception as e:
+                error = e
 
-        if len(repeat_indices) > 0:
-            logger.info(f"Repeating {len(repeat_indices)} queries.")
-            repeat_queries = [queries[i] for i in repeat_indices]
-            repeat_api_indices = [indices[i] for i in repeat_indices]
-            repeat_results = self._anthropic_batch_processing(repeat_queries, repeat_api_indices, retry_idx + 1)
-            for i, result in zip(repeat_indices, repeat_results):
-                results[i] = result
+    def _run_query_with_retry(self, idx, query, ignore_tool_calls=False, ticket=None, n_choices=1):
+        """Runs a query on standard API with retries on failure, blocking the calling thread.
 
-        return results
+        Args:
+            idx (int): The index of the query in the batch of queries given to run_queries.
+            query (MessageList): The query to run.
+            ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction.
+            ticket (HedgeTicket, optional): The ticket of this copy if the query may be hedged.
+            n_choices (int, optional): The number of choices to request (see _merge_identical_queries). Defaults to 1.
 
-    """
-        Case 3: Standard API
-    """
+        Returns:
+            InternalRequestResult or None
+        """
+        steps = self._query_with_retry_steps(idx, query, ignore_tool_calls, n_choices=n_choices)
+        return self._drive(steps, self._make_client(), ticket=ticket)
 
-    def _run_query_with_retry(self, idx, query, ignore_tool_calls=False):
-        """Runs a query on standard API with retries on failure.
+    async def _run_query_with_retry_async(self, client, idx, query, ignore_tool_calls=False, ticket=None, n_choices=1):
+        """Runs a query on standard API with retries on failure, as a coroutine.
 
         Args:
+            client: The async SDK client shared by all queries of this run_queries call.
             idx (int): The index of the query in the batch of queries given to run_queries.
             query (MessageList): The query to run.
             ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction.
+            ticket (HedgeTicket, optional): The ticket of this copy if the query may be hedged.
+            n_choices (int, optional): The number of choices to request (see _merge_identical_queries). Defaults to 1.
+
+        Returns:
+            InternalRequestResult or None
+        """
+        steps = self._query_with_retry_steps(idx, query, ignore_tool_calls, n_choices=n_choices)
+        return await self._drive_async(steps, client, ticket=ticket)
+
+    def _query_with_retry_steps(self, idx, query, ignore_tool_calls=False, n_choices=1):
+        """Request steps for a query on standard API with retries on failure.
+
+        Args:
+            idx (int): The index of the query in the batch of queries given to run_queries.
+            query (MessageList): The query to run.
+            ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction.
+            n_choices (int, optional): The number of choices to request. Defaults to 1.
 
         Returns:
             InternalRequestResult or None
         """
         retry_idx = 0
         total_retries = 0
+        n_failures = 0
         start_time = time.time()
         while retry_idx < self.max_retries:
             if self.terminated:
                 return None
             try:
-                result = self._run_query(idx, query, ignore_tool_calls=ignore_tool_calls)
+                result = yield from self._query_steps(
+                    idx, query, ignore_tool_calls=ignore_tool_calls, n_choices=n_choices
+                )
                 result.n_retries += total_retries
                 result.time = time.time() - start_time
-                time.sleep(self.sleep_after_request)
+                yield self.Sleep(self.sleep_after_request)
                 return result
             except Exception as e:
                 if "Max inner retries reached." in str(e):
@@ -911,7 +1874,8 @@ class APIClient:
                     total_retries += 1
                 logger.error(f"Error in outer retries. Exception: {e}")
                 logger.error(f"Traceback: {traceback.format_exc()}")
-                time.sleep(self.sleep_on_error)
+                yield self.Backoff(n_failures)
+                n_failures += 1
                 # if api error is not due to rate limit, try again
                 if "rate limit" not in str(e).lower() and "429" not in str(e):
                     retry_idx += 1
@@ -925,31 +1889,35 @@ class APIClient:
         else:
             return None
 
-    def _run_query(self, idx, query, ignore_tool_calls=False):
-        """Runs a query on standard API.
+    def _query_steps(self, idx, query, ignore_tool_calls=False, n_choices=1):
+        """Request steps for a single query on standard API.
 
         Args:
             idx (int): The index of the query in the batch of queries given to run_queries.
             query (MessageList): The query to run.
             ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction.
+            n_choices (int, optional): The number of choices to request; more than one sends a single chat completions
+                request with n > 1. Defaults to 1.
 
         Returns:
             InternalRequestResult or None
         """
         if self.api == "google":
-            return self._google_query_with_internal_tools(idx, query)
+            return (yield self.BlockingCall(self._google_query_with_internal_tools, idx, query))
+        if n_choices > 1:
+            return (yield from self._openai_multi_choice_query(idx, query, n_choices))
         if self.api == "openai":
-            return self._openai_query_with_tools(idx, query, ignore_tool_calls=ignore_tool_calls)
+            return (yield from self._openai_query_with_tools(idx, query, ignore_tool_calls=ignore_tool_calls))
         elif self.api == "together":
-            return self._openai_query_with_tools(idx, query, is_together=True, ignore_tool_calls=ignore_tool_calls)
+            return (yield from self._openai_query_with_tools(idx, query, ignore_tool_calls=ignore_tool_calls))
         elif self.api == "anthropic":
-            return self._anthropic_query_with_tools(idx, query, ignore_tool_calls=ignore_tool_calls)
+            return (yield from self._anthropic_query_with_tools(idx, query, ignore_tool_calls=ignore_tool_calls))
         elif self.api == "openrouter":
-            return self._openai_query_with_tools(idx, query)
+            return (yield from self._openai_query_with_tools(idx, query))
 
     def _anthropic_query(self, idx, query):
         """Backward-compatible wrapper; Anthropic now uses one unified Messages API path."""
-        return self._anthropic_query_with_tools(idx, query, ignore_tool_calls=True)
+        return self._drive(self._anthropic_query_with_tools(idx, query, ignore_tool_calls=True), self._make_client())
 
     def _anthropic_tool_descriptions(self):
         anthropic_tools = []
@@ -1119,12 +2087,16 @@ class APIClient:
         return system_message, anthropic_messages
 
     def _anthropic_query_with_tools(self, idx, messages, ignore_tool_calls=False):
-        client = anthropic.Anthropic(
-            api_key=self.api_key,
-            max_retries=0,
-            timeout=self.timeout,
-        )
+        """Request steps for a query to the Anthropic Messages API, executing tool calls in a loop.
+
+        Args:
+            idx (int): The index of the query in the batch of queries given to run_queries.
+            messages (list): The messages to send.
+            ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction.
 
+        Returns:
+            InternalRequestResult or None
+        """
         if ignore_tool_calls:
             max_tool_calls_mode, max_tool_calls = "total", {"any": 0}
         else:
@@ -1162,14 +2134,14 @@ class APIClient:
                     ts += f".{datetime.now().microsecond:06d}"
                     info = {"nb_executed_tool_calls": nb_executed_tool_calls, "n_retries": n_retries}
                     request_logger.log_request(ts=ts, batch_idx=idx, request=payload, **info)
-                    response = client.messages.create(**payload)
+                    response = yield self.ApiCall("messages.create", **payload)
                     request_logger.log_response(ts=ts, batch_idx=idx, response=response.model_dump())
                 except Exception as e:
                     if "rate limit" not in str(e).lower() and "429" not in str(e):
                         total_retries += 1
                     request_logger.log_response(ts=ts, batch_idx=idx, response={"exception": str(e)})
                     logger.error(f"Got Anthropic error in tools inner loop. Exception: {e}")
-                    time.sleep(60)
+                    yield self.Backoff(n_retries)
                     continue
             if response is None:
                 raise ValueError("Max inner retries reached.")
@@ -1205,8 +2177,17 @@ class APIClient:
             if total_max_tool_calls <= sum(nb_executed_tool_calls.values()):
                 break
 
+            turn_calls = [
+                (pos, getattr(tool_use, "name", ""), getattr(tool_use, "input", {}))
+                for pos, tool_use in enumerate(tool_uses)
+            ]
+            turn_calls = self._plan_tool_calls(
+                turn_calls, nb_executed_tool_calls, max_tool_calls, max_tool_calls_mode, count_refused=False
+            )
+            prefetched = yield from self._prefetch_tool_calls(turn_calls, conversation)
+
             tool_result_blocks = []
-            for tool_use in tool_uses:
+            for pos, tool_use in enumerate(tool_uses):
                 tool_name = getattr(tool_use, "name", "")
                 tool_id = getattr(tool_use, "id", None)
                 arguments = getattr(tool_use, "input", {})
@@ -1221,7 +2202,9 @@ class APIClient:
                         output = f"Error: Tool call after exceeding max # of tool calls ({max_tool_calls[tool_key]})."
                     else:
                         try:
-                            output = self._execute_tool_function(tool_name, arguments, conversation)
+                            output = yield from self._tool_call_step(
+                                prefetched, pos, tool_name, arguments, conversation
+                            )
                         except Exception as e:
                             logger.error(f"Error executing tool {tool_name}. Exception: {e}")
                             output = f"Error executing tool {tool_name}. Exception: {e}"
@@ -1285,33 +2268,26 @@ class APIClient:
             n_retries=total_retries,
         )
 
-    def _openai_query_with_tools(self, idx, query, is_together=False, ignore_tool_calls=False):
-        """Queries the OpenAI API with tools.
+    def _openai_query_with_tools(self, idx, query, ignore_tool_calls=False):
+        """Request steps for a query to an OpenAI-compatible API (OpenAI, Together, ...) with tools.
 
         Args:
             idx (int): The index of the query in the batch of queries given to run_queries.
             query (MessageList): The query to run.
-            is_together (bool, optional): Whether to use the Together API. Defaults to False.
             ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction.
 
         Returns:
             InternalRequestResult or None
         """
-        if is_together:
-            client = Together(timeout=self.timeout, max_retries=0)
-        else:
-            client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=0)
-
         if self.use_openai_responses_api:
-            return self._openai_query_responses_api(client, idx, query, ignore_tool_calls=ignore_tool_calls)
+            return (yield from self._openai_query_responses_api(idx, query, ignore_tool_calls=ignore_tool_calls))
         else:
-            return self._openai_query_chat_completions_api(client, idx, query, ignore_tool_calls=ignore_tool_calls)
+            return (yield from self._openai_query_chat_completions_api(idx, query, ignore_tool_calls=ignore_tool_calls))
 
-    def _openai_query_responses_api(self, client, idx, messages, ignore_tool_calls=False):
-        """Queries the OpenAI API with the responses API.
+    def _openai_query_responses_api(self, idx, messages, ignore_tool_calls=False):
+        """Request steps for a query to the OpenAI responses API.
 
         Args:
-            client: The OpenAI client.
             idx (int): The index of the query in the batch of queries given to run_queries.
             messages (list): The messages to send.
             ignore_tool_calls (bool, optional): Whether to ignore tool calls in this interaction.
@@ -1366,12 +2342,12 @@ class APIClient:
                     ts += f".{datetime.now().microsecond:06d}"
                     info = {"nb_executed_tool_calls": nb_executed_tool_calls, "n_retries": n_retries}
                     request_logger.log_request(ts=ts, batch_idx=idx, request=payload, **info)
-                    response = client.responses.create(**payload)
+                    response = yield self.ApiCall("responses.create", **payload)
                     if self.background:
                         time_start = time.time()
                         while response.status in {"queued", "in_progress"}:
-                            time.sleep(60)
-                            response = client.responses.retrieve(response.id)
+                            yield self.Sleep(60)
+                            response = yield self.ApiCall("responses.retrieve", response.id)
                             if time.time() - time_start > self.timeout:
                                 raise TimeoutError("Timeout waiting for background response.")
                         request_logger.log_response(ts=ts, batch_idx=idx, response=response.model_dump())
@@ -1385,8 +2361,8 @@ class APIClient:
                     if "rate limit" not in str(e).lower() and "429" not in str(e):
                         total_retries += 1
                     request_logger.log_response(ts=ts, batch_idx=idx, exception={"exception": str(e)})
-                    time.sleep(60)
                     logger.error(f"Got OpenAI error in responses api inner. Exception: {e}")
+                    yield self.Backoff(n_retries)
                     response = None
                     continue
             if response is None:
@@ -1398,8 +2374,18 @@ class APIClient:
             output_tokens += step_output
             cached_input_tokens += step_cached_input
 
+            turn_calls = []
+            for pos, out in enumerate(response.output):
+                if out.type == "function_call":
+                    # Invalid arguments abort the turn; raise before any of its calls starts
+                    turn_calls.append((pos, out.name, json.loads(out.arguments)))
+            turn_calls = self._plan_tool_calls(
+                turn_calls, nb_executed_tool_calls, max_tool_calls, max_tool_calls_mode, count_refused=True
+            )
+            prefetched = yield from self._prefetch_tool_calls(turn_calls, conversation)
+
             was_tool_call_executed = False
-            for out in response.output:
+            for pos, out in enumerate(response.output):
                 if out.type == "message":
                     all_messages = ""  # need all together + ID because API crashes otherwise
                     for c in out.content:
@@ -1432,7 +2418,9 @@ class APIClient:
                         output = f"Error: Tool call after exceeding max # of tool calls ({max_tool_calls[tool_key]})."
                     else:
                         try:
-                            output = self._execute_tool_function(function_name, arguments, conversation)
+                            output = yield from self._tool_call_step(
+                                prefetched, pos, function_name, arguments, conversation
+                            )
                         except Exception as e:
                             logger.error(f"Error executing tool {function_name}. Exception: {e}")
                             output = f"Error executing tool {function_name}. Exception: {e}"
@@ -1502,11 +2490,10 @@ class APIClient:
             n_retries=total_retries,
         )
 
-    def _openai_query_chat_completions_api(self, client, idx, messages, ignore_tool_calls=False):
-        """Queries the OpenAI API using chat completions API.
+    def _openai_query_chat_completions_api(self, idx, messages, ignore_tool_calls=False):
+        """Request steps for a query to the OpenAI chat completions API.
 
         Args:
-            client: The OpenAI client.
             idx (int): The index of the query in the batch of queries given to run_queries.
             messages (list): The messages to send.
             ignore_tool_calls (bool): Whether to ignore tool calls.
@@ -1515,7 +2502,7 @@ class APIClient:
             InternalRequestResult or None
         """
         if self.stream_openai_chat_completions:
-            return self._openai_query_chat_completions_streaming(client, idx, messages)
+            return (yield from self._openai_query_chat_completions_streaming(idx, messages))
 
         # Set up tools
         if ignore_tool_calls:
@@ -1559,15 +2546,15 @@ class APIClient:
                     ts += f".{datetime.now().microsecond:06d}"
                     info = {"nb_executed_tool_calls": nb_executed_tool_calls, "n_retries": n_retries}
                     request_logger.log_request(ts=ts, batch_idx=idx, request=payload, **info)
-                    response = client.chat.completions.create(**payload)
+                    response = yield self.ApiCall("chat.completions.create", **payload)
                     request_logger.log_response(ts=ts, batch_idx=idx, response=response.model_dump())
                 except Exception as e:
                     if "rate limit" not in str(e).lower() and "429" not in str(e):
                         total_retries += 1
                     request_logger.log_response(ts=ts, batch_idx=idx, response={"exception": str(e)})
-                    if isinstance(e, RateLimitError):
-                        logger.info(f"Got OpenAI CC rate limit error. Sleeping for 60 seconds. Exception: {e}")
-                        time.sleep(60)
+                    if isinstance(e, openai.RateLimitError):
+                        logger.info(f"Got OpenAI CC rate limit error. Backing off. Exception: {e}")
+                        yield self.Backoff(n_retries)
                         continue
                     else:
                         if "maximum context length" in str(e).lower() or "input token count" in str(e).lower():
@@ -1575,8 +2562,8 @@ class APIClient:
                             logger.info(
                                 f"Got OpenAI CC max context length error. Reducing max output tokens to {max_output_tokens} and retrying. Exception: {e}"
                             )
-                        logger.info(f"Got OpenAI CC non ratelimit error. Sleeping for 20 seconds: {e}")
-                        time.sleep(60)
+                        logger.info(f"Got OpenAI CC non ratelimit error. Backing off: {e}")
+                        yield self.Backoff(n_retries)
                         continue
             if response is None:
                 raise ValueError("Max inner retries reached.")
@@ -1595,38 +2582,25 @@ class APIClient:
                                             self.kwargs.get(self.max_tokens_param, float("inf")))
             else:
                 max_output_tokens = self.kwargs.get(self.max_tokens_param, None)
-            # Add CoT and rest of message separately
-            # TODO: if we notice new ways to return CoT they should be mangled here. Likely missing something.
-            if hasattr(message, "reasoning_details") and message.reasoning_details:
-                for detail in message.reasoning_details:
-                    if isinstance(detail, dict):
-                        type_ = detail.get("type", "")
-                        text_ = detail.get("text", "")
-                        sumary_ = detail.get("sumary", "")
-                    else:
-                        type_ = detail.type
-                        text_ = detail.text
-                        sumary_ = detail.sumary
-                    if type_ == "reasoning.text":
-                        conversation.append({"role": "assistant", "type": "cot", "content": text_})
-                    elif type_ == "reasoning.summary":
-                        conversation.append({"role": "assistant", "type": "cot", "content": sumary_})
-                    else:
-                        pass  # encrypted
-            else:
-                # Reasoning details trumps others as there is repetition
-                if hasattr(message, "reasoning") and message.reasoning:
-                    conversation.append({"role": "assistant", "type": "cot", "content": message.reasoning})
-                if hasattr(message, "reasoning_content") and message.reasoning_content:
-                    conversation.append({"role": "assistant", "type": "cot", "content": message.reasoning_content})
-
-            message_dict = message.model_dump()
-            message_dict = {k: v for k, v in message_dict.items() if v is not None}  # Drop nulls
-            conversation.append(message_dict)  # Should have tool calls inside too; and reasoning_details
+            self._append_chat_completion_message(conversation, message)
 
             # Try to execute all tool calls
             if message.tool_calls:
-                for tool_call in message.tool_calls:
+                turn_calls = []
+                for pos, tool_call in enumerate(message.tool_calls):
+                    if isinstance(tool_call, dict):
+                        continue  # handled by the loop below as before
+                    try:
+                        arguments = json.loads(tool_call.function.arguments)
+                    except json.JSONDecodeError as e:
+                        arguments = e
+                    turn_calls.append((pos, tool_call.function.name, arguments))
+                turn_calls = self._plan_tool_calls(
+                    turn_calls, nb_executed_tool_calls, max_tool_calls, max_tool_calls_mode, count_refused=False
+                )
+                prefetched = yield from self._prefetch_tool_calls(turn_calls, conversation)
+
+                for pos, tool_call in enumerate(message.tool_calls):
                     if isinstance(tool_call, dict):
                         function_name = tool_call.get("function", dict()).get("name", "")
                         tool_call_id = tool_call.get("id")
@@ -1650,7 +2624,9 @@ class APIClient:
                         # Execute tool
                         arguments = json.loads(tool_call.function.arguments)
                         try:
-                            output = self._execute_tool_function(function_name, arguments, conversation)
+                            output = yield from self._tool_call_step(
+                                prefetched, pos, function_name, arguments, conversation
+                            )
                         except Exception as e:
                             logger.error(f"Error executing tool {function_name}. Exception: {e}")
                             output = f"Error executing tool {function_name}. Exception: {e}"
@@ -1692,8 +2668,121 @@ class APIClient:
             n_retries=total_retries,
         )
 
-    def _openai_query_chat_completions_streaming(self, client, idx, messages):
-        """Queries the OpenAI API using chat completions API with streaming.
+    def _append_chat_completion_message(self, conversation, message):
+        """Appends a chat completions message to the conversation, with its CoT as separate messages."""
+        # Add CoT and rest of message separately
+        # TODO: if we notice new ways to return CoT they should be mangled here. Likely missing something.
+        if hasattr(message, "reasoning_details") and message.reasoning_details:
+            for detail in message.reasoning_details:
+                if isinstance(detail, dict):
+                    type_ = detail.get("type", "")
+                    text_ = detail.get("text", "")
+                    sumary_ = detail.get("sumary", "")
+                else:
+                    type_ = detail.type
+                    text_ = detail.text
+                    sumary_ = detail.sumary
+                if type_ == "reasoning.text":
+                    conversation.append({"role": "assistant", "type": "cot", "content": text_})
+                elif type_ == "reasoning.summary":
+                    conversation.append({"role": "assistant", "type": "cot", "content": sumary_})
+                else:
+                    pass  # encrypted
+        else:
+            # Reasoning details trumps others as there is repetition
+            if hasattr(message, "reasoning") and message.reasoning:
+                conversation.append({"role": "assistant", "type": "cot", "content": message.reasoning})
+            if hasattr(message, "reasoning_content") and message.reasoning_content:
+                conversation.append({"role": "assistant", "type": "cot", "content": message.reasoning_content})
+
+        message_dict = message.model_dump()
+        message_dict = {k: v for k, v in message_dict.items() if v is not None}  # Drop nulls
+        conversation.append(message_dict)  # Should have tool calls inside too; and reasoning_details
+
+    def _openai_multi_choice_query(self, idx, messages, n_choices):
+        """Request steps for n_choices samples of a query without tools, sent as chat completions requests with n > 1.
+
+        Args:
+            idx (int): The index of the query in the batch of queries given to run_queries.
+            messages (list): The messages to send.
+            n_choices (int): The number of samples.
+
+        Returns:
+            InternalRequestResult or None: The first sample, with the others in its choices list. The usage of each
+                request is split across the samples it returned.
+        """
+        results = []
+        total_retries = 0
+        while len(results) < n_choices and not self.terminated:
+            n = n_choices - len(results)
+            response = None
+            n_retries = -1
+            while response is None and n_retries < self.max_retries_inner:
+                n_retries += 1
+                try:
+                    payload = {
+                        "model": self.model,
+                        "messages": self._drop_cot(messages),
+                        "timeout": self.timeout,
+                        **self.kwargs,
+                        "n": n,
+                    }
+                    ts = time.strftime("%m%d-%H:%M:%S", time.localtime(time.time()))
+                    ts += f".{datetime.now().microsecond:06d}"
+                    request_logger.log_request(ts=ts, batch_idx=idx, request=payload, n_retries=n_retries)
+                    response = yield self.ApiCall("chat.completions.create", **payload)
+                    request_logger.log_response(ts=ts, batch_idx=idx, response=response.model_dump())
+                except Exception as e:
+                    request_logger.log_response(ts=ts, batch_idx=idx, response={"exception": str(e)})
+                    if isinstance(e, openai.RateLimitError):
+                        logger.info(f"Got OpenAI CC rate limit error. Backing off. Exception: {e}")
+                    else:
+                        total_retries += 1
+                        logger.info(f"Got OpenAI CC non ratelimit error. Backing off: {e}")
+                    yield self.Backoff(n_retries)
+            if response is None:
+                raise ValueError("Max inner retries reached.")
+            if len(response.choices) == 0:
+                raise ValueError("Response without choices.")
+            if len(response.choices) < n:
+                logger.warning(
+                    f"{self.model} returned {len(response.choices)} of {n} requested choices, requesting the rest again."
+                )
+            results.extend(self._choice_results(messages, response))
+
+        if len(results) < n_choices:
+            return None
+        first = results[0]
+        first.choices = results[1:n_choices]
+        first.n_retries = total_retries
+        return first
+
+    def _choice_results(self, messages, response):
+        """Turns each choice of a chat completions response into a result, splitting the usage across them.
+
+        The prompt (and cached prompt) tokens are split evenly; the output tokens in proportion to the length of each
+        choice, since providers only report their sum.
+        """
+        input_tokens, output_tokens, cached_input_tokens, _ = self._extract_usage_tokens(response.usage)
+        conversations, lengths = [], []
+        for choice in response.choices:
+            conversation = [m.copy() for m in messages]
+            self._append_chat_completion_message(conversation, choice.message)
+            lengths.append(sum(len(str(m.get("content") or "")) for m in conversation[len(messages) :]))
+            conversations.append(self.clean_cot_from_conversation(conversation))
+        n = len(conversations)
+        input_shares = _apportion(input_tokens, [1] * n)
+        cached_shares = _apportion(cached_input_tokens, [1] * n)
+        output_shares = _apportion(output_tokens, lengths if sum(lengths) > 0 else [1] * n)
+        return [
+            self.InternalRequestResult(
+                conversation, input_shares[i], output_shares[i], cached_input_tokens=cached_shares[i]
+            )
+            for i, conversation in enumerate(conversations)
+        ]
+
+    def _openai_query_chat_completions_streaming(self, idx, messages):
+        """Request steps for a query to the OpenAI chat completions API with streaming.
 
         Tool calls are ignored in streaming mode; we only aggregate the final text.
         """
@@ -1722,14 +2811,14 @@ class APIClient:
                 ts = time.strftime("%m%d-%H:%M:%S", time.localtime(time.time()))
                 ts += f".{datetime.now().microsecond:06d}"
                 request_logger.log_request(ts=ts, batch_idx=idx, request=payload, n_retries=n_retries)
-                response = client.chat.completions.create(**payload)
+                response = yield self.StreamCall("chat.completions.create", **payload)
             except Exception as e:
                 if "rate limit" not in str(e).lower() and "429" not in str(e):
                     total_retries += 1
                 request_logger.log_response(ts=ts, batch_idx=idx, response={"exception": str(e)})
-                if isinstance(e, RateLimitError):
-                    logger.info(f"Got OpenAI CC rate limit error. Sleeping for 60 seconds. Exception: {e}")
-                    time.sleep(60)
+                if isinstance(e, openai.RateLimitError):
+                    logger.info(f"Got OpenAI CC rate limit error. Backing off. Exception: {e}")
+                    yield self.Backoff(n_retries)
                     continue
                 if "maximum context length" in str(e).lower() or "input token count" in str(e).lower():
                     if max_output_tokens is not None:
@@ -1737,8 +2826,8 @@ class APIClient:
                         logger.info(
                             f"Got OpenAI CC max context length error. Reducing max output tokens to {max_output_tokens} and retrying. Exception: {e}"
                         )
-                logger.info(f"Got OpenAI CC non ratelimit error. Sleeping for 20 seconds: {e}")
-                time.sleep(60)
+                logger.info(f"Got OpenAI CC non ratelimit error. Backing off: {e}")
+                yield self.Backoff(n_retries)
                 continue
         if response is None:
             raise ValueError("Max inner retries reached.")
@@ -1855,7 +2944,8 @@ class APIClient:
         ts += f".{datetime.now().microsecond:06d}"
         request_logger.log_request(ts=ts, batch_idx=idx, request=payload)
 
-        response = requests.post(
+        session = get_http_session(self.base_url, self.api_key, pool_maxsize=self.max_keepalive_connections)
+        response = session.post(
             self.base_url,
             headers=headers,
             json=payload,
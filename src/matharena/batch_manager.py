@@ -0,0 +1,292 @@
+"""
+Batch-job manager for the OpenAI and Anthropic batch APIs: splits request sets to fit provider limits, persists
+batch IDs to disk, polls all jobs concurrently, re-attaches to jobs in flight after a restart, and streams results
+back as each batch ends.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+BATCH_STATE_DIR = "logs/batches"
+
+
+def batch_custom_id(body, sample_idx):
+    """Returns a custom_id that is stable across restarts: a hash of the request body plus the sample index.
+
+    Args:
+        body (dict): The request body.
+        sample_idx (int): Which sample of this body the request is.
+
+    Returns:
+        str: The custom_id (at most 64 characters of [a-zA-Z0-9_-], as required by Anthropic).
+    """
+    digest = hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"q{digest[:40]}-s{sample_idx}"
+
+
+class OpenAIBatchBackend:
+    """Submits chat completion requests to the OpenAI batch API."""
+
+    max_requests = 50_000
+    max_bytes = 190 * 1024 * 1024  # the input file limit is 200 MB
+    terminal_statuses = {"completed", "expired", "cancelled", "failed"}
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, requests):
+        """Submits (custom_id, body) pairs as one batch and returns the batch ID."""
+        with tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False) as f:
+            for custom_id, body in requests:
+                line = {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}
+                f.write(json.dumps(line).encode("utf-8"))
+                f.write(b"\n")
+            path = f.name
+        try:
+            with open(path, "rb") as f:
+                batch_input_file = self.client.files.create(file=f, purpose="batch")
+        finally:
+            os.remove(path)
+        batch = self.client.batches.create(
+            input_file_id=batch_input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    def poll(self, batch_id):
+        """Returns (has_ended, request_counts) of a batch."""
+        batch = self.client.batches.retrieve(batch_id)
+        return batch.status in self.terminal_statuses, dict(batch.request_counts)
+
+    def results(self, batch_id):
+        """Yields (custom_id, body or None) for each request of an ended batch; None marks a failed request."""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.output_file_id is None:
+            return
+        file_response = self.client.files.content(file_id=batch.output_file_id)
+        for line in file_response.iter_lines():
+            if not line:
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") != 200:
+                logger.error(f"Batch request {result['custom_id']} failed: {response.get('status_code')}")
+                yield result["custom_id"], None
+            else:
+                yield result["custom_id"], response["body"]
+
+
+class AnthropicBatchBackend:
+    """Submits message requests to the Anthropic message batches API."""
+
+    max_requests = 100_000
+    max_bytes = 250 * 1024 * 1024  # the request limit is 256 MB
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, requests):
+        """Submits (custom_id, params) pairs as one batch and returns the batch ID."""
+        message_batch = self.client.messages.batches.create(
+            requests=[{"custom_id": custom_id, "params": params} for custom_id, params in requests]
+        )
+        return message_batch.id
+
+    def poll(self, batch_id):
+        """Returns (has_ended, request_counts) of a batch."""
+        message_batch = self.client.messages.batches.retrieve(message_batch_id=batch_id)
+        return message_batch.processing_status == "ended", dict(message_batch.request_counts)
+
+    def results(self, batch_id):
+        """Yields (custom_id, message or None) for each request of an ended batch; None marks a failed request."""
+        for raw_result in self.client.messages.batches.results(message_batch_id=batch_id):
+            if raw_result.result.type == "succeeded":
+                yield raw_result.custom_id, raw_result.result.message
+            else:
+                if raw_result.result.type == "errored":
+                    logger.error(f"Batch request {raw_result.custom_id} failed: {raw_result.result.error}")
+                yield raw_result.custom_id, None
+
+
+class BatchJobManager:
+    """
+    Runs a set of requests through a batch backend. Every submitted batch is recorded in its own file under
+    state_dir/name, so a restarted process with the same requests picks up the batches already in flight.
+    """
+
+    def __init__(self, backend, name, max_retries=3, poll_interval=10, max_parallel_polls=16, state_dir=None):
+        """
+        Args:
+            backend (OpenAIBatchBackend|AnthropicBatchBackend): The provider backend.
+            name (str): Name of the job set (e.g. provider and model), used for the state directory.
+            max_retries (int, optional): How often a failed request is resubmitted. Defaults to 3.
+            poll_interval (int, optional): Seconds between polling rounds. Defaults to 10.
+            max_parallel_polls (int, optional): Batches polled at the same time. Defaults to 16.
+            state_dir (str, optional): Where batch records are kept. Defaults to BATCH_STATE_DIR.
+        """
+        self.backend = backend
+        self.name = name
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        self.max_parallel_polls = max_parallel_polls
+        self.state_dir = os.path.join(state_dir or BATCH_STATE_DIR, name)
+
+    def _job_path(self, batch_id):
+        return os.path.join(self.state_dir, f"{batch_id}.json")
+
+    def _load_jobs(self):
+        jobs = {}
+        if not os.path.isdir(self.state_dir):
+            return jobs
+        for filename in os.listdir(self.state_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.state_dir, filename), "r") as f:
+                    job = json.load(f)
+                jobs[job["batch_id"]] = job
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable batch record {filename}: {e}")
+        return jobs
+
+    def _save_job(self, job):
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = self._job_path(job["batch_id"]) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._job_path(job["batch_id"]))
+
+    def _forget_job(self, batch_id):
+        if os.path.exists(self._job_path(batch_id)):
+            os.remove(self._job_path(batch_id))
+
+    def _split(self, requests):
+        """Splits (custom_id, body) pairs into chunks that fit the request-count and size limits of the backend."""
+        chunks, chunk, chunk_bytes = [], [], 0
+        for custom_id, body in requests:
+            size = len(json.dumps(body, default=str)) + 200  # + envelope
+            is_full = len(chunk) >= self.backend.max_requests or chunk_bytes + size > self.backend.max_bytes
+            if len(chunk) > 0 and is_full:
+                chunks.append(chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append((custom_id, body))
+            chunk_bytes += size
+        if len(chunk) > 0:
+            chunks.append(chunk)
+        return chunks
+
+    def _submit(self, requests, attempts, active):
+        """Submits requests (dict custom_id -> body) in as many batches as needed and records them."""
+        for chunk in self._split(list(requests.items())):
+            for n_tries in range(self.max_retries + 1):
+                try:
+                    batch_id = self.backend.submit(chunk)
+                    break
+                except Exception as e:
+                    if n_tries == self.max_retries:
+                        raise
+                    logger.warning(f"[{self.name}] Could not submit a batch, retrying in {self.poll_interval}s: {e}")
+                    time.sleep(self.poll_interval)
+            custom_ids = [custom_id for custom_id, _ in chunk]
+            attempt = max(attempts[custom_id] for custom_id in custom_ids)
+            job = {"batch_id": batch_id, "custom_ids": custom_ids, "attempt": attempt, "submitted_at": time.time()}
+            self._save_job(job)
+            active[batch_id] = set(custom_ids)
+            logger.info(f"[{self.name}] Submitted batch {batch_id} with {len(chunk)} requests (attempt {attempt}).")
+
+    def _poll_all(self, batch_ids, counts):
+        """Polls the given batches concurrently and returns the IDs of those that have ended."""
+
+        def _poll(batch_id):
+            try:
+                return batch_id, self.backend.poll(batch_id)
+            except Exception as e:
+                logger.warning(f"[{self.name}] Error polling batch {batch_id}, will retry: {e}")
+                return batch_id, (False, counts.get(batch_id))
+
+        ended = []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel_polls, len(batch_ids)))) as executor:
+            for batch_id, (has_ended, request_counts) in executor.map(_poll, batch_ids):
+                if request_counts is not None and request_counts != counts.get(batch_id):
+                    counts[batch_id] = request_counts
+                    logger.info(f"[{self.name}] Batch {batch_id} progress: {request_counts}")
+                if has_ended:
+                    ended.append(batch_id)
+        return ended
+
+    def run(self, requests):
+        """Runs requests through the batch API, re-attaching to batches already in flight for the same requests.
+
+        Args:
+            requests (dict): custom_id -> request body. custom_ids must be stable across restarts (see batch_custom_id).
+
+        Yields:
+            tuple: (custom_id, result, attempt) as soon as the batch holding the request ends. result is the provider
+                response body, or None if the request still failed after max_retries resubmissions.
+        """
+        pending = dict(requests)
+        attempts = {custom_id: 0 for custom_id in requests}
+        active = {}  # batch_id -> custom_ids we still wait for
+
+        # Re-attach to batches in flight from an earlier process; a resubmission supersedes the batch it retries
+        jobs = sorted(self._load_jobs().items(), key=lambda item: (item[1]["attempt"], item[1]["submitted_at"]))
+        for batch_id, job in reversed(jobs):
+            wanted = {custom_id for custom_id in job["custom_ids"] if custom_id in pending}
+            if len(wanted) == 0:
+                if all(custom_id in requests for custom_id in job["custom_ids"]):
+                    self._forget_job(batch_id)  # every request is in a later batch
+                continue
+            for custom_id in wanted:
+                del pending[custom_id]
+                attempts[custom_id] = job["attempt"]
+            active[batch_id] = wanted
+            logger.info(f"[{self.name}] Re-attaching to batch {batch_id} ({len(wanted)} of our requests).")
+        if len(pending) > 0:
+            self._submit(pending, attempts, active)
+
+        counts = {}
+        consumed = []  # batches whose results were all yielded
+        while len(active) > 0:
+            # The caller asked for more after the last result of these batches, so it has handled all of them
+            for batch_id in consumed:
+                self._forget_job(batch_id)
+            consumed = []
+            ended = self._poll_all(list(active.keys()), counts)
+            if len(ended) == 0:
+                time.sleep(self.poll_interval)
+                continue
+            for batch_id in ended:
+                wanted = active.pop(batch_id)
+                retry = {}
+                try:
+                    for custom_id, result in self.backend.results(batch_id):
+                        if custom_id not in wanted:
+                            continue
+                        wanted.discard(custom_id)
+                        if result is None:
+                            retry[custom_id] = requests[custom_id]
+                        else:
+                            yield custom_id, result, attempts[custom_id]
+                except Exception as e:
+                    logger.error(f"[{self.name}] Error reading the results of batch {batch_id}: {e}")
+                for custom_id in wanted:  # no (readable) result
+                    retry[custom_id] = requests[custom_id]
+                consumed.append(batch_id)
+
+                for custom_id in list(retry.keys()):
+                    attempts[custom_id] += 1
+                    if attempts[custom_id] > self.max_retries:
+                        del retry[custom_id]
+                        yield custom_id, None, attempts[custom_id]
+                if len(retry) > 0:
+                    logger.info(f"[{self.name}] Resubmitting {len(retry)} failed requests of batch {batch_id}.")
+                    self._submit(retry, attempts, active)
+        for batch_id in consumed:
+            self._forget_job(batch_id)
@@ -0,0 +1,134 @@
+"""
+Submission order of the runs in a batch. Policies estimate how long and how expensive a new run of a problem will be
+from the detailed costs recorded for its earlier runs, e.g. to start the slowest problems first so they do not set the
+makespan of a sweep.
+"""
+
+import threading
+
+from loguru import logger
+
+ESTIMATE_KEYS = ["time", "output_tokens", "cost"]
+
+
+def estimate_run_costs(detailed_costs_by_problem):
+    """Estimates the time, output tokens and cost of a new run of each problem from its earlier runs.
+
+    Args:
+        detailed_costs_by_problem (dict): Problem key -> list of detailed_cost dicts of its earlier runs.
+
+    Returns:
+        dict: Problem key -> {"time", "output_tokens", "cost"} means. Problems without history get the mean over the
+            problems that have one, and None values if no problem has one.
+    """
+    estimates, known = {}, {key: [] for key in ESTIMATE_KEYS}
+    for problem, detailed_costs in detailed_costs_by_problem.items():
+        estimates[problem] = {}
+        for key in ESTIMATE_KEYS:
+            values = [dc[key] for dc in detailed_costs if isinstance(dc.get(key), (int, float))]
+            estimates[problem][key] = sum(values) / len(values) if len(values) > 0 else None
+            if estimates[problem][key] is not None:
+                known[key].append(estimates[problem][key])
+    for estimate in estimates.values():
+        for key in ESTIMATE_KEYS:
+            if estimate[key] is None and len(known[key]) > 0:
+                estimate[key] = sum(known[key]) / len(known[key])
+    return estimates
+
+
+def _expected(estimate, key):
+    return (estimate.get(key) or 0) if estimate is not None else 0
+
+
+def problem_order(problems, estimates, budget=None):
+    """Runs in the order they were added to the batch (problem by problem)."""
+    return list(range(len(problems)))
+
+
+def longest_first(problems, estimates, budget=None):
+    """Runs of the problems with the longest expected time (then most output tokens) first."""
+    return sorted(
+        range(len(problems)),
+        key=lambda i: (-_expected(estimates[i], "time"), -_expected(estimates[i], "output_tokens")),
+    )
+
+
+def round_robin(problems, estimates, budget=None):
+    """One run of every problem, then a second run of every problem, ..., so partial results stay balanced."""
+    rounds, first_seen, n_seen = [], {}, {}
+    for problem in problems:
+        first_seen.setdefault(problem, len(first_seen))
+        rounds.append(n_seen.get(problem, 0))
+        n_seen[problem] = rounds[-1] + 1
+    return sorted(range(len(problems)), key=lambda i: (rounds[i], first_seen[problems[i]]))
+
+
+def cheapest_first(problems, estimates, budget=None):
+    """Runs with the lowest expected cost first, leaving out the runs that would exceed the budget (in USD)."""
+    order = sorted(range(len(problems)), key=lambda i: _expected(estimates[i], "cost"))
+    if budget is None:
+        return order
+    if all(estimate is None or estimate.get("cost") is None for estimate in estimates):
+        logger.warning("No earlier runs with costs to estimate from, the budget is not enforced.")
+        return order
+    selected, spent = [], 0.0
+    for i in order:
+        if spent + _expected(estimates[i], "cost") > budget:
+            break
+        selected.append(i)
+        spent += _expected(estimates[i], "cost")
+    if len(selected) < len(order):
+        logger.info(
+            f"Budget of ${budget:.2f} covers {len(selected)} of {len(order)} runs (expected cost ${spent:.2f}), "
+            "deferring the rest."
+        )
+    return selected
+
+
+_POLICIES = {
+    "problem": problem_order,
+    "longest_first": longest_first,
+    "round_robin": round_robin,
+    "cheapest_first": cheapest_first,
+}
+_POLICIES_LOCK = threading.Lock()
+
+
+def register_ordering_policy(name, policy):
+    """Registers a batch ordering policy.
+
+    Args:
+        name (str): The name used to select the policy (e.g. with --ordering).
+        policy (callable): Takes the problem key of each batch entry, the estimate of each entry (from
+            estimate_run_costs, or None) and an optional budget, and returns the batch positions to submit in order.
+    """
+    with _POLICIES_LOCK:
+        _POLICIES[name] = policy
+
+
+def ordering_policies():
+    """Returns the names of the registered ordering policies."""
+    with _POLICIES_LOCK:
+        return list(_POLICIES)
+
+
+def order_batch(policy, problems, estimates, budget=None):
+    """Orders the entries of a batch with a registered policy.
+
+    Args:
+        policy (str): The name of the policy.
+        problems (list): The problem key of each batch entry.
+        estimates (list): The expected {"time", "output_tokens", "cost"} of each batch entry, or None.
+        budget (float, optional): Maximum expected cost in USD of the submitted runs, for policies that support one.
+
+    Returns:
+        list[int]: The positions of the entries to submit, in submission order.
+    """
+    with _POLICIES_LOCK:
+        if policy not in _POLICIES:
+            raise ValueError(f"Unknown batch ordering policy {policy}, expected one of {list(_POLICIES)}.")
+        policy_fn = _POLICIES[policy]
+    order = policy_fn(problems, estimates, budget)
+    if len(set(order)) != len(order) or any(i not in range(len(problems)) for i in order):
+        raise ValueError(f"Batch ordering policy {policy} returned invalid positions.")
+    return order
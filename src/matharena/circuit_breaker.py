@@ -0,0 +1,206 @@
+"""
+Per-provider circuit breakers, retry budgets and jittered exponential backoff, shared by all APIClients in the process.
+"""
+
+import random
+import threading
+import time
+
+from loguru import logger
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request waited too long for an open circuit breaker to let it through."""
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, rng=random):
+    """Returns a "full jitter" exponential backoff delay: uniform in [0, min(cap, base * 2^attempt)].
+
+    Args:
+        attempt (int): The number of failures so far (0 for the first retry).
+        base (float, optional): The delay scale in seconds. Defaults to 1.
+        cap (float, optional): The maximum delay in seconds. Defaults to 60.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    return rng.uniform(0, min(cap, base * 2 ** min(attempt, 32)))
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one provider endpoint.
+    closed: requests flow. After failure_threshold consecutive outage errors (5xx, connection errors, timeouts)
+    the breaker opens: requests wait instead of being sent. After open_seconds one probe request is let through
+    (half-open); if it succeeds the breaker closes, otherwise it reopens for twice as long (up to max_open_seconds).
+    Independently, retries draw from a budget refilled by retry_ratio per request sent, so retries stay a bounded
+    fraction of the traffic.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=5,
+        open_seconds=5,
+        max_open_seconds=120,
+        retry_ratio=0.2,
+        min_retries_per_minute=10,
+        max_retry_balance=50,
+    ):
+        """
+        Args:
+            name (str): Name of the endpoint, for logging.
+            failure_threshold (int, optional): Consecutive outage errors that open the breaker. Defaults to 5.
+            open_seconds (float, optional): Time until the first probe after opening. Defaults to 5.
+            max_open_seconds (float, optional): Ceiling for the time between probes. Defaults to 120.
+            retry_ratio (float, optional): Retries allowed per request sent. Defaults to 0.2.
+            min_retries_per_minute (float, optional): Retries allowed regardless of traffic. Defaults to 10.
+            max_retry_balance (float, optional): Maximum number of retries that can be saved up. Defaults to 50.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.retry_ratio = retry_ratio
+        self.min_retries_per_minute = min_retries_per_minute
+        self.max_retry_balance = max_retry_balance
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._current_open_seconds = open_seconds
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._retry_balance = float(max_retry_balance)
+        self._balance_updated = time.monotonic()
+        self._counts = {"requests": 0, "retries": 0, "trips": 0, "probes": 0}
+        self._budget_wait = 0.0
+
+    def check(self):
+        """Asks whether a request may be sent now.
+
+        Returns:
+            float: 0 if the request may be sent, otherwise the number of seconds to wait before asking again.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            now = time.monotonic()
+            if self.state == self.OPEN and now < self._open_until:
+                return min(1.0, self._open_until - now)
+            if self._probe_in_flight:
+                return 1.0
+            # Half-open: let exactly one probe through
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = True
+            self._counts["probes"] += 1
+            logger.info(f"[{self.name}] Circuit breaker half-open, sending a probe request.")
+            return 0.0
+
+    def record(self, outcome):
+        """Records the outcome of a request that was sent.
+
+        Args:
+            outcome (str): As returned by classify_api_error, or "success".
+        """
+        with self._lock:
+            self._counts["requests"] += 1
+            self._refill_retry_balance()
+            self._retry_balance = min(self.max_retry_balance, self._retry_balance + self.retry_ratio)
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+            if outcome in ["server_error", "connection_error"]:
+                self._consecutive_failures += 1
+                if self.state == self.HALF_OPEN:
+                    self._current_open_seconds = min(2 * self._current_open_seconds, self.max_open_seconds)
+                    self._open(f"probe failed ({outcome})")
+                elif self.state == self.CLOSED and self._consecutive_failures >= self.failure_threshold:
+                    self._counts["trips"] += 1
+                    self._open(f"{self._consecutive_failures} consecutive failures ({outcome})")
+            else:
+                # Any other answer (even a 429 or 400) means the endpoint is reachable
+                self._consecutive_failures = 0
+                if self.state != self.CLOSED:
+                    logger.info(f"[{self.name}] Circuit breaker closed, the provider answers again.")
+                    self.state = self.CLOSED
+                    self._current_open_seconds = self.open_seconds
+
+    def release_probe(self):
+        """Gives back the half-open probe slot of a request that was cancelled before it had an outcome, so that the
+        next check() sends a new probe instead of waiting forever."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _open(self, reason):
+        # Must hold self._lock
+        self.state = self.OPEN
+        self._open_until = time.monotonic() + self._current_open_seconds
+        logger.warning(
+            f"[{self.name}] Circuit breaker open after {reason}, next probe in {self._current_open_seconds:.0f}s."
+        )
+
+    def _refill_retry_balance(self):
+        # Must hold self._lock
+        now = time.monotonic()
+        refill = (now - self._balance_updated) * self.min_retries_per_minute / 60
+        self._retry_balance = min(self.max_retry_balance, self._retry_balance + refill)
+        self._balance_updated = now
+
+    def retry_delay(self, attempt, base=1.0, cap=60.0):
+        """Takes one retry from the budget and returns how long to wait before retrying.
+
+        Args:
+            attempt (int): The number of failures of this request so far.
+            base (float, optional): The backoff scale in seconds. Defaults to 1.
+            cap (float, optional): The maximum backoff in seconds. Defaults to 60.
+
+        Returns:
+            float: The jittered backoff plus any wait for the retry budget to refill.
+        """
+        with self._lock:
+            self._counts["retries"] += 1
+            self._refill_retry_balance()
+            self._retry_balance -= 1
+            # An overdrawn budget is repaid by the minimum refill rate alone, so this bounds the retry rate
+            budget_wait = max(0.0, -self._retry_balance * 60 / self.min_retries_per_minute)
+            self._budget_wait += budget_wait
+        return backoff_delay(attempt, base, cap) + budget_wait
+
+    def stats(self):
+        """Returns the state, request/retry/trip/probe counts and the total time retries waited for budget."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                **self._counts,
+                "retry_balance": round(self._retry_balance, 1),
+                "seconds_waited_for_budget": round(self._budget_wait, 1),
+            }
+
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_circuit_breaker(api, base_url, failure_threshold=5, retry_ratio=0.2):
+    """Returns the process-wide circuit breaker for a provider endpoint, creating it on first use.
+
+    Args:
+        api (str): The API of the client.
+        base_url (str): The base URL of the client (None for the SDK default).
+        failure_threshold (int, optional): Consecutive outage errors that open the breaker, if it is created.
+        retry_ratio (float, optional): Retries allowed per request sent, if it is created.
+
+    Returns:
+        CircuitBreaker: The breaker shared by all clients with this (api, base_url).
+    """
+    key = (api, base_url)
+    with _BREAKERS_LOCK:
+        if key not in _BREAKERS:
+            name = api if base_url is None else f"{api} @ {base_url}"
+            _BREAKERS[key] = CircuitBreaker(name, failure_threshold=failure_threshold, retry_ratio=retry_ratio)
+        return _BREAKERS[key]
@@ -0,0 +1,194 @@
+"""
+Registry of long-lived SDK clients and HTTP sessions, so connection pools and TLS sessions survive across queries.
+"""
+
+import asyncio
+import hashlib
+import threading
+
+from matharena.plugins import lazy_import
+
+# Only the SDK of the api a client uses gets imported
+anthropic = lazy_import("anthropic")
+httpx = lazy_import("httpx")
+openai = lazy_import("openai")
+requests = lazy_import("requests")
+requests_adapters = lazy_import("requests.adapters")
+together = lazy_import("together")
+
+DEFAULT_MAX_CONNECTIONS = 1000
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 100
+
+
+class ConnectionStats:
+    """Counts requests sent by one pooled client and how many of them had to open a new connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def count(self, new_connection):
+        with self._lock:
+            self.requests += 1
+            self.new_connections += int(new_connection)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": self.requests - self.new_connections,
+            }
+
+
+def _connection_counting_hooks(stats, async_client):
+    """Returns httpx event hooks that attach an httpcore trace to each request to see if it opened a connection."""
+
+    def _on_request_sync(request):
+        state = {"new": False}
+
+        def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                state["new"] = True
+            elif event_name.endswith("send_request_headers.started"):
+                stats.count(state["new"])
+
+        request.extensions["trace"] = trace
+
+    async def _on_request_async(request):
+        state = {"new": False}
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                state["new"] = True
+            elif event_name.endswith("send_request_headers.started"):
+                stats.count(state["new"])
+
+        request.extensions["trace"] = trace
+
+    return {"request": [_on_request_async if async_client else _on_request_sync]}
+
+
+_CLIENTS = {}
+_STATS = {}
+_SESSIONS = {}
+_LOCK = threading.Lock()
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+
+def _key_hash(api_key):
+    return hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()[:8]
+
+
+def get_event_loop():
+    """Returns the process-wide event loop (running in a daemon thread) used by the asyncio backend.
+    Async clients are bound to the loop they were created on, so pooling them requires one long-lived loop.
+    """
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="matharena-event-loop", daemon=True).start()
+        return _LOOP
+
+
+def get_sdk_client(
+    api, api_key, base_url, timeout, async_client=False, max_connections=None, max_keepalive_connections=None
+):
+    """Returns the shared SDK client for (api, base_url, key, timeout), creating it on first use.
+
+    Args:
+        api (str): "openai" (any OpenAI-compatible endpoint), "together", or "anthropic".
+        api_key (str): The API key.
+        base_url (str): The base URL (None for the SDK default).
+        timeout (int): The request timeout in seconds.
+        async_client (bool, optional): Whether to return the asyncio client. Defaults to False.
+        max_connections (int, optional): Connection pool size. Defaults to DEFAULT_MAX_CONNECTIONS.
+        max_keepalive_connections (int, optional): Idle connections kept open.
+            Defaults to DEFAULT_MAX_KEEPALIVE_CONNECTIONS.
+
+    Returns:
+        The SDK client.
+    """
+    key = (api, _key_hash(api_key), base_url, timeout, async_client)
+    with _LOCK:
+        if key in _CLIENTS:
+            return _CLIENTS[key]
+
+        name = f"{api} @ {base_url}" if base_url is not None else api
+        stats = _STATS.setdefault(name, ConnectionStats())
+        limits = httpx.Limits(
+            max_connections=max_connections or DEFAULT_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive_connections or DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        hooks = _connection_counting_hooks(stats, async_client)
+        if api == "anthropic":
+            http_client_cls = anthropic.DefaultAsyncHttpxClient if async_client else anthropic.DefaultHttpxClient
+            client_cls = anthropic.AsyncAnthropic if async_client else anthropic.Anthropic
+            client = client_cls(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                timeout=timeout,
+                http_client=http_client_cls(limits=limits, event_hooks=hooks),
+            )
+        elif api == "together":
+            # The Together SDK manages its own sessions; we can only reuse the client object
+            client_cls = together.AsyncTogether if async_client else together.Together
+            client = client_cls(api_key=api_key, timeout=timeout, max_retries=0)
+        else:
+            http_client_cls = openai.DefaultAsyncHttpxClient if async_client else openai.DefaultHttpxClient
+            client_cls = openai.AsyncOpenAI if async_client else openai.OpenAI
+            client = client_cls(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                timeout=timeout,
+                http_client=http_client_cls(limits=limits, event_hooks=hooks),
+            )
+        _CLIENTS[key] = client
+        return client
+
+
+def get_http_session(base_url, api_key, pool_maxsize=None):
+    """Returns a shared requests.Session for raw HTTP endpoints (e.g. the Google internal tools API).
+
+    Args:
+        base_url (str): The URL the session is used for.
+        api_key (str): The API key (sessions are not shared across keys).
+        pool_maxsize (int, optional): Connections kept per host. Defaults to DEFAULT_MAX_KEEPALIVE_CONNECTIONS.
+
+    Returns:
+        requests.Session: The session.
+    """
+    key = (_key_hash(api_key), base_url)
+    with _LOCK:
+        if key not in _SESSIONS:
+            session = requests.Session()
+            adapter = requests_adapters.HTTPAdapter(pool_maxsize=pool_maxsize or DEFAULT_MAX_KEEPALIVE_CONNECTIONS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSIONS[key] = session
+        return _SESSIONS[key]
+
+
+def connection_stats():
+    """Returns new vs reused connection counts per pooled client, keyed by endpoint name."""
+    with _LOCK:
+        stats = {name: s.as_dict() for name, s in _STATS.items()}
+        sessions = list(_SESSIONS.items())
+    for (_, base_url), session in sessions:
+        n_requests, n_connections = 0, 0
+        pools = session.get_adapter(base_url).poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools[pool_key]
+            n_requests += pool.num_requests
+            n_connections += pool.num_connections
+        stats[base_url] = {
+            "requests": n_requests,
+            "new_connections": n_connections,
+            "reused_connections": n_requests - n_connections,
+        }
+    return stats
@@ -7,7 +7,8 @@ from pathlib import Path
 import yaml
 from loguru import logger
 
-from matharena.json_zst import load_json_zst
+from matharena.json_zst import OUTPUT_JSON_SUFFIX
+from matharena.runs import load_runs_file
 
 
 def check_valid_config(config):
@@ -122,7 +123,9 @@ def extract_existing_configs(
             exists = True
             if not is_final_answer:
                 for file in os.listdir(os.path.join(root_dir, comp, config_path)):
-                    data = load_json_zst(os.path.join(root_dir, comp, config_path, file))
+                    if not file.endswith(OUTPUT_JSON_SUFFIX):
+                        continue  # run logs and locks
+                    data = load_runs_file(os.path.join(root_dir, comp, config_path, file))
                     if "judgment" not in data and not allow_non_existing_judgment:
                         logger.warning(f"Judgment not found in {file}")
                         exists = False
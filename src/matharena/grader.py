@@ -9,7 +9,6 @@ from loguru import logger
 
 from matharena.parser import WarningType, check_answers, extract_answer, extract_boxed_answer, parse_answer
 from matharena.tools.submit_answer import check_hash_match
-from matharena.tools.lean_execution import COMPARATOR_TIMEOUT_WARNING, get_lean_feedback_dict_with_formal_statement
 
 from matharena.utils import is_conversation_broken
 
@@ -137,6 +136,8 @@ def check_output_length(length):
 
 
 def grade_lean_submission(messages, competition_config, problem, debug_info=""):
+    from matharena.tools.lean_execution import COMPARATOR_TIMEOUT_WARNING, get_lean_feedback_dict_with_formal_statement
+
     last_message = messages[-1]["content"]
     formal_statement = problem.get("formal_statement")
 
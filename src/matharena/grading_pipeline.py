@@ -0,0 +1,156 @@
+"""
+Process-wide pipeline stage that grades and saves solver responses off the thread consuming them. Grading runs on
+worker threads that hand the CPU-heavy answer extraction to a process pool; results of one problem are saved in the
+order their responses arrived, and submitting blocks while too many responses are pending (backpressure).
+"""
+
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from loguru import logger
+
+DEFAULT_GRADING_WORKERS = min(8, os.cpu_count() or 1)
+DEFAULT_MAX_PENDING = 64
+
+
+class GradingPipeline:
+    """Runs grading work on threads and a process pool and commits results in order per key."""
+
+    def __init__(self, workers=DEFAULT_GRADING_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        """
+        Args:
+            workers (int, optional): Number of grading processes; twice as many threads feed them, since work such as
+                last-chance reprompts waits on the API. Defaults to DEFAULT_GRADING_WORKERS. 0 grades inline.
+            max_pending (int, optional): Responses that may be submitted but not yet committed before submit blocks.
+                Defaults to DEFAULT_MAX_PENDING.
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._threads = None
+        self._processes = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._last_commit = {}  # key -> event set once the latest submitted item of that key has committed
+        self._pending = set()
+        self._stats = {"submitted": 0, "committed": 0, "errors": 0, "blocked": 0, "in_process": 0, "inline": 0}
+
+    def configure(self, workers=None, max_pending=None):
+        """Changes the number of workers and the pending limit; only possible before the first submit."""
+        with self._lock:
+            if self._threads is not None:
+                logger.warning("The grading pipeline is already running, ignoring the new configuration.")
+                return
+            if workers is not None:
+                self.workers = workers
+            if max_pending is not None:
+                self.max_pending = max_pending
+                self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _thread_pool(self):
+        # Must hold self._lock
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=max(1, 2 * self.workers), thread_name_prefix="grading")
+        return self._threads
+
+    def run_in_process(self, fn, *args, **kwargs):
+        """Runs a module-level function in the grading process pool and returns its result, blocking the calling
+        (grading) thread. Falls back to running it in the calling thread if the arguments cannot be sent to a process.
+        """
+        with self._lock:
+            if self.workers > 0 and self._processes is None:
+                # spawn: forking a process whose other threads hold locks (HTTP pools, loggers) is unsafe
+                self._processes = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            processes = self._processes
+        if processes is None:
+            self._count("inline")
+            return fn(*args, **kwargs)
+        try:
+            result = processes.submit(fn, *args, **kwargs).result()
+        except (pickle.PicklingError, BrokenProcessPool, AttributeError, TypeError) as e:
+            if isinstance(e, (AttributeError, TypeError)) and "pickle" not in str(e).lower():
+                raise
+            if isinstance(e, BrokenProcessPool):
+                with self._lock:
+                    if self._processes is processes:
+                        self._processes = None  # a worker died; start a new pool on the next call
+            logger.warning(f"Could not grade in a worker process, grading in this thread: {e}")
+            self._count("inline")
+            return fn(*args, **kwargs)
+        self._count("in_process")
+        return result
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def submit(self, key, work, commit):
+        """Hands one response to the pipeline. Blocks while max_pending responses are pending.
+
+        Args:
+            key (hashable): Items with the same key (e.g. the output file of a problem) commit in submission order.
+            work (callable): Grades the response on a grading thread; may use run_in_process for CPU-heavy parts.
+            commit (callable): Takes the result of work and saves it. Not called if work raised.
+
+        Returns:
+            Future: Done once the response has been committed (or failed).
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count("blocked")
+            self._slots.acquire()
+        with self._lock:
+            previous = self._last_commit.get(key)
+            committed = threading.Event()
+            self._last_commit[key] = committed
+            self._stats["submitted"] += 1
+            future = self._thread_pool().submit(self._run, work, commit, previous, committed)
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _run(self, work, commit, previous, committed):
+        # Threads pick up items in submission order, so the item before this one of the same key is already running
+        # and waiting here cannot deadlock
+        try:
+            try:
+                result = work()
+            finally:
+                if previous is not None:
+                    previous.wait()
+            commit(result)
+            self._count("committed")
+        except Exception as e:
+            self._count("errors")
+            logger.opt(exception=True).error(f"Error in the grading pipeline: {e}")
+        finally:
+            committed.set()
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def wait(self, futures=None):
+        """Blocks until the given submitted responses, or all of them, have been committed."""
+        if futures is not None:
+            for future in futures:
+                future.result()
+            return
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if len(pending) == 0:
+                return
+            for future in pending:
+                future.result()
+
+    def stats(self):
+        """Returns counters of submitted, committed and failed responses and how often submit blocked."""
+        with self._lock:
+            return {**self._stats, "pending": len(self._pending)}
+
+
+grading_pipeline = GradingPipeline()
@@ -0,0 +1,88 @@
+"""
+Hedged requests: once most of a batch has finished, queries running far longer than their peers get a duplicate,
+and whichever copy finishes first is kept.
+"""
+
+import threading
+
+HEDGE_CHECK_INTERVAL = 1.0  # seconds between straggler checks
+
+
+class HedgeCancelled(Exception):
+    """Raised inside a request copy that lost the race against its duplicate."""
+
+
+class HedgeTicket:
+    """One copy of a hedged query: a cancellation flag and the tokens its finished API calls used."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_input_tokens = 0
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def add_usage(self, input_tokens, output_tokens, cached_input_tokens=0):
+        """Adds the usage of one finished API call of this copy."""
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cached_input_tokens += cached_input_tokens
+
+
+class HedgePolicy:
+    """
+    Decides which running queries of one run_queries call to duplicate.
+    Hedging starts when after_fraction of the queries have finished and none are waiting to start; from then on a
+    query running longer than the given percentile of the finished request times is duplicated (at most once).
+    """
+
+    def __init__(self, n_queries, after_fraction=0.9, percentile=90, min_samples=5):
+        """
+        Args:
+            n_queries (int): The number of queries in the batch.
+            after_fraction (float, optional): The fraction of finished queries after which hedging starts.
+                Defaults to 0.9.
+            percentile (float, optional): The percentile of finished request times a query must exceed to be
+                duplicated. Defaults to 90.
+            min_samples (int, optional): The minimum number of finished queries to estimate the percentile from.
+                Defaults to 5.
+        """
+        self.n_queries = n_queries
+        self.after_fraction = after_fraction
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latencies = []
+        self.hedged = set()
+
+    def record(self, latency):
+        """Records the request time of a finished query."""
+        self.latencies.append(latency)
+
+    def threshold(self):
+        """Returns the running time after which a query is duplicated, or None if hedging has not started."""
+        n_done = len(self.latencies)
+        if n_done < max(self.min_samples, self.after_fraction * self.n_queries):
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(n_done - 1, int(n_done * self.percentile / 100))]
+
+    def stragglers(self, started_at, now):
+        """Returns the queries to duplicate now and marks them as hedged.
+
+        Args:
+            started_at (dict): key -> start time of every running query that has not been hedged yet.
+            now (float): The current time.
+
+        Returns:
+            list: The keys of the queries to duplicate.
+        """
+        threshold = self.threshold()
+        if threshold is None:
+            return []
+        keys = [key for key, start in started_at.items() if key not in self.hedged and now - start > threshold]
+        self.hedged.update(keys)
+        return keys
@@ -0,0 +1,225 @@
+"""
+Process-wide store of the images of multimodal problems. Each image is decoded and, if an image budget is configured,
+downscaled or re-encoded once; queries, request logs, retries and the response cache then carry a short reference
+(IMAGE_REF_PREFIX + content hash) that is replaced by the image data only in the payload handed to the SDK.
+"""
+
+import base64
+import hashlib
+import io
+import threading
+
+from loguru import logger
+
+IMAGE_REF_PREFIX = "matharena-image:"
+DEFAULT_MEDIA_TYPE = "image/png"
+JPEG_QUALITIES = [90, 80, 70, 60]  # tried in order when an image has to be re-encoded to fit max_bytes
+MAX_DOWNSCALE_STEPS = 8  # times an image is shrunk by DOWNSCALE_FACTOR when no quality fits max_bytes
+DOWNSCALE_FACTOR = 0.75
+
+_MAGIC_MEDIA_TYPES = [
+    (b"\x89PNG", "image/png"),
+    (b"\xff\xd8", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+    (b"RIFF", "image/webp"),
+]
+
+
+def is_image_ref(value):
+    """Returns whether a value is a reference to an image in the store."""
+    return isinstance(value, str) and value.startswith(IMAGE_REF_PREFIX)
+
+
+def _media_type(image_bytes):
+    for magic, media_type in _MAGIC_MEDIA_TYPES:
+        if image_bytes.startswith(magic):
+            return media_type
+    return DEFAULT_MEDIA_TYPE
+
+
+class ImageStore:
+    """Stores every distinct image once, keyed by the hash of the image bytes that are sent to the API."""
+
+    def __init__(self, max_pixels=None, max_bytes=None):
+        """
+        Args:
+            max_pixels (int, optional): Images with more pixels are downscaled (keeping the aspect ratio) to at most
+                this many. Defaults to None (no limit).
+            max_bytes (int, optional): Images larger than this are re-encoded as JPEG, and downscaled further if
+                needed, to fit. Defaults to None (no limit).
+        """
+        self.max_pixels = max_pixels
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._images = {}  # reference -> {"media_type", "b64", "data_url"}
+        self._prepared = {}  # (hash of the original bytes, budget) -> reference
+        self._stats = {"images": 0, "puts": 0, "resized": 0, "original_bytes": 0, "stored_bytes": 0}
+
+    def configure(self, max_pixels=None, max_bytes=None):
+        """Sets the image budget; applies to images put after the call."""
+        with self._lock:
+            if max_pixels is not None:
+                self.max_pixels = max_pixels
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+
+    def put(self, image):
+        """Adds an image to the store, fitting it to the budget the first time these bytes are seen.
+
+        Args:
+            image (str | bytes): The image as base64 (optionally as a data URL), raw bytes, or an existing reference.
+
+        Returns:
+            str: The reference to the stored image.
+        """
+        if is_image_ref(image):
+            return image
+        if isinstance(image, str):
+            if image.startswith("data:"):
+                image = image.split(",", 1)[1]
+            image = base64.b64decode(image)
+        with self._lock:
+            self._stats["puts"] += 1
+            budget = (self.max_pixels, self.max_bytes)
+        original_key = (hashlib.sha256(image).hexdigest(), budget)
+        with self._lock:
+            if original_key in self._prepared:
+                return self._prepared[original_key]
+
+        prepared = self._fit_budget(image, *budget)
+        ref = IMAGE_REF_PREFIX + hashlib.sha256(prepared).hexdigest()
+        media_type = _media_type(prepared)
+        b64 = base64.b64encode(prepared).decode("utf-8")
+        with self._lock:
+            self._prepared[original_key] = ref
+            if ref not in self._images:
+                data_url = f"data:{media_type};base64,{b64}"
+                self._images[ref] = {"media_type": media_type, "b64": b64, "data_url": data_url}
+                self._stats["images"] += 1
+                self._stats["original_bytes"] += len(image)
+                self._stats["stored_bytes"] += len(prepared)
+                if prepared is not image:
+                    self._stats["resized"] += 1
+        return ref
+
+    def _fit_budget(self, image_bytes, max_pixels, max_bytes):
+        """Returns the image bytes downscaled to max_pixels and re-encoded to fit max_bytes (unchanged if they fit)."""
+        if max_pixels is None and max_bytes is None:
+            return image_bytes
+        try:
+            from PIL import Image
+        except ImportError:
+            logger.warning("Pillow is not installed, sending images without applying the image budget.")
+            return image_bytes
+
+        with Image.open(io.BytesIO(image_bytes)) as opened:
+            image = opened.copy()
+            image_format = opened.format or "PNG"
+        n_pixels = image.width * image.height
+        too_many_pixels = max_pixels is not None and n_pixels > max_pixels
+        too_large = max_bytes is not None and len(image_bytes) > max_bytes
+        if not too_many_pixels and not too_large:
+            return image_bytes
+        if too_many_pixels:
+            scale = (max_pixels / n_pixels) ** 0.5
+            image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.LANCZOS)
+
+        encoded = self._encode(image, image_format)
+        for _ in range(MAX_DOWNSCALE_STEPS):
+            if max_bytes is None or len(encoded) <= max_bytes:
+                break
+            encoded = self._encode_jpeg(image, max_bytes)
+            if len(encoded) <= max_bytes:
+                break
+            image = image.resize(
+                (max(1, int(image.width * DOWNSCALE_FACTOR)), max(1, int(image.height * DOWNSCALE_FACTOR))),
+                Image.LANCZOS,
+            )
+            encoded = self._encode(image, image_format)
+        if max_bytes is not None and len(encoded) > max_bytes:
+            logger.warning(f"Could not fit an image into {max_bytes} bytes, sending it with {len(encoded)} bytes.")
+        return encoded
+
+    @staticmethod
+    def _encode(image, image_format):
+        buffer = io.BytesIO()
+        if image_format.upper() in ["JPEG", "JPG"]:
+            image.convert("RGB").save(buffer, format="JPEG", quality=JPEG_QUALITIES[0])
+        else:
+            image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _encode_jpeg(image, max_bytes):
+        """Encodes as JPEG with the highest quality of JPEG_QUALITIES that fits max_bytes (else the lowest)."""
+        from PIL import Image
+
+        if image.mode in ["RGBA", "LA", "P"]:
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))  # transparent diagrams go on white
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+        else:
+            image = image.convert("RGB")
+        for quality in JPEG_QUALITIES:
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality)
+            if buffer.tell() <= max_bytes:
+                break
+        return buffer.getvalue()
+
+    def _entry(self, ref):
+        with self._lock:
+            if ref not in self._images:
+                raise KeyError(f"Image {ref} is not in the image store of this process.")
+            return self._images[ref]
+
+    def media_type(self, ref):
+        """Returns the media type (e.g. image/png) of a stored image."""
+        return self._entry(ref)["media_type"]
+
+    def data_url(self, ref):
+        """Returns a stored image as a base64 data URL."""
+        return self._entry(ref)["data_url"]
+
+    def base64(self, ref):
+        """Returns a stored image as base64."""
+        return self._entry(ref)["b64"]
+
+    def resolve(self, payload):
+        """Returns the payload with image references replaced by the image data; only the containers holding a
+        reference are copied. References in a "data" field (Anthropic image sources) become plain base64, all other
+        references become data URLs.
+
+        Args:
+            payload: The SDK call arguments (dicts, lists and tuples of values).
+
+        Returns:
+            The payload with the images, or the payload itself if it holds no reference.
+        """
+        if isinstance(payload, dict):
+            resolved = None
+            for key, value in payload.items():
+                if is_image_ref(value):
+                    new_value = self.base64(value) if key == "data" else self.data_url(value)
+                else:
+                    new_value = self.resolve(value)
+                if new_value is not value:
+                    if resolved is None:
+                        resolved = dict(payload)
+                    resolved[key] = new_value
+            return payload if resolved is None else resolved
+        if isinstance(payload, (list, tuple)):
+            values = [self.data_url(value) if is_image_ref(value) else self.resolve(value) for value in payload]
+            if all(new is old for new, old in zip(values, payload)):
+                return payload
+            return type(payload)(values) if isinstance(payload, tuple) else values
+        return payload
+
+    def stats(self):
+        """Returns the number of stored images, how many were resized, and their bytes before and after."""
+        with self._lock:
+            return dict(self._stats)
+
+
+image_store = ImageStore()
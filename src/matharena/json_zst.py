@@ -1,9 +1,13 @@
 import json
+import os
+import struct
 from pathlib import Path
 
 import zstandard as zstd
 
 OUTPUT_JSON_SUFFIX = ".json.zst"
+RUN_LOG_SUFFIX = ".runlog"  # append-only log of zstd-compressed JSON records, each prefixed by its byte length
+_RECORD_HEADER = struct.Struct("<I")
 _ZSTD_DECOMPRESSOR = zstd.ZstdDecompressor()
 
 
@@ -24,3 +28,31 @@ def dump_json_zst(data, path, *, indent=None, ensure_ascii=True, sort_keys=False
 
 def output_json_stem(path):
     return Path(path).name.removesuffix(OUTPUT_JSON_SUFFIX)
+
+
+def append_json_zst_record(data, path):
+    payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    compressed = zstd.ZstdCompressor(level=3).compress(payload)
+    with Path(path).open("ab") as f:
+        f.write(_RECORD_HEADER.pack(len(compressed)) + compressed)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def load_json_zst_records(path):
+    """Returns (records, valid_length): the complete records of a log written by append_json_zst_record and the byte
+    length they take, which is shorter than the file if the last append was interrupted."""
+    with Path(path).open("rb") as f:
+        data = f.read()
+    records, offset = [], 0
+    while offset + _RECORD_HEADER.size <= len(data):
+        (length,) = _RECORD_HEADER.unpack_from(data, offset)
+        end = offset + _RECORD_HEADER.size + length
+        if end > len(data):
+            break
+        try:
+            records.append(json.loads(_ZSTD_DECOMPRESSOR.decompress(data[offset + _RECORD_HEADER.size : end])))
+        except Exception:
+            break
+        offset = end
+    return records, offset
@@ -0,0 +1,440 @@
+"""
+A local stand-in for OpenAI/Anthropic-compatible providers, for load testing the pipeline without spending money.
+Speaks the chat completions (incl. streaming), responses and messages wire formats with synthetic answers.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+from matharena.rate_limiter import estimate_request_tokens
+
+ANSWER_HINT_RE = re.compile(r"\[mock answer: ([^\]]*)\]")
+FILLER_WORDS = ["so", "we", "get", "the", "sum", "of", "both", "terms", "hence", "it", "follows", "that", "x", "is"]
+
+
+def sample_latency(spec, rng=random):
+    """Samples a duration in seconds from a distribution spec.
+
+    Args:
+        spec (str|float): "fixed:a", "uniform:a,b", "exponential:mean", "lognormal:median,sigma", or a number.
+        rng (random.Random, optional): The random generator to use.
+
+    Returns:
+        float: The sampled duration (never negative).
+    """
+    if isinstance(spec, (int, float)):
+        return max(0.0, float(spec))
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip() != ""]
+    if kind == "fixed":
+        return max(0.0, values[0])
+    if kind == "uniform":
+        return rng.uniform(values[0], values[1])
+    if kind == "exponential":
+        return rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    if kind == "lognormal":
+        median, sigma = values
+        return rng.lognormvariate(0, sigma) * median
+    raise ValueError(f"Unknown latency distribution {spec}, expected fixed/uniform/exponential/lognormal.")
+
+
+class MockProvider:
+    """The behaviour of the mock server: latencies, token rates, injected errors, tool calls and answers."""
+
+    def __init__(
+        self,
+        ttft="lognormal:0.5,0.5",
+        output_tokens=2000,
+        tokens_per_second=200,
+        rate_limit_rate=0.0,
+        server_error_rate=0.0,
+        tool_call_rate=0.0,
+        max_tool_rounds=3,
+        tool_argument_values=None,
+        correct_rate=0.5,
+        seed=None,
+    ):
+        """
+        Args:
+            ttft (str|float, optional): Distribution of the time to first token (see sample_latency).
+            output_tokens (int, optional): Mean number of generated tokens (exponentially distributed,
+                capped by the max tokens of the request). Defaults to 2000.
+            tokens_per_second (float, optional): Generation speed after the first token; 0 for instant.
+                Defaults to 200.
+            rate_limit_rate (float, optional): Fraction of requests answered with a 429. Defaults to 0.
+            server_error_rate (float, optional): Fraction of requests answered with a 500 after the TTFT.
+                Defaults to 0.
+            tool_call_rate (float, optional): Probability of calling a tool when the request offers tools.
+                Defaults to 0.
+            max_tool_rounds (int, optional): No tool calls once the conversation has this many tool results.
+                Defaults to 3.
+            tool_argument_values (dict, optional): Values for arguments of emitted tool calls, by argument name.
+                Other arguments get a dummy value of their schema type. Defaults to python code printing 1.
+            correct_rate (float, optional): Probability of answering with the "[mock answer: ...]" hint found in the
+                prompt; otherwise a random integer in [0, 999] is boxed. Defaults to 0.5.
+            seed (int, optional): Seed for the random generator.
+        """
+        self.ttft = ttft
+        self.output_tokens = output_tokens
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.tool_call_rate = tool_call_rate
+        self.max_tool_rounds = max_tool_rounds
+        self.tool_argument_values = tool_argument_values or {"code": "print(1)", "lang": "python"}
+        self.correct_rate = correct_rate
+        self.rng = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._stored_responses = {}  # responses API id -> response, for responses.retrieve
+        self._latencies = []
+        self._counts = {}
+
+    def record(self, endpoint, status, latency):
+        with self._lock:
+            key = f"{endpoint} {status}"
+            self._counts[key] = self._counts.get(key, 0) + 1
+            if status == 200:
+                self._latencies.append(latency)
+
+    def stats(self):
+        """Returns the request counts per endpoint and status, and percentiles of successful request latencies."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counts = dict(self._counts)
+        stats = {"counts": counts, "n_successful": len(latencies)}
+        for q in [50, 90, 99]:
+            stats[f"p{q}_latency"] = latencies[len(latencies) * q // 100] if len(latencies) > 0 else None
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._latencies = []
+            self._counts = {}
+
+    def draw_error(self):
+        """Returns 429, 500, or None for a request about to be served."""
+        with self._lock:
+            r = self.rng.random()
+        if r < self.rate_limit_rate:
+            return 429
+        if r < self.rate_limit_rate + self.server_error_rate:
+            return 500
+        return None
+
+    def draw_ttft(self):
+        with self._lock:
+            return sample_latency(self.ttft, self.rng)
+
+    def draw_output(self, prompt_text, max_tokens):
+        """Generates the text of a final answer.
+
+        Returns:
+            tuple: (text, n_tokens)
+        """
+        with self._lock:
+            n_tokens = max(1, int(self.rng.expovariate(1 / self.output_tokens))) if self.output_tokens > 0 else 1
+            if max_tokens:
+                n_tokens = min(n_tokens, max_tokens)
+            hint = ANSWER_HINT_RE.search(prompt_text)
+            if hint is not None and self.rng.random() < self.correct_rate:
+                answer = hint.group(1)
+            else:
+                answer = str(self.rng.randint(0, 999))
+            words = [self.rng.choice(FILLER_WORDS) for _ in range(max(0, n_tokens - 5))]
+        return " ".join(words) + f"\n\nThe final answer is $\\boxed{{{answer}}}$.", n_tokens
+
+    def draw_tool(self, tools, n_tool_results):
+        """Returns one of the offered tools to call this turn, or None to answer instead."""
+        with self._lock:
+            if len(tools) == 0 or n_tool_results >= self.max_tool_rounds or self.rng.random() >= self.tool_call_rate:
+                return None
+            return self.rng.choice(tools)
+
+    def generation_time(self, n_tokens):
+        return n_tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def tool_arguments(self, schema):
+        """Builds dummy arguments satisfying the required properties of a JSON schema."""
+        schema = schema or {}
+        properties = schema.get("properties", {})
+        defaults = {"string": "mock", "integer": 1, "number": 1.0, "boolean": True, "array": []}
+        arguments = {}
+        for name in schema.get("required", properties):
+            if name in self.tool_argument_values:
+                arguments[name] = self.tool_argument_values[name]
+            else:
+                arguments[name] = defaults.get(properties.get(name, {}).get("type"), {})
+        return arguments
+
+    def store_response(self, response):
+        with self._lock:
+            self._stored_responses[response["id"]] = response
+
+    def stored_response(self, response_id):
+        with self._lock:
+            return self._stored_responses.get(response_id)
+
+
+def _text_of(value):
+    """Concatenates all strings in a (nested) message payload."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return "\n".join(_text_of(v) for v in value.values())
+    if isinstance(value, list):
+        return "\n".join(_text_of(v) for v in value)
+    return ""
+
+
+def _new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+class _MockProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 4096  # the listen backlog; load tests open many connections at once
+
+
+class _MockProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client connection pooling is exercised
+    provider = None  # set on the subclass created by start_mock_provider
+
+    def log_message(self, format, *args):
+        pass  # one line per request would drown the runner logs
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        error_type = "rate_limit_error" if status == 429 else "api_error"
+        headers = {"Retry-After": "1"} if status == 429 else None
+        self._send_json(status, {"type": "error", "error": {"type": error_type, "message": message}}, headers)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path.endswith("/stats"):
+            self._send_json(200, self.provider.stats())
+            return
+        if "/responses/" in path:
+            response = self.provider.stored_response(path.rsplit("/", 1)[-1])
+            if response is not None:
+                self._send_json(200, response)
+                return
+        self._send_error(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        start = time.monotonic()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = self.path.rstrip("/")
+        if path.endswith("/stats/reset"):
+            self.provider.reset_stats()
+            self._send_json(200, {})
+            return
+        if path.endswith("/chat/completions"):
+            endpoint, handler = "chat.completions", self._chat_completions
+        elif path.endswith("/responses"):
+            endpoint, handler = "responses", self._responses
+        elif path.endswith("/messages"):
+            endpoint, handler = "messages", self._messages
+        else:
+            self._send_error(404, f"Unknown path {self.path}")
+            return
+
+        error = self.provider.draw_error()
+        if error == 429:
+            self._send_error(429, "Rate limit exceeded (injected by the mock provider).")
+        else:
+            time.sleep(self.provider.draw_ttft())
+            if error == 500:
+                self._send_error(500, "Internal server error (injected by the mock provider).")
+            else:
+                handler(body)
+        self.provider.record(endpoint, error or 200, time.monotonic() - start)
+
+    def _draw_turn(self, body, tools, n_tool_results, max_tokens):
+        """Decides the turn and waits for its generation time.
+
+        Returns:
+            tuple: (tool, text, output_tokens, input_tokens), where exactly one of tool and text is None.
+        """
+        n_input = estimate_request_tokens(body)
+        tool = self.provider.draw_tool(tools, n_tool_results)
+        if tool is not None:
+            return tool, None, 50, n_input
+        text, n_tokens = self.provider.draw_output(_text_of(body.get("messages", body.get("input"))), max_tokens)
+        time.sleep(self.provider.generation_time(n_tokens))
+        return None, text, n_tokens, n_input
+
+    def _chat_completions(self, body):
+        tools = [t["function"] for t in body.get("tools", []) if t.get("type") == "function"]
+        n_tool_results = sum(1 for m in body.get("messages", []) if m.get("role") == "tool")
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+        if body.get("stream"):
+            self._chat_completions_stream(body, max_tokens)
+            return
+        tool, text, n_tokens, n_input = self._draw_turn(body, tools, n_tool_results, max_tokens)
+        message = {"role": "assistant", "content": text}
+        if tool is not None:
+            arguments = json.dumps(self.provider.tool_arguments(tool.get("parameters")))
+            message["tool_calls"] = [
+                {"id": _new_id("call"), "type": "function", "function": {"name": tool["name"], "arguments": arguments}}
+            ]
+        self._send_json(
+            200,
+            {
+                "id": _new_id("chatcmpl"),
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [
+                    {"index": 0, "message": message, "finish_reason": "tool_calls" if tool is not None else "stop"}
+                ],
+                "usage": {"prompt_tokens": n_input, "completion_tokens": n_tokens, "total_tokens": n_input + n_tokens},
+            },
+        )
+
+    def _chat_completions_stream(self, body, max_tokens):
+        # Streams are delimited by closing the connection
+        n_input = estimate_request_tokens(body)
+        text, n_tokens = self.provider.draw_output(_text_of(body.get("messages")), max_tokens)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        chunk = {"id": _new_id("chatcmpl"), "object": "chat.completion.chunk", "created": int(time.time())}
+        chunk["model"] = body.get("model")
+        words = text.split(" ")
+        per_word = self.provider.generation_time(n_tokens) / max(1, len(words))
+        for i, word in enumerate(words):
+            delta = {"role": "assistant", "content": word} if i == 0 else {"content": " " + word}
+            self._send_event({**chunk, "choices": [{"index": 0, "delta": delta}]})
+            time.sleep(per_word)
+        self._send_event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if body.get("stream_options", {}).get("include_usage"):
+            usage = {"prompt_tokens": n_input, "completion_tokens": n_tokens, "total_tokens": n_input + n_tokens}
+            self._send_event({**chunk, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_event(self, data):
+        self.wfile.write(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _responses(self, body):
+        tools = [t for t in body.get("tools", []) if t.get("type") == "function"]
+        items = body.get("input") if isinstance(body.get("input"), list) else []
+        n_tool_results = sum(1 for m in items if m.get("type") == "function_call_output")
+        tool, text, n_tokens, n_input = self._draw_turn(body, tools, n_tool_results, body.get("max_output_tokens"))
+        if tool is not None:
+            output = {
+                "type": "function_call",
+                "id": _new_id("fc"),
+                "call_id": _new_id("call"),
+                "name": tool["name"],
+                "arguments": json.dumps(self.provider.tool_arguments(tool.get("parameters"))),
+                "status": "completed",
+            }
+        else:
+            output = {
+                "type": "message",
+                "id": _new_id("msg"),
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        response = {
+            "id": _new_id("resp"),
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "completed",
+            "model": body.get("model"),
+            "output": [output],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": body.get("tools", []),
+            "usage": {
+                "input_tokens": n_input,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": n_tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": n_input + n_tokens,
+            },
+        }
+        if body.get("background"):
+            self.provider.store_response(response)
+        self._send_json(200, response)
+
+    def _messages(self, body):
+        tools = [{"name": t["name"], "parameters": t.get("input_schema")} for t in body.get("tools", []) if "name" in t]
+        n_tool_results = sum(
+            1
+            for m in body.get("messages", [])
+            if isinstance(m.get("content"), list)
+            for block in m["content"]
+            if isinstance(block, dict) and block.get("type") == "tool_result"
+        )
+        tool, text, n_tokens, n_input = self._draw_turn(body, tools, n_tool_results, body.get("max_tokens"))
+        if tool is not None:
+            content = [
+                {
+                    "type": "tool_use",
+                    "id": _new_id("toolu"),
+                    "name": tool["name"],
+                    "input": self.provider.tool_arguments(tool.get("parameters")),
+                }
+            ]
+        else:
+            content = [{"type": "text", "text": text}]
+        self._send_json(
+            200,
+            {
+                "id": _new_id("msg"),
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model"),
+                "content": content,
+                "stop_reason": "tool_use" if tool is not None else "end_turn",
+                "stop_sequence": None,
+                "usage": {
+                    "input_tokens": n_input,
+                    "output_tokens": n_tokens,
+                    "cache_creation_input_tokens": 0,
+                    "cache_read_input_tokens": 0,
+                },
+            },
+        )
+
+
+def start_mock_provider(provider=None, host="127.0.0.1", port=0):
+    """Starts a mock provider server in a daemon thread.
+
+    Args:
+        provider (MockProvider, optional): The behaviour of the server. Defaults to MockProvider().
+        host (str, optional): The interface to bind. Defaults to "127.0.0.1".
+        port (int, optional): The port to bind; 0 picks a free one. Defaults to 0.
+
+    Returns:
+        ThreadingHTTPServer: The running server; its base URL is f"http://{host}:{server.server_port}/v1".
+    """
+    handler = type("MockProviderHandler", (_MockProviderHandler,), {"provider": provider or MockProvider()})
+    server = _MockProviderServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="mock-provider", daemon=True).start()
+    logger.info(f"Mock provider listening on http://{host}:{server.server_port}/v1")
+    return server
@@ -0,0 +1,111 @@
+"""
+Registry of optional backends and tool functions. Provider SDKs, local inference libraries and tool dependencies
+(docker, modal, axle, fitz, ...) are only imported when a config actually uses them, so importing matharena stays cheap.
+"""
+
+import functools
+import importlib
+import threading
+import types
+
+from loguru import logger
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        if self.__dict__["_module"] is None:
+            self.__dict__["_module"] = importlib.import_module(self.__name__)
+        return self.__dict__["_module"]
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name):
+    """Returns a module object for name that only imports the module when one of its attributes is used.
+
+    Args:
+        name (str): The dotted module name, e.g. "anthropic.types".
+
+    Returns:
+        LazyModule: The lazy module.
+    """
+    return LazyModule(name)
+
+
+def load_object(path):
+    """Imports and returns the object at "package.module:attribute"."""
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+# Tool name (as in the tool_spec of a competition config) -> "module:function"
+_TOOLS = {
+    "execute_code": "matharena.tools.code_execution:execute_code",
+    "verify_lean": "matharena.tools.lean_execution:verify_lean",
+    "verify_submission": "matharena.tools.lean_execution:verify_lean_with_formal_statement",
+    "add_to_file": "matharena.tools.lean_execution:add_to_file",
+    "loogle": "matharena.tools.lean_execution:loogle",
+    "lean_explore_search": "matharena.tools.lean_execution:lean_explore_search",
+    "read_paper": "matharena.tools.paper_search:read_paper",
+    "query_semantic_scholar": "matharena.tools.paper_search:query_semantic_scholar",
+    "read_pages": "matharena.tools.paper_search:read_pages",
+    "find_in_paper": "matharena.tools.paper_search:find_in_paper",
+}
+# Tools that run in a Lean environment chosen by the competition config
+_LEAN_ENVIRONMENT_TOOLS = {"verify_lean", "verify_submission", "add_to_file"}
+_TOOLS_LOCK = threading.Lock()
+
+
+def register_tool(name, path, lean_environment=False):
+    """Registers a tool function under the name used in tool specs.
+
+    Args:
+        name (str): The function name in the tool spec.
+        path (str): Where to import the function from, as "package.module:function".
+        lean_environment (bool, optional): Whether the function takes the Lean environment of the competition as
+            its `environment` keyword. Defaults to False.
+    """
+    with _TOOLS_LOCK:
+        if name in _TOOLS and _TOOLS[name] != path:
+            logger.warning(f"Tool {name} was registered as {_TOOLS[name]}, replacing it with {path}.")
+        _TOOLS[name] = path
+        if lean_environment:
+            _LEAN_ENVIRONMENT_TOOLS.add(name)
+        else:
+            _LEAN_ENVIRONMENT_TOOLS.discard(name)
+
+
+def is_registered_tool(name):
+    """Returns whether a tool function is registered under name, without importing it."""
+    with _TOOLS_LOCK:
+        return name in _TOOLS
+
+
+def get_tool_function(name, lean_environment=None):
+    """Imports and returns the function of a registered tool.
+
+    Args:
+        name (str): The function name in the tool spec.
+        lean_environment (str, optional): The Lean environment bound to tools that run Lean code.
+
+    Returns:
+        callable: The tool function.
+    """
+    with _TOOLS_LOCK:
+        path = _TOOLS[name]
+        binds_environment = name in _LEAN_ENVIRONMENT_TOOLS
+    func = load_object(path)
+    if binds_environment:
+        func = functools.partial(func, environment=lean_environment)
+    return func
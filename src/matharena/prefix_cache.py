@@ -0,0 +1,138 @@
+"""
+Prefix-sharing-aware scheduling for provider prompt caches: groups queries by their common prompt prefix and holds
+back the rest of a group until its first query had time to write the prefix into the cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+
+def prompt_text(messages):
+    """Returns the prompt of a conversation (or API payload messages) as one string, in message order."""
+    parts = []
+    for m in messages:
+        content = m.get("content", "") if isinstance(m, dict) else m
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.append(json.dumps(content, sort_keys=True, default=str))
+    return "\n".join(parts)
+
+
+def prefix_key(text, min_prefix_chars):
+    """Returns a cache routing key shared by all prompts that agree on their first min_prefix_chars characters."""
+    return hashlib.sha256(text[:min_prefix_chars].encode("utf-8")).hexdigest()[:32]
+
+
+def group_by_prefix(queries, min_prefix_chars=1000):
+    """Groups queries whose prompts agree on their first min_prefix_chars characters.
+
+    Args:
+        queries (list[MessageList]): The queries.
+        min_prefix_chars (int, optional): The shortest prefix worth caching. Defaults to 1000.
+
+    Returns:
+        list[list[int]]: Groups of positions in queries; each group is in the original order and its first position
+            is the group leader. Queries without a long enough shared prefix form groups of one.
+    """
+    groups = {}
+    for pos, query in enumerate(queries):
+        text = prompt_text(query)
+        key = prefix_key(text, min_prefix_chars) if len(text) >= min_prefix_chars else f"single-{pos}"
+        groups.setdefault(key, []).append(pos)
+    return list(groups.values())
+
+
+class PrefixWarmup:
+    """
+    Gate for the queries of one run_queries call: group leaders run at once, the other queries of a group wait until
+    their leader finished or has been running for warmup_seconds, whichever comes first.
+    """
+
+    def __init__(self, groups, warmup_seconds=5):
+        """
+        Args:
+            groups (list[list[int]]): Groups of positions, as returned by group_by_prefix.
+            warmup_seconds (float, optional): How long followers wait after their leader started. Defaults to 5.
+        """
+        self.warmup_seconds = warmup_seconds
+        self.leader_of = {}
+        for group in groups:
+            for pos in group:
+                self.leader_of[pos] = group[0]
+        self._lock = threading.Lock()
+        self._started = {}  # leader -> start time
+        self._released = {group[0]: threading.Event() for group in groups}
+
+    def is_leader(self, pos):
+        return self.leader_of[pos] == pos
+
+    def order(self):
+        """Returns all positions with leaders first, then the followers group by group."""
+        positions = sorted(self.leader_of.keys())
+        leaders = [pos for pos in positions if self.is_leader(pos)]
+        followers = sorted((pos for pos in positions if not self.is_leader(pos)), key=lambda p: self.leader_of[p])
+        return leaders + followers
+
+    def start(self, pos):
+        """Marks the start of a query; followers of a leader are released warmup_seconds later."""
+        if self.is_leader(pos):
+            with self._lock:
+                self._started.setdefault(pos, time.monotonic())
+
+    def finish(self, pos):
+        """Marks the end of a query, releasing the followers of a leader at once."""
+        if self.is_leader(pos):
+            self._released[pos].set()
+
+    def _remaining(self, pos):
+        leader = self.leader_of[pos]
+        if leader == pos or self._released[leader].is_set():
+            return 0.0
+        with self._lock:
+            started = self._started.get(leader)
+        if started is None:
+            return 0.1  # the leader is not running yet
+        return max(0.0, started + self.warmup_seconds - time.monotonic())
+
+    def wait(self, pos):
+        """Blocks until the query at pos may be sent."""
+        while (remaining := self._remaining(pos)) > 0:
+            self._released[self.leader_of[pos]].wait(min(remaining, 1.0))
+
+    async def wait_async(self, pos):
+        """Waits on the running event loop until the query at pos may be sent."""
+        while (remaining := self._remaining(pos)) > 0:
+            await asyncio.sleep(min(remaining, 0.1))
+
+
+def prefix_group_stats(groups, results):
+    """Summarizes prompt-cache hits per prefix group.
+
+    Args:
+        groups (list[list[int]]): Groups of positions, as returned by group_by_prefix.
+        results (dict): Position -> detailed_cost of every finished query.
+
+    Returns:
+        dict: The number of groups and, for each group with more than one query, its size, input tokens and cached
+            input tokens.
+    """
+    per_group = []
+    for group in groups:
+        if len(group) < 2:
+            continue
+        input_tokens = sum(results[pos].get("input_tokens", 0) for pos in group if pos in results)
+        cached_input_tokens = sum(results[pos].get("cached_input_tokens", 0) for pos in group if pos in results)
+        per_group.append(
+            {
+                "leader": group[0],
+                "size": len(group),
+                "input_tokens": input_tokens,
+                "cached_input_tokens": cached_input_tokens,
+                "hit_rate": round(cached_input_tokens / input_tokens, 3) if input_tokens > 0 else None,
+            }
+        )
+    return {"groups": len(groups), "shared_prefix_groups": per_group}
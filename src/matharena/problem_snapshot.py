@@ -0,0 +1,105 @@
+"""
+Compiled snapshots of competition problems. Loading a competition parses CSVs, reads every problem file and
+base64-encodes every image (or converts a Hugging Face dataset); the result is stored as one compressed file keyed by
+a fingerprint of the dataset directory or the dataset revision on the Hub, so later runs load it in milliseconds and
+any change to the sources produces a new snapshot.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+from loguru import logger
+
+from matharena.json_zst import OUTPUT_JSON_SUFFIX, dump_json_zst, load_json_zst
+
+SNAPSHOT_DIR = os.path.join("logs", "cache", "problems")
+SNAPSHOT_VERSION = 1  # bump when the problem dicts built by Runner._load_problems change
+# Competition config keys that change how problems are loaded
+LOADER_CONFIG_KEYS = ["dataset_path", "final_answer", "lean"]
+
+
+def _directory_fingerprint(dataset_path):
+    """Hashes the path, size and modification time of every file below dataset_path (no file contents are read)."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(dataset_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, dataset_path)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _hub_revision(dataset_path):
+    """Returns the commit sha of a Hugging Face dataset, or None if the Hub cannot be reached."""
+    try:
+        from huggingface_hub import HfApi
+
+        return HfApi().dataset_info(dataset_path).sha
+    except Exception as e:
+        logger.warning(f"Could not get the revision of dataset {dataset_path}: {e}")
+        return None
+
+
+def _snapshot_prefix(dataset_path):
+    name = dataset_path.strip("/").replace("/", "__").replace(os.sep, "__")
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+def snapshot_path(competition_config):
+    """Returns the snapshot file for the current sources of a competition, or None if they cannot be identified.
+
+    Args:
+        competition_config (dict): The competition config; its dataset_path is a local directory or a dataset on the
+            Hugging Face Hub.
+
+    Returns:
+        str: The path of the snapshot, which may not exist yet.
+    """
+    dataset_path = competition_config["dataset_path"]
+    if os.path.exists(dataset_path):
+        source_key = _directory_fingerprint(dataset_path)
+    else:
+        source_key = _hub_revision(dataset_path)
+        if source_key is None:
+            return None
+    loader_config = {key: competition_config.get(key) for key in LOADER_CONFIG_KEYS}
+    key_data = json.dumps([SNAPSHOT_VERSION, source_key, loader_config], sort_keys=True)
+    key = hashlib.sha256(key_data.encode("utf-8")).hexdigest()[:16]
+    return f"{_snapshot_prefix(dataset_path)}-{key}{OUTPUT_JSON_SUFFIX}"
+
+
+def latest_snapshot_path(competition_config):
+    """Returns the most recently written snapshot of a competition's dataset (for when the Hub is unreachable)."""
+    paths = glob.glob(f"{glob.escape(_snapshot_prefix(competition_config['dataset_path']))}-*{OUTPUT_JSON_SUFFIX}")
+    return max(paths, key=os.path.getmtime) if len(paths) > 0 else None
+
+
+def load_snapshot(path):
+    """Returns the problems stored in a snapshot, or None if it does not exist or cannot be read."""
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        return load_json_zst(path)
+    except Exception as e:
+        logger.warning(f"Could not read problem snapshot {path}, loading the problems from their sources: {e}")
+        return None
+
+
+def save_snapshot(path, problems):
+    """Stores problems in a snapshot. Snapshots are written atomically, so concurrent runs never read partial ones."""
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        dump_json_zst(problems, tmp_path, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        logger.warning(f"Could not write problem snapshot {path}: {e}")
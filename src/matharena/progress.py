@@ -0,0 +1,203 @@
+"""
+Process-wide progress tracking for all competitions and models of one invocation. Finished runs only update counters;
+the status files and a machine-readable JSON feed are written by a background thread at most once per flush interval,
+and the feed can also be served over HTTP.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+STATUS_FLUSH_INTERVAL = 5.0  # seconds between writes of the status files and the progress feed
+DEFAULT_PROGRESS_PATH = os.path.join("logs", "status", "progress.json")
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ProgressTracker:
+    """Counts finished runs per (competition, solver) and periodically writes status files and the progress feed."""
+
+    def __init__(self, interval=STATUS_FLUSH_INTERVAL, feed_path=DEFAULT_PROGRESS_PATH):
+        """
+        Args:
+            interval (float, optional): Seconds between flushes. Defaults to STATUS_FLUSH_INTERVAL.
+            feed_path (str, optional): Where to write the JSON feed; None to not write it. Defaults to
+                DEFAULT_PROGRESS_PATH.
+        """
+        self.interval = interval
+        self.feed_path = feed_path
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._entries = {}  # (comp, solver) -> progress of that batch
+        self._dirty = set()
+        self._feed = {}
+        self._thread = None
+        self._server = None
+        self._started_at = time.time()
+
+    def configure(self, interval=None, feed_path=None, port=None):
+        """Sets the flush interval and feed path, and serves the feed on http://127.0.0.1:{port}/ if a port is given."""
+        with self._lock:
+            if interval is not None:
+                self.interval = interval
+            if feed_path is not None:
+                self.feed_path = feed_path
+        if port is not None:
+            self.serve(port)
+
+    def register(self, comp_name, solver_name, status_path, n_planned, snapshot):
+        """Starts tracking the batch of a (competition, solver) pair.
+
+        Args:
+            comp_name (str): The competition.
+            solver_name (str): The solver (model config).
+            status_path (str): The status text file of the pair.
+            n_planned (int): Runs in the batch.
+            snapshot (callable): Returns (status text, {problem_idx: {"runs", "target", "correct"}}); called from the
+                flush thread.
+        """
+        with self._lock:
+            self._entries[(comp_name, solver_name)] = {
+                "status_path": status_path,
+                "snapshot": snapshot,
+                "planned": n_planned,
+                "finished": 0,
+                "failed": 0,
+                "cost": 0.0,
+                "output_tokens": 0,
+                "started_at": time.time(),
+            }
+            self._dirty.add((comp_name, solver_name))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+                self._thread.start()
+
+    def record_run(self, comp_name, solver_name, detailed_cost):
+        """Counts a finished run; the status is written at the next flush."""
+        with self._lock:
+            entry = self._entries.get((comp_name, solver_name))
+            if entry is None:
+                return
+            entry["finished"] += 1
+            entry["cost"] += detailed_cost.get("cost") or 0
+            entry["output_tokens"] += detailed_cost.get("output_tokens") or 0
+            self._dirty.add((comp_name, solver_name))
+
+    def record_failure(self, comp_name, solver_name):
+        """Counts a run that could not be added."""
+        with self._lock:
+            entry = self._entries.get((comp_name, solver_name))
+            if entry is None:
+                return
+            entry["failed"] += 1
+            self._dirty.add((comp_name, solver_name))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Could not write the progress status: {e}")
+
+    def flush(self):
+        """Writes the status files of the pairs that changed since the last flush and the progress feed."""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                entries = {key: dict(entry) for key, entry in self._entries.items()}
+            if len(dirty) == 0 and len(self._feed) > 0:
+                return
+            feed = {"updated_at": time.time(), "elapsed": time.time() - self._started_at, "batches": []}
+            for (comp_name, solver_name), entry in entries.items():
+                text, problems = entry["snapshot"]()
+                if (comp_name, solver_name) in dirty:
+                    _write_atomic(entry["status_path"], text)
+                feed["batches"].append(self._batch_progress(comp_name, solver_name, entry, problems))
+            feed["total"] = self._total_progress(feed["batches"], feed["elapsed"])
+            with self._lock:
+                self._feed = feed
+                feed_path = self.feed_path
+            if feed_path is not None:
+                _write_atomic(feed_path, json.dumps(feed, indent=4))
+
+    def _batch_progress(self, comp_name, solver_name, entry, problems):
+        elapsed = time.time() - entry["started_at"]
+        done = entry["finished"] + entry["failed"]
+        runs_per_minute = 60 * entry["finished"] / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, entry["planned"] - done)
+        return {
+            "competition": comp_name,
+            "solver": solver_name,
+            "planned": entry["planned"],
+            "finished": entry["finished"],
+            "failed": entry["failed"],
+            "remaining": remaining,
+            "cost": round(entry["cost"], 6),
+            "output_tokens": entry["output_tokens"],
+            "runs_per_minute": round(runs_per_minute, 3),
+            "output_tokens_per_second": round(entry["output_tokens"] / elapsed, 1) if elapsed > 0 else 0.0,
+            "eta_seconds": round(60 * remaining / runs_per_minute) if runs_per_minute > 0 else None,
+            "problems": {str(problem_idx): progress for problem_idx, progress in problems.items()},
+        }
+
+    def _total_progress(self, batches, elapsed):
+        finished = sum(batch["finished"] for batch in batches)
+        remaining = sum(batch["remaining"] for batch in batches)
+        runs_per_minute = 60 * finished / elapsed if elapsed > 0 else 0.0
+        return {
+            "planned": sum(batch["planned"] for batch in batches),
+            "finished": finished,
+            "failed": sum(batch["failed"] for batch in batches),
+            "remaining": remaining,
+            "cost": round(sum(batch["cost"] for batch in batches), 6),
+            "runs_per_minute": round(runs_per_minute, 3),
+            "eta_seconds": round(60 * remaining / runs_per_minute) if runs_per_minute > 0 else None,
+        }
+
+    def feed(self):
+        """Returns the progress feed as of the last flush."""
+        with self._lock:
+            return self._feed
+
+    def serve(self, port):
+        """Serves the progress feed as JSON on http://127.0.0.1:{port}/ from a daemon thread."""
+        tracker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(tracker.feed(), indent=4).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        with self._lock:
+            if self._server is not None:
+                return
+            self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="progress-http", daemon=True).start()
+        logger.info(f"Serving progress on http://127.0.0.1:{port}/")
+
+
+progress_tracker = ProgressTracker()
@@ -0,0 +1,157 @@
+"""
+Process-wide requests-per-minute and tokens-per-minute budgets, shared by all APIClients using the same API key.
+"""
+
+import hashlib
+import threading
+import time
+
+from matharena.image_store import IMAGE_REF_PREFIX
+
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 1500
+
+
+class TokenBucket:
+    """A bucket refilled continuously at per_minute / 60 units per second, holding at most per_minute units.
+    Reservations are taken immediately and may overdraw the bucket; the caller then waits until the debt is repaid,
+    which keeps reservations first-come first-served without a waiting queue.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def reserve(self, amount):
+        """Takes amount units, returning the number of seconds to wait before using them."""
+        self._refill()
+        self.level -= min(amount, self.per_minute)
+        return max(0.0, -self.level * 60 / self.per_minute)
+
+    def refund(self, amount):
+        """Returns unused units to the bucket."""
+        self._refill()
+        self.level = min(self.per_minute, self.level + amount)
+
+
+class RateLimiter:
+    """Enforces requests-per-minute and tokens-per-minute budgets for one API key and base URL."""
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None):
+        """
+        Args:
+            name (str): Name of the endpoint, for logging.
+            requests_per_minute (int, optional): The request budget. Defaults to None (unlimited).
+            tokens_per_minute (int, optional): The token budget (input + output). Defaults to None (unlimited).
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._reserved = 0
+        self._waited = 0.0
+
+    def update_limits(self, requests_per_minute=None, tokens_per_minute=None):
+        """Tightens the budgets if another client configures lower limits for the same key."""
+        with self._lock:
+            if requests_per_minute and (self.requests is None or requests_per_minute < self.requests.per_minute):
+                self.requests = TokenBucket(requests_per_minute)
+            if tokens_per_minute and (self.tokens is None or tokens_per_minute < self.tokens.per_minute):
+                self.tokens = TokenBucket(tokens_per_minute)
+
+    def reserve(self, n_tokens):
+        """Reserves one request and n_tokens tokens.
+
+        Args:
+            n_tokens (int): The estimated input tokens plus the maximum output tokens of the request.
+
+        Returns:
+            float: The number of seconds to wait before sending the request.
+        """
+        with self._lock:
+            wait = 0.0
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(n_tokens))
+            self._reserved += n_tokens
+            self._waited += wait
+            return wait
+
+    def refund(self, n_tokens):
+        """Returns tokens that were reserved but not used (e.g. output shorter than max_tokens)."""
+        if n_tokens <= 0:
+            return
+        with self._lock:
+            if self.tokens is not None:
+                self.tokens.refund(n_tokens)
+            self._reserved -= n_tokens
+
+    def stats(self):
+        """Returns the budgets, the tokens accounted so far, and the total time requests waited."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "requests_per_minute": self.requests.per_minute if self.requests is not None else None,
+                "tokens_per_minute": self.tokens.per_minute if self.tokens is not None else None,
+                "tokens_used": self._reserved,
+                "seconds_waited": round(self._waited, 1),
+            }
+
+
+def estimate_request_tokens(payload):
+    """Roughly estimates the input tokens of an SDK request payload from its text length.
+
+    Args:
+        payload (dict): The keyword arguments of the SDK call.
+
+    Returns:
+        int: The estimated number of input tokens.
+    """
+    n_chars, n_images = 0, 0
+    stack = [payload.get(key) for key in ["messages", "input", "system", "tools"]]
+    while len(stack) > 0:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, str):
+            if value.startswith(("data:image", IMAGE_REF_PREFIX)) or (len(value) > 10000 and " " not in value):
+                n_images += 1  # base64 image payloads are billed per image, not per character
+            else:
+                n_chars += len(value)
+    return n_chars // CHARS_PER_TOKEN + n_images * IMAGE_TOKENS
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(api_key, base_url, requests_per_minute=None, tokens_per_minute=None):
+    """Returns the process-wide rate limiter for an API key and base URL, creating it on first use.
+
+    Args:
+        api_key (str): The API key of the client.
+        base_url (str): The base URL of the client (None for the SDK default).
+        requests_per_minute (int, optional): The request budget configured by the client.
+        tokens_per_minute (int, optional): The token budget configured by the client.
+
+    Returns:
+        RateLimiter: The limiter shared by all clients with this key and base URL.
+    """
+    key_hash = hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()[:8]
+    key = (key_hash, base_url)
+    with _LIMITERS_LOCK:
+        if key not in _LIMITERS:
+            name = f"key {key_hash}" if base_url is None else f"key {key_hash} @ {base_url}"
+            _LIMITERS[key] = RateLimiter(name, requests_per_minute, tokens_per_minute)
+            return _LIMITERS[key]
+    _LIMITERS[key].update_limits(requests_per_minute, tokens_per_minute)
+    return _LIMITERS[key]
@@ -0,0 +1,97 @@
+"""
+Global content-addressed cache of APIClient responses, stored next to the request logs.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from loguru import logger
+
+from matharena.json_zst import OUTPUT_JSON_SUFFIX, dump_json_zst, load_json_zst
+
+
+class ResponseCache:
+    """
+    Maps (model, sampling kwargs, messages, tools, sample index) to a finished request result.
+    Disabled by default; "readwrite" serves hits and stores new results, "replay" serves hits and fails on misses.
+    """
+
+    MODES = ["off", "readwrite", "replay"]
+
+    def __init__(self):
+        self.cache_dir = "logs/cache"
+        self.mode = "off"
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, mode, cache_dir=None):
+        """Sets the cache mode ("off", "readwrite" or "replay") and optionally the cache directory."""
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown response cache mode {mode}, expected one of {self.MODES}.")
+        self.mode = mode
+        if cache_dir is not None:
+            self.cache_dir = cache_dir
+        if mode != "off":
+            logger.info(f"Response cache: {mode} ({self.cache_dir})")
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    @property
+    def replay(self):
+        return self.mode == "replay"
+
+    def key(self, request, sample_idx):
+        """Computes the cache key of a request.
+
+        Args:
+            request (dict): Everything that determines the response: model, sampling kwargs, messages, tools...
+            sample_idx (int): Which sample of this request it is, so repeated runs of one prompt stay distinct.
+
+        Returns:
+            str: The hex digest identifying the entry.
+        """
+        payload = json.dumps({"request": request, "sample_idx": sample_idx}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + OUTPUT_JSON_SUFFIX)
+
+    def get(self, key):
+        """Returns the stored entry for key, or None if there is none."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            entry = load_json_zst(path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable response cache entry {path}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """Stores an entry under key; the file is written atomically so concurrent readers never see partial data."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            dump_json_zst(entry, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def stats(self):
+        """Returns the number of hits and misses so far."""
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,115 @@
+"""
+Write-ahead journal of solver responses. Every response is appended (and fsynced) as soon as it arrives, before it is
+graded; a commit record follows once its run was saved. Responses without a commit record when a run starts are
+the ones a crash lost between the provider returning and the run being saved, and are graded and saved again instead
+of being requested again.
+"""
+
+import os
+import tempfile
+import uuid
+
+from loguru import logger
+
+from matharena.json_zst import append_json_zst_record, load_json_zst_records
+from matharena.work_queue import file_lock
+
+JOURNAL_DIR = os.path.join("logs", "journal")
+JOURNAL_SUFFIX = ".wal"
+
+
+def journal_path(comp_name, solver_name, worker_id=None):
+    """Returns the journal of a (competition, solver) pair; work queue workers each write their own. Without a work
+    queue, all processes running the pair share the journal."""
+    name = solver_name if worker_id is None else f"{solver_name}-{worker_id}"
+    return os.path.join(JOURNAL_DIR, comp_name, f"{name}{JOURNAL_SUFFIX}")
+
+
+class ResponseJournal:
+    """Appends responses and commit records to one journal file. Every access holds a file lock, so several processes
+    (e.g. run.py on disjoint --problems) can share the journal without compact dropping records appended meanwhile."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    def _read(self):
+        # Must hold the file lock
+        if not os.path.exists(self.path):
+            return []
+        records, valid_length = load_json_zst_records(self.path)
+        if valid_length < os.path.getsize(self.path):
+            logger.warning(f"Dropping an incomplete record at the end of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_length)
+        return records
+
+    def record(self, problem_idx, slot, solver_response):
+        """Appends a response that has not been graded yet.
+
+        Args:
+            problem_idx (int): The problem of the response.
+            slot (int, optional): The run slot of the response (see Runner.prepare_run), or None.
+            solver_response (SolverResponse): The response.
+
+        Returns:
+            str: The id of the entry to commit once the run is saved, or None if the response could not be journaled.
+        """
+        entry_id = uuid.uuid4().hex
+        entry = {
+            "type": "response",
+            "id": entry_id,
+            "problem_idx": problem_idx,
+            "slot": slot,
+            "conversation": solver_response.conversation,
+            "detailed_cost": solver_response.detailed_cost,
+            "history": solver_response.history,
+        }
+        try:
+            with file_lock(self.lock_path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                append_json_zst_record(entry, self.path)
+        except Exception as e:
+            logger.warning(f"Could not journal a response of problem {problem_idx} in {self.path}: {e}")
+            return None
+        return entry_id
+
+    def commit(self, entry_id):
+        """Marks a journaled response as done (its run was saved, or it can never be)."""
+        if entry_id is None:
+            return
+        try:
+            with file_lock(self.lock_path):
+                append_json_zst_record({"type": "commit", "id": entry_id}, self.path)
+        except Exception as e:
+            logger.warning(f"Could not commit journal entry {entry_id} in {self.path}: {e}")
+
+    def pending(self):
+        """Returns the journaled responses without a commit record, in the order they arrived."""
+        with file_lock(self.lock_path):
+            records = self._read()
+        committed = {record["id"] for record in records if record["type"] == "commit"}
+        return [record for record in records if record["type"] == "response" and record["id"] not in committed]
+
+    def compact(self):
+        """Rewrites the journal with only its pending responses, or removes it if there are none. Only safe while no
+        response of this journal is being graded."""
+        with file_lock(self.lock_path):
+            records = self._read()
+            committed = {record["id"] for record in records if record["type"] == "commit"}
+            pending = [r for r in records if r["type"] == "response" and r["id"] not in committed]
+            if len(pending) == len(records):
+                return
+            if len(pending) == 0:
+                os.remove(self.path)
+                return
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            os.close(fd)
+            try:
+                for record in pending:
+                    append_json_zst_record(record, tmp_path)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
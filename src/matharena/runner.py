@@ -2,28 +2,44 @@
 
 import base64
 import csv
+import functools
 import json
 import os
+import threading
+from contextlib import nullcontext
 from datetime import datetime
 
 import yaml
-from datasets import load_dataset
 from loguru import logger
 
+from matharena.batch_ordering import estimate_run_costs, order_batch
 from matharena.grader import extract_and_grade
+from matharena.grading_pipeline import grading_pipeline
+from matharena.image_store import image_store
 from matharena.parser import extract_answer
+from matharena.problem_snapshot import latest_snapshot_path, load_snapshot, save_snapshot, snapshot_path
+from matharena.progress import progress_tracker
 from matharena.request_logger import request_logger
+from matharena.response_journal import ResponseJournal, journal_path
 from matharena.runs import Runs
-from matharena.solvers import AgentPool, AristotleSolver, PureModelSolver
-from matharena.tools.code_execution import execute_code
-from matharena.tools.lean_execution import add_to_file, lean_explore_search, loogle, verify_lean, verify_lean_with_formal_statement
-from matharena.tools.paper_search import read_paper, query_semantic_scholar, read_pages, find_in_paper
+from matharena.plugins import get_tool_function, is_registered_tool
+from matharena.solvers import AgentPool, PureModelSolver, SolverResponse
 from matharena.utils import normalize_conversation, save_run_for_recovery
 
 
 class Runner:
     def __init__(
-        self, comp_name, runs_per_problem, problem_ids, comp_configs_dir, solver_configs_dir, output_dir, redo_all
+        self,
+        comp_name,
+        runs_per_problem,
+        problem_ids,
+        comp_configs_dir,
+        solver_configs_dir,
+        output_dir,
+        redo_all,
+        ordering="problem",
+        budget=None,
+        work_queue=None,
     ):
         self.comp_name = comp_name
         self.runs_per_problem = runs_per_problem
@@ -32,6 +48,19 @@ class Runner:
         self.solver_configs_dir = solver_configs_dir
         self.base_output_dir = output_dir
         self.redo_all = redo_all
+        self.ordering = ordering  # batch ordering policy, see matharena/batch_ordering.py
+        self.budget = budget  # maximum expected cost in USD of a batch, for policies that support one
+        # Shared work queue of a sweep run by several workers, see matharena/work_queue.py; batches then only hold the
+        # run slots this worker claimed
+        self.work_queue = work_queue
+        if work_queue is not None and redo_all:
+            raise ValueError("--redo-all cannot be used with a work queue.")
+        if work_queue is not None and budget is not None:
+            # Each worker would apply the budget to every round of slots it claims, and slots the budget defers are
+            # never done, so workers would wait for them forever
+            raise ValueError("--budget cannot be used with a work queue.")
+        self._runs_lock = threading.Lock()  # guards adding runs against writing the status of all problems
+        self._journals = {}  # solver_name -> ResponseJournal of the responses not saved yet
 
         # Load competition config
         competition_config_path = f"{self.comp_configs_dir}/{self.comp_name}.yaml"
@@ -45,24 +74,51 @@ class Runner:
         logger.info(f"Loaded {len(self.problems)} problems for competition {self.comp_name}")
 
     def _load_problems(self, problem_ids):
-        """Loads problems for the competition assigned to this runner.
+        """Loads problems for the competition assigned to this runner, from its compiled snapshot if the sources did
+        not change since it was written (see matharena/problem_snapshot.py).
 
         Returns:
             list: A list of problems, each is a dict with keys
-                  "problem_idx", "problem", "answer", and optionally "source" and "problem_types".
+                  "problem_idx", "problem", "answer", and optionally "source", "problem_types" and "image" (a reference
+                  into the image store).
         """
         dataset_path = self.competition_config["dataset_path"]
+        is_hf_dataset = not os.path.exists(dataset_path)
+
+        path = snapshot_path(self.competition_config)
+        problems = load_snapshot(path)
+        if problems is None and path is None and is_hf_dataset:
+            problems = load_snapshot(latest_snapshot_path(self.competition_config))  # Hub unreachable
+        if problems is None:
+            if is_hf_dataset:
+                problems = self._load_hf_problems(dataset_path)
+            else:
+                problems = self._load_local_problems(dataset_path)
+            save_snapshot(path, problems)
 
-        if not os.path.exists(dataset_path):
-            problems = load_dataset(dataset_path, split="train").to_list()
-            for problem in problems:
-                if "image" in problem and problem["image"] is not None:
-                    image_b64 = base64.b64encode(problem["image"]["bytes"]).decode("utf-8")
-                    problem["image"] = image_b64
-            if problem_ids is not None:
-                problems = [p for p in problems if str(p["problem_idx"]) in [str(pid) for pid in problem_ids]]
-            return sorted(problems, key=lambda x: x["problem_idx"])
-
+        # Filter problems
+        if problem_ids is not None:
+            problems = [p for p in problems if str(p["problem_idx"]) in [str(pid) for pid in problem_ids]]
+
+        # Keep each image once in the image store (fit to the image budget) and only a reference in the problem
+        for problem in problems:
+            if problem.get("image") is not None:
+                problem["image"] = image_store.put(problem["image"])
+        return problems
+
+    def _load_hf_problems(self, dataset_path):
+        """Loads all problems of a Hugging Face dataset, sorted by problem_idx."""
+        from datasets import load_dataset
+
+        problems = load_dataset(dataset_path, split="train").to_list()
+        for problem in problems:
+            if "image" in problem and problem["image"] is not None:
+                image_b64 = base64.b64encode(problem["image"]["bytes"]).decode("utf-8")
+                problem["image"] = image_b64
+        return sorted(problems, key=lambda x: x["problem_idx"])
+
+    def _load_local_problems(self, dataset_path):
+        """Loads all problems of a local dataset directory, sorted by problem_idx."""
         is_lean_comp = self.competition_config.get("lean", False)
         answers_csv_path = os.path.join(dataset_path, "answers.csv")
         grading_scheme_path = os.path.join(dataset_path, "grading_scheme.json")
@@ -156,13 +212,7 @@ class Runner:
                 for p in problems:
                     if p["problem_idx"] in source_map:
                         p["source"] = source_map[p["problem_idx"]]
-        sorted_problems = sorted(problems, key=lambda x: x["problem_idx"])
-
-        # Filter problems
-        if problem_ids is not None:
-            sorted_problems = [p for p in sorted_problems if p["problem_idx"] in problem_ids]
-
-        return sorted_problems
+        return sorted(problems, key=lambda x: x["problem_idx"])
 
     def load_solver_config(self, solver_config_path):
         """Loads and processes the solver (model/agent) configuration from a YAML file.
@@ -225,18 +275,6 @@ class Runner:
         """
         tool_descriptions = self.competition_config.get("tools", [])
         lean_version = model_config.get("lean_environment_override", self.competition_config.get("lean_environment", None))
-        POSSIBLE_TOOL_FUNCTIONS = {
-            "execute_code": execute_code,
-            "verify_lean": lambda code, messages=None: verify_lean(code, lean_version, messages=messages),
-            "verify_submission": lambda code, formal_statement, messages=None: verify_lean_with_formal_statement(code, formal_statement, lean_version, messages=messages),
-            "add_to_file": lambda code, messages=None: add_to_file(code, lean_version, messages=messages),
-            "loogle": loogle,
-            "lean_explore_search": lean_explore_search,
-            "read_paper": read_paper,
-            "query_semantic_scholar": query_semantic_scholar,
-            "read_pages": read_pages,
-            "find_in_paper": find_in_paper,
-        }
         tools = []
         for tool_desc in tool_descriptions:
             if model_config.get("use_openai_responses_api_tools", model_config.get("use_openai_responses_api", False)) and "tool_spec_openai_responses_api" in tool_desc:
@@ -247,8 +285,9 @@ class Runner:
             else:
                 tool_spec = tool_desc["tool_spec"]
                 func_name = tool_spec["function"]["name"]
-                if func_name in POSSIBLE_TOOL_FUNCTIONS:
-                    tools.append((POSSIBLE_TOOL_FUNCTIONS[func_name], tool_spec))
+                if is_registered_tool(func_name):
+                    # Imports the tool module (and its dependencies) only now that a config uses it
+                    tools.append((get_tool_function(func_name, lean_environment=lean_version), tool_spec))
         max_tool_calls = self.competition_config.get("max_tool_calls", 0)
         args = model_config.copy()
         args["tools"] = tools
@@ -287,6 +326,8 @@ class Runner:
         """
         if solver_config["type"] == "pure_model":
             if default_api_client_args.get("api") == "aristotle":
+                from matharena.solvers.aristotle_solver import AristotleSolver
+
                 return AristotleSolver(solver_config, default_prompt_template, default_api_client_args, last_chance_prompt)
             return PureModelSolver(solver_config, default_prompt_template, default_api_client_args, last_chance_prompt)
         elif solver_config["type"] == "agent":
@@ -294,14 +335,15 @@ class Runner:
         else:
             raise ValueError(f"Unknown solver type: {solver_config['type']}")
 
-    def _update_status(self, solver_name, all_problem_runs):
-        """Writes a status file to the output directory."""
-        status_path = os.path.join("logs", "status", f"{self.comp_name}_{solver_name}.txt")
-        os.makedirs(os.path.dirname(status_path), exist_ok=True)
-        with open(status_path, "w") as f:
+    def _status_snapshot(self, all_problem_runs):
+        """Returns the status file text and per-problem progress for the progress tracker."""
+        with self._runs_lock:
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"Status as of {current_time}\n")
-            f.write(f"There are {len(self.problems)} problems; doing {self.runs_per_problem} runs per problem.\n\n")
+            lines = [
+                f"Status as of {current_time}\n",
+                f"There are {len(self.problems)} problems; doing {self.runs_per_problem} runs per problem.\n\n",
+            ]
+            problems = {}
             for problem_idx in sorted(all_problem_runs.keys()):
                 problem_runs = all_problem_runs[problem_idx]
                 progress = []
@@ -314,7 +356,13 @@ class Runner:
                     else:
                         progress.append("-")  # Not done yet
                 progress = "".join(progress)
-                f.write(f"Problem {problem_idx:3}: {progress} ({self.runs_per_problem - problem_runs.N} left)\n")
+                lines.append(f"Problem {problem_idx:3}: {progress} ({self.runs_per_problem - problem_runs.N} left)\n")
+                problems[problem_idx] = {
+                    "runs": problem_runs.N,
+                    "target": self.runs_per_problem,
+                    "correct": sum(1 for c in problem_runs.correct if c is True),
+                }
+            return "".join(lines), problems
 
     def prepare_run(self, solver_name, set_request_metadata=True):
         """Prepare solver, status files, and pending batch for this competition."""
@@ -346,19 +394,56 @@ class Runner:
         batch = []  # list of (problem payload, image) pairs
         batch_idx_to_problem_idx = {}  # index in batch -> problem_idx
         batch_idx_to_run_idx = {}  # index in batch -> run_idx
+        batch_idx_to_sample_idx = {}  # index in batch -> run_idx counting existing runs (keys the response cache)
+        history = {}  # problem_idx -> detailed costs of earlier runs, to order the batch
         is_auto_graded_comp = self.is_fa_comp or self.competition_config.get("lean", False)
         for problem in self.problems:
             # Initialize or load problem runs for this problem
-            runs = Runs(self.comp_name, is_auto_graded_comp, solver_name, solver_config["type"], problem, output_dir)
+            runs = Runs(
+                self.comp_name,
+                is_auto_graded_comp,
+                solver_name,
+                solver_config["type"],
+                problem,
+                output_dir,
+                shared=self.work_queue is not None,
+            )
             if self.redo_all:
                 logger.info(f"Not skipping existing runs for problem {problem["problem_idx"]} (will overwrite)")
+                if self.ordering != "problem":
+                    previous = Runs(
+                        self.comp_name, is_auto_graded_comp, solver_name, solver_config["type"], problem, output_dir
+                    )
+                    previous.load_from_file()
+                    history[problem["problem_idx"]] = previous.detailed_costs
             else:
-                runs.load_from_file()
+                runs.load()
                 # logger.info(f"Problem {problem["problem_idx"]}: loaded {runs.N} previous runs")
+            history.setdefault(problem["problem_idx"], runs.detailed_costs)
             all_runs[problem["problem_idx"]] = runs
 
-            # Add to batch if we need more runs
-            for run_idx in range(self.runs_per_problem - runs.N):
+        # Save the responses a crash lost before their runs were saved, instead of requesting them again
+        worker_id = self.work_queue.worker_id if self.work_queue is not None else None
+        journal = ResponseJournal(journal_path(self.comp_name, solver_name, worker_id))
+        self._journals[solver_name] = journal
+        self._replay_journal(solver_name, solver, all_runs, journal)
+
+        for problem in self.problems:
+            runs = all_runs[problem["problem_idx"]]
+            # Add to batch if we need more runs; with a work queue, only the run slots claimed by this worker, which
+            # also key the response cache and agent logs
+            if self.work_queue is None:
+                slots = [runs.N + run_idx for run_idx in range(self.runs_per_problem - runs.N)]
+            else:
+                slots = self.work_queue.claim(
+                    self.comp_name,
+                    solver_name,
+                    problem["problem_idx"],
+                    runs.N,
+                    self.runs_per_problem,
+                    max(0, self.work_queue.claim_size - len(batch)),
+                )
+            for run_idx, slot in enumerate(slots):
                 prompt_payload = {
                     "problem": problem.get("problem"),
                 }
@@ -367,17 +452,43 @@ class Runner:
                 batch.append(
                     (
                         prompt_payload,
-                        problem["image"] if "image" in problem else None,
+                        problem.get("image"),
                     )
-                )  # (problem payload, image)
+                )  # (problem payload, image reference)
                 batch_idx_to_problem_idx[len(batch) - 1] = problem["problem_idx"]
-                batch_idx_to_run_idx[len(batch) - 1] = run_idx
+                batch_idx_to_run_idx[len(batch) - 1] = run_idx if self.work_queue is None else slot
+                batch_idx_to_sample_idx[len(batch) - 1] = slot
+
+        # Reorder the batch with the ordering policy, estimating each run from the earlier runs of its problem
+        estimates = estimate_run_costs(history)
+        batch_estimates = [estimates[batch_idx_to_problem_idx[i]] for i in range(len(batch))]
+        order = order_batch(
+            self.ordering, [batch_idx_to_problem_idx[i] for i in range(len(batch))], batch_estimates, self.budget
+        )
+        if self.ordering != "problem":
+            logger.info(f"Ordered the batch with the {self.ordering} policy ({len(order)} of {len(batch)} runs).")
+        if self.work_queue is not None:
+            kept = set(order)
+            for i in range(len(batch)):
+                if i not in kept:  # deferred by the policy (budget), leave the slot to other workers
+                    self.work_queue.release(
+                        self.comp_name, solver_name, batch_idx_to_problem_idx[i], [batch_idx_to_sample_idx[i]]
+                    )
+        batch = [batch[i] for i in order]
+        batch_estimates = [batch_estimates[i] for i in order]
+        batch_idx_to_problem_idx = {new: batch_idx_to_problem_idx[old] for new, old in enumerate(order)}
+        batch_idx_to_run_idx = {new: batch_idx_to_run_idx[old] for new, old in enumerate(order)}
+        batch_idx_to_sample_idx = {new: batch_idx_to_sample_idx[old] for new, old in enumerate(order)}
 
-        self._update_status(solver_name, all_runs)
+        # The status file is rewritten by the progress tracker at most every few seconds as runs finish
+        status_path = os.path.join("logs", "status", f"{self.comp_name}_{solver_name}.txt")
+        progress_tracker.register(
+            self.comp_name, solver_name, status_path, len(batch), functools.partial(self._status_snapshot, all_runs)
+        )
+        progress_tracker.flush()
         if set_request_metadata:
             request_logger.set_metadata(self.comp_name, solver_name, batch_idx_to_problem_idx)
         logger.info(f"Status file created. Total new runs in the batch sent to solver: {len(batch)}.")
-        status_path = os.path.join("logs", "status", f"{self.comp_name}_{solver_name}.txt")
         print(f"Printing initial status from {status_path}.")
         with open(status_path, "r") as f:
             print(f.read())
@@ -394,6 +505,8 @@ class Runner:
             "batch": batch,
             "batch_idx_to_problem_idx": batch_idx_to_problem_idx,
             "batch_idx_to_run_idx": batch_idx_to_run_idx,
+            "batch_idx_to_sample_idx": batch_idx_to_sample_idx,
+            "batch_estimates": batch_estimates,
             "status_path": status_path,
         }
 
@@ -406,95 +519,248 @@ class Runner:
         status_path,
         solver_responses,
         print_final_status=True,
+        wait=True,
+        batch_idx_to_sample_idx=None,
     ):
-        """Grade and save solver responses for an already prepared batch."""
+        """Grade and save solver responses for an already prepared batch.
+
+        Responses are handed to the grading pipeline as they arrive, so grading does not hold up consuming the next
+        one; runs of one problem are saved in arrival order. With wait=False, pass the returned futures to
+        grading_pipeline.wait() before relying on the saved runs. With a work queue, batch_idx_to_sample_idx gives
+        the run slot of each response, which is marked done once its run is saved. Responses are written to the
+        solver's response journal before grading (see matharena/response_journal.py).
+
+        Returns:
+            list[Future]: One per response, done once its run has been saved.
+        """
+        futures = []
         for solver_response in solver_responses:
             problem_idx = batch_idx_to_problem_idx[solver_response.idx]
             problem_runs = all_runs[problem_idx]
             debug_info = f"{solver_name} @ P{problem_idx} (ridx={solver_response.idx})"
-            logger.info(f"[{debug_info}] Received a solver response, analyzing...")
-            output_tokens = solver_response.detailed_cost.get("output_tokens", 0)
-            try:
-                # For FA: If strict parsing finds no answer give the model one last chance to format correctly
-                if self.is_fa_comp:
-                    try:
-                        clean_conversation = normalize_conversation(solver_response.conversation)
-                    except Exception as e:  # noqa E722
-                        save_run_for_recovery("runner reprompt check", problem_runs.path, solver_response, None)
-                        raise
-                    last_block = clean_conversation[-1]  # might throw
-                    last_role, last_content = last_block.get("role", ""), last_block.get("content", "")
-                    logger.info(f"[{debug_info}] Extracted last message role={last_role}.")
-                    valid_answer_found = True
-                    if last_role != "assistant":
-                        valid_answer_found = False
-                    else:
-                        answer = extract_answer(last_content, True)[0]
-                        if answer is None or (self.options is not None and str(answer) not in self.options):
-                            valid_answer_found = False
-                    if not valid_answer_found:
-                        logger.info(
-                            "No valid answer found, reprompting the model to report the final answer (last chance)."
-                        )
-                        solver_response = solver.last_chance(solver_response)
-                        logger.info("Done reprompting")
-
-                logger.info(f"[{debug_info}] Extracting and grading the answer...")
-                # Extract answer from the run and grade
-                problem = next(p for p in self.problems if p["problem_idx"] == problem_idx)
-                if not self.is_fa_comp and not self.competition_config.get("lean", False):
-                    grader_response = (None, "TODO Grading", 0)  # answer, is_correct, warnings
+            slot = batch_idx_to_sample_idx[solver_response.idx] if batch_idx_to_sample_idx is not None else None
+            journal = self._journals.get(solver_name)
+            journal_id = journal.record(problem_idx, slot, solver_response) if journal is not None else None
+            logger.info(f"[{debug_info}] Received a solver response, handing it to grading.")
+            future = grading_pipeline.submit(
+                problem_runs.path,
+                functools.partial(self._grade_solver_response, solver, problem_runs, solver_response, debug_info),
+                functools.partial(
+                    self._save_graded_run, solver_name, problem_runs, debug_info, slot=slot, journal_id=journal_id
+                ),
+            )
+            futures.append(future)
+        if wait:
+            grading_pipeline.wait(futures)
+            self.compact_runs(all_runs)
+        if print_final_status:
+            self.print_final_status(status_path)
+        return futures
+
+    def _grade_solver_response(self, solver, problem_runs, solver_response, debug_info):
+        """Grading pipeline work: gives the model a last chance to report an answer and grades the response.
+
+        Returns:
+            tuple: (solver_response, grader_response), or None if the response cannot be added.
+        """
+        problem_idx = problem_runs.problem_idx
+        output_tokens = solver_response.detailed_cost.get("output_tokens", 0)
+        try:
+            # For FA: If strict parsing finds no answer give the model one last chance to format correctly
+            if self.is_fa_comp:
+                try:
+                    clean_conversation = normalize_conversation(solver_response.conversation)
+                except Exception as e:  # noqa E722
+                    save_run_for_recovery("runner reprompt check", problem_runs.path, solver_response, None)
+                    raise
+                last_block = clean_conversation[-1]  # might throw
+                last_role, last_content = last_block.get("role", ""), last_block.get("content", "")
+                logger.info(f"[{debug_info}] Extracted last message role={last_role}.")
+                valid_answer_found = True
+                if last_role != "assistant":
+                    valid_answer_found = False
                 else:
-                    try:
-                        clean_conversation = normalize_conversation(solver_response.conversation)
-                    except Exception as e:  # noqa E722
-                        logger.error(f"[{debug_info}] Error during conversation normalization: {e}")
-                        save_run_for_recovery("runner pre-grading", problem_runs.path, solver_response, None)
-                        raise
-                    gold_answer = problem_runs.gold_answer
-                    try:
-                        grading_config = self.competition_config.copy()
-                        if getattr(solver, "lean_environment_override", None) is not None:
-                            grading_config["lean_environment"] = solver.lean_environment_override
-                        grader_response = extract_and_grade(
-                            clean_conversation,
-                            output_tokens,
-                            gold_answer,
-                            grading_config,
-                            problem=problem,
-                            debug_info=debug_info,
-                        )
-                    except Exception as e:  # noqa E722
-                        logger.error(f"[{debug_info}] Error during grading: {e}")
-                        save_run_for_recovery("runner extract+grading", problem_runs.path, solver_response, None)
-                        raise
-
-                # Add run to problem_runs
+                    answer = extract_answer(last_content, True)[0]
+                    if answer is None or (self.options is not None and str(answer) not in self.options):
+                        valid_answer_found = False
+                if not valid_answer_found:
+                    logger.info(
+                        "No valid answer found, reprompting the model to report the final answer (last chance)."
+                    )
+                    solver_response = solver.last_chance(solver_response)
+                    logger.info("Done reprompting")
+
+            logger.info(f"[{debug_info}] Extracting and grading the answer...")
+            # Extract answer from the run and grade
+            problem = next(p for p in self.problems if p["problem_idx"] == problem_idx)
+            if not self.is_fa_comp and not self.competition_config.get("lean", False):
+                grader_response = (None, "TODO Grading", 0)  # answer, is_correct, warnings
+            else:
+                try:
+                    clean_conversation = normalize_conversation(solver_response.conversation)
+                except Exception as e:  # noqa E722
+                    logger.error(f"[{debug_info}] Error during conversation normalization: {e}")
+                    save_run_for_recovery("runner pre-grading", problem_runs.path, solver_response, None)
+                    raise
+                gold_answer = problem_runs.gold_answer
+                try:
+                    grading_config = self.competition_config.copy()
+                    if getattr(solver, "lean_environment_override", None) is not None:
+                        grading_config["lean_environment"] = solver.lean_environment_override
+                    # Parsing and sympy checks are CPU-bound, so they run in a worker process
+                    grader_response = grading_pipeline.run_in_process(
+                        extract_and_grade,
+                        clean_conversation,
+                        output_tokens,
+                        gold_answer,
+                        grading_config,
+                        problem=problem,
+                        debug_info=debug_info,
+                    )
+                except Exception as e:  # noqa E722
+                    logger.error(f"[{debug_info}] Error during grading: {e}")
+                    save_run_for_recovery("runner extract+grading", problem_runs.path, solver_response, None)
+                    raise
+            return solver_response, grader_response
+        except Exception as e:
+            logger.opt(exception=True).error(f"[{debug_info}] Error during response analysis, can't add run. {e}")
+            return None
+
+    def _save_graded_run(self, solver_name, problem_runs, debug_info, graded, slot=None, journal_id=None):
+        """Grading pipeline commit: adds a graded run to its problem, saves the problem's runs and updates the status.
+        With a work queue, the run is merged with the runs other workers saved and its slot is marked done. The
+        journal entry of the response is committed unless saving failed, so the next start retries it."""
+        problem_idx = problem_runs.problem_idx
+        journal = self._journals.get(solver_name)
+        if graded is None:
+            progress_tracker.record_failure(self.comp_name, solver_name)
+            self._release_slot(solver_name, problem_idx, slot)
+            if journal is not None:
+                journal.commit(journal_id)  # grading failed, replaying would not help (see logs/broken_runs)
+            return
+        solver_response, grader_response = graded
+        try:
+            if self.work_queue is None or slot is None:
+                completing = nullcontext(True)
+            else:
+                completing = self.work_queue.completing(self.comp_name, solver_name, problem_idx, slot)
+            with completing as save:
+                if not save:
+                    if journal is not None:
+                        journal.commit(journal_id)
+                    return
+                # Add run to problem_runs, save and update status
                 logger.info(f"[{debug_info}] Adding the run to problem runs.")
-                problem_runs.add_run(solver_response, grader_response)
-
-                # Save and update status
-                logger.info(f"[{debug_info}] Successfully added a run and updated status. Saving runs to file.")
-                problem_runs.save_to_file()
-                self._update_status(solver_name, all_runs)
-
-                # Is this problem done?
-                if problem_runs.N == self.runs_per_problem:
-                    score = sum(problem_runs.correct) if (self.is_fa_comp or self.competition_config.get("lean", False)) else problem_runs.N
-                    if not self.competition_config.get("lean", False):
-                        logger.info(
-                            f"Problem {str(problem_idx)} is done. {problem_runs.N} runs completed. Gold answer: {problem_runs.gold_answer}."
-                        )
-                    else:
-                        logger.info(
-                            f"Problem {str(problem_idx)} is done. #Correct: {score}"
-                        )
+                with self._runs_lock, problem_runs.exclusive():
+                    problem_runs.add_run(solver_response, grader_response)
+                    logger.info(f"[{debug_info}] Successfully added a run and updated status. Saving runs to file.")
+                    problem_runs.append_to_log()
+            if journal is not None:
+                journal.commit(journal_id)
+            progress_tracker.record_run(self.comp_name, solver_name, solver_response.detailed_cost)
+
+            # Is this problem done?
+            if problem_runs.N >= self.runs_per_problem:
+                with self._runs_lock, problem_runs.exclusive():
+                    problem_runs.compact()
+                score = sum(problem_runs.correct) if (self.is_fa_comp or self.competition_config.get("lean", False)) else problem_runs.N
+                if not self.competition_config.get("lean", False):
+                    logger.info(
+                        f"Problem {str(problem_idx)} is done. {problem_runs.N} runs completed. Gold answer: {problem_runs.gold_answer}."
+                    )
+                else:
+                    logger.info(
+                        f"Problem {str(problem_idx)} is done. #Correct: {score}"
+                    )
+        except Exception as e:
+            logger.opt(exception=True).error(f"[{debug_info}] Error during response analysis, can't add run. {e}")
+            progress_tracker.record_failure(self.comp_name, solver_name)
+            self._release_slot(solver_name, problem_idx, slot)
+
+    def _replay_journal(self, solver_name, solver, all_runs, journal):
+        """Grades and saves the responses of the journal that were never committed, e.g. because the process died
+        while grading them, and compacts the journal."""
+        entries = journal.pending()
+        futures = []
+        for entry in entries:
+            problem_idx = entry["problem_idx"]
+            problem_runs = all_runs.get(problem_idx)
+            if problem_runs is None:
+                continue  # not selected in this run, keep it for a later one
+            if self._is_saved(problem_runs, entry["conversation"]):
+                journal.commit(entry["id"])  # saved right before the crash, only the commit record is missing
+                continue
+            slot = entry["slot"] if self.work_queue is not None else None
+            if slot is not None:
+                status = self.work_queue.claim_slot(self.comp_name, solver_name, problem_idx, slot)
+                if status == "leased":
+                    continue  # another worker is on it; the entry is resolved once it finishes
+                if status == "done":
+                    journal.commit(entry["id"])
+                    continue
+            elif problem_runs.N >= self.runs_per_problem:
+                logger.warning(f"Problem {problem_idx} already has all runs, dropping a journaled response.")
+                journal.commit(entry["id"])
+                continue
+            debug_info = f"{solver_name} @ P{problem_idx} (journal)"
+            logger.info(f"[{debug_info}] Saving a response from the journal instead of requesting it again.")
+            solver_response = SolverResponse(
+                len(futures), entry["conversation"], entry["detailed_cost"], history=entry["history"]
+            )
+            future = grading_pipeline.submit(
+                problem_runs.path,
+                functools.partial(self._grade_solver_response, solver, problem_runs, solver_response, debug_info),
+                functools.partial(
+                    self._save_graded_run, solver_name, problem_runs, debug_info, slot=slot, journal_id=entry["id"]
+                ),
+            )
+            futures.append(future)
+        if len(futures) > 0:
+            grading_pipeline.wait(futures)
+            self.compact_runs(all_runs)
+            logger.info(f"Replayed {len(futures)} journaled responses of {solver_name}.")
+        try:
+            journal.compact()
+        except Exception as e:
+            logger.warning(f"Could not compact the response journal {journal.path}: {e}")
+
+    def _is_saved(self, problem_runs, conversation):
+        """Returns whether a saved run starts with the given conversation (a last-chance reprompt may extend it)."""
+        try:
+            clean_conversation = normalize_conversation(conversation)
+        except Exception:
+            return False
+        with self._runs_lock:
+            return any(messages[: len(clean_conversation)] == clean_conversation for messages in problem_runs.messages)
+
+    def _release_slot(self, solver_name, problem_idx, slot):
+        """Hands the work queue slot of a run that could not be saved back to the queue, counting the failure."""
+        if self.work_queue is not None and slot is not None:
+            self.work_queue.release(self.comp_name, solver_name, problem_idx, [slot], failed=True)
+
+    def release_claims(self, prepared):
+        """Hands the work queue slots of a finished batch that produced no saved run (e.g. failed queries) back to the
+        queue, counting the failures."""
+        if self.work_queue is None:
+            return
+        solver_name = prepared["solver_name"]
+        for problem_idx in sorted(set(prepared["batch_idx_to_problem_idx"].values())):
+            slots = self.work_queue.held(self.comp_name, solver_name, problem_idx)
+            if len(slots) > 0:
+                logger.warning(f"No run was saved for run slots {slots} of problem {problem_idx}, releasing them.")
+                self.work_queue.release(self.comp_name, solver_name, problem_idx, slots, failed=True)
+
+    def compact_runs(self, all_runs):
+        """Compacts the run logs of all problems into their JSON files, e.g. once a batch is done."""
+        for problem_runs in all_runs.values():
+            try:
+                with self._runs_lock, problem_runs.exclusive():
+                    problem_runs.compact()
             except Exception as e:
-                logger.opt(exception=True).error(f"[{debug_info}] Error during response analysis, can't add run. {e}")
-        if print_final_status:
-            self.print_final_status(status_path)
+                logger.opt(exception=True).error(f"Could not compact the runs in {problem_runs.path}: {e}")
 
     def print_final_status(self, status_path):
+        progress_tracker.flush()
         print(f"Done. Printing final status from {status_path}.")
         with open(status_path, "r") as f:
             print(f.read())
@@ -509,7 +775,10 @@ class Runner:
             return
 
         responses = prepared["solver"].solve_batch(
-            prepared["batch"], prepared["batch_idx_to_problem_idx"], prepared["batch_idx_to_run_idx"]
+            prepared["batch"],
+            prepared["batch_idx_to_problem_idx"],
+            prepared["batch_idx_to_run_idx"],
+            sample_indices=[prepared["batch_idx_to_sample_idx"][i] for i in range(len(prepared["batch"]))],
         )
         self.process_solver_responses(
             solver_name=prepared["solver_name"],
@@ -518,4 +787,6 @@ class Runner:
             batch_idx_to_problem_idx=prepared["batch_idx_to_problem_idx"],
             status_path=prepared["status_path"],
             solver_responses=responses,
+            batch_idx_to_sample_idx=prepared["batch_idx_to_sample_idx"],
         )
+        self.release_claims(prepared)
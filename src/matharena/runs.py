@@ -1,11 +1,20 @@
 import json
 import os
+import tempfile
 from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 import time
 
 from loguru import logger
 
-from matharena.json_zst import OUTPUT_JSON_SUFFIX, dump_json_zst, load_json_zst
+from matharena.json_zst import (
+    OUTPUT_JSON_SUFFIX,
+    RUN_LOG_SUFFIX,
+    append_json_zst_record,
+    dump_json_zst,
+    load_json_zst,
+    load_json_zst_records,
+)
 from matharena.utils import (
     convert_answer_to_string,
     lists_differ,
@@ -13,15 +22,108 @@ from matharena.utils import (
     normalize_conversation,
     save_run_for_recovery,
 )
+from matharena.work_queue import file_lock
+
+RUN_LOG_COMPACT_EVERY = 16  # runs appended to the run log before it is compacted into the JSON file
+# Per-run lists of an output file, in the order of the fields of a run log record
+RUN_LIST_FIELDS = [
+    ("answers", "answer"),
+    ("correct", "correct"),
+    ("warnings", "warning"),
+    ("manual_overwrite", "manual_overwrite"),
+    ("llm_annotation", "llm_annotation"),
+    ("messages", "messages"),
+    ("judgment", "judgment"),
+    ("history", "history"),
+    ("detailed_costs", "detailed_cost"),
+]
+
+
+def run_log_path(path):
+    """Returns the run log of an output file (outputs/{comp}/{solver}/{problem_idx}.json.zst)."""
+    return str(path).removesuffix(OUTPUT_JSON_SUFFIX) + RUN_LOG_SUFFIX
+
+
+def aggregate_runs(detailed_costs, correct):
+    """Returns the total cost dict and pass@1 of a problem's runs."""
+    cost = {}
+    for k in ["cost", "input_tokens", "output_tokens", "time", "n_retries", "request_time"]:
+        vals = [dc.get(k, None) for dc in detailed_costs]
+        if any(v is None for v in vals):
+            cost[k] = None
+        else:
+            cost[k] = sum(vals)
+    if len(correct) == 0:
+        pass_at_1 = None
+    elif any(isinstance(c, str) for c in correct):
+        pass_at_1 = "TODO Grading"
+    else:
+        pass_at_1 = sum(correct) / len(correct)
+    return cost, pass_at_1
+
+
+def load_runs_file(path):
+    """Loads an output file with the runs of its run log merged in, so scripts that read output files directly also
+    see runs run.py has not compacted yet (e.g. because it was interrupted). The files are not modified.
+
+    Args:
+        path (str): The output file, outputs/{comp}/{solver}/{problem_idx}.json.zst.
+
+    Returns:
+        dict: The runs, as stored by Runs.to_dict.
+    """
+    data = load_json_zst(path)
+    log_path = run_log_path(path)
+    if not os.path.exists(log_path):
+        return data
+    # A trailing partial record is being appended, or was cut off by a crash; either way it is not a run yet
+    records, _ = load_json_zst_records(log_path)
+    n = len(data["answers"])
+    n_before = n
+    for record in records:
+        if record["n"] < n:
+            continue  # compacted into the JSON file before the log was removed
+        if record["n"] > n:
+            logger.warning(f"Run log {log_path} skips from run {n} to {record['n']}, ignoring the rest")
+            break
+        for field, record_field in RUN_LIST_FIELDS:
+            data.setdefault(field, [None] * n_before).append(record[record_field])
+        n += 1
+    if n > n_before:
+        data["N"] = n
+        data["cost"], data["pass_at_1"] = aggregate_runs(data["detailed_costs"], data["correct"])
+    return data
+
+
+def save_runs_file(data, path):
+    """Saves runs loaded with load_runs_file (atomically) and removes the run log, whose runs they contain."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(str(path)) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        dump_json_zst(data, tmp_path, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if os.path.exists(run_log_path(path)):
+        os.remove(run_log_path(path))
+
+
+def compact_run_log(path):
+    """Folds the run log of an output file into the file, e.g. before the file is moved or renamed."""
+    if os.path.exists(run_log_path(path)):
+        save_runs_file(load_runs_file(path), path)
 
 
 class Runs:
     """
     List of all runs of a particular solver for a specific problem in a specific comp.
-    Corresponds to outputs/{comp}/{solver}/{problem_idx}.json.zst files.
+    Corresponds to outputs/{comp}/{solver}/{problem_idx}.json.zst files. While a run is in progress, new runs are
+    appended to outputs/{comp}/{solver}/{problem_idx}.runlog and periodically compacted into the JSON file.
     """
 
-    def __init__(self, comp_name, is_fa, solver_name, solver_type, problem, output_dir):
+    def __init__(self, comp_name, is_fa, solver_name, solver_type, problem, output_dir, shared=False):
         self.sorted_keys = [
             # Fixed problem info:
             "idx",
@@ -62,13 +164,18 @@ class Runs:
         # NOTE: singular name for consistency with HF but is a list
 
         # Initialize to default
-        self.N, self.cost, self.pass_at_1 = 0, {}, None
-        self.answers, self.correct, self.warnings = [], [], []
-        self.manual_overwrite, self.llm_annotation = [], []
-        self.messages, self.judgment, self.history, self.detailed_costs = [], [], [], []
+        self._clear()
 
         # Path
         self.path = f"{output_dir}/{self.problem_idx}{OUTPUT_JSON_SUFFIX}"
+        self.log_path = run_log_path(self.path)
+        # Shared runs are also written by other processes (workers of a work queue, see matharena/work_queue.py)
+        self.shared = shared
+        self.lock_path = f"{output_dir}/{self.problem_idx}.lock"
+        # Runs in the JSON file and run log; None if the files do not match the runs in memory (e.g. not loaded with
+        # --redo-all), in which case the next save rewrites them
+        self._n_persisted = None
+        self._n_logged = 0  # records in the run log
         self.message_keys_zorder = {
             "role": 0,
             "type": 1,
@@ -83,19 +190,132 @@ class Runs:
             "messages": 2,
         }
 
-    def load_from_file(self):
-        """Loads runs from a JSON file."""
-        if not os.path.exists(self.path):
+    def _clear(self):
+        self.N, self.cost, self.pass_at_1 = 0, {}, None
+        self.answers, self.correct, self.warnings = [], [], []
+        self.manual_overwrite, self.llm_annotation = [], []
+        self.messages, self.judgment, self.history, self.detailed_costs = [], [], [], []
+
+    @contextmanager
+    def exclusive(self):
+        """For shared runs, locks the files across processes and reloads the runs other processes saved, so changes
+        made in the block are merged with theirs rather than overwriting them. Does nothing for runs that are not
+        shared."""
+        if not self.shared:
+            yield
             return
-        runs_dict = load_json_zst(self.path)
-        self.from_dict(runs_dict)
+        with file_lock(self.lock_path):
+            self._clear()
+            self.load_from_file(repair_log=True)
+            yield
+
+    def load(self):
+        """Loads runs to add more to them: shared runs under the lock (see exclusive), so a run log being appended to
+        by another process is never mistaken for an interrupted one."""
+        with file_lock(self.lock_path) if self.shared else nullcontext():
+            self.load_from_file(repair_log=True)
+
+    def load_from_file(self, repair_log=False):
+        """Loads runs from the JSON file and the run log appended to it since the last compaction.
+
+        Args:
+            repair_log (bool, optional): Whether to cut an incomplete record off the end of the run log, so runs can be
+                appended after it. Only for the writer of the runs (holding the lock if they are shared); other
+                readers ignore the record, which may still be being appended. Defaults to False.
+        """
+        n_on_disk = 0
+        if os.path.exists(self.path):
+            runs_dict = load_json_zst(self.path)
+            n_on_disk = len(runs_dict["answers"])
+            self.from_dict(runs_dict)
+        records = self._read_run_log(repair_log)
+        for record in records:
+            if record["n"] < n_on_disk:
+                continue  # compacted into the JSON file before the log was removed
+            if record["n"] > n_on_disk:
+                logger.warning(f"Run log {self.log_path} skips from run {n_on_disk} to {record['n']}, ignoring the rest")
+                break
+            self._add_record(record)
+            n_on_disk += 1
+        self._n_logged = len(records)
+        # Runs dropped while loading make the files differ from memory
+        self._n_persisted = self.N if self.N == n_on_disk else None
 
     def save_to_file(self):
-        """Saves runs to a JSON file."""
+        """Saves runs to the JSON file (atomically) and removes the run log, whose runs it now contains."""
         runs_dict = self.to_dict()
         if self.N == 0:
             return
-        dump_json_zst(runs_dict, self.path, indent=4, ensure_ascii=False)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        os.close(fd)
+        try:
+            dump_json_zst(runs_dict, tmp_path, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self._n_persisted, self._n_logged = self.N, 0
+
+    def append_to_log(self, compact_every=RUN_LOG_COMPACT_EVERY):
+        """Saves the runs added since the last save by appending one record per run to the run log, so saving a run
+        does not rewrite all earlier runs. The log is compacted into the JSON file every compact_every runs. The first
+        runs of a problem are written to the JSON file, so the problem info of every run log is on disk."""
+        if self._n_persisted is None or self._n_persisted > self.N or not os.path.exists(self.path):
+            self.save_to_file()  # runs were changed or dropped, not just added
+            return
+        for i in range(self._n_persisted, self.N):
+            append_json_zst_record(self._run_record(i), self.log_path)
+            self._n_logged += 1
+        self._n_persisted = self.N
+        if self._n_logged >= compact_every:
+            self.compact()
+
+    def compact(self):
+        """Rewrites the JSON file with all runs if the run log holds runs that are not in it yet."""
+        if self._n_logged > 0 or self._n_persisted != self.N:
+            self.save_to_file()
+
+    def _read_run_log(self, repair):
+        if not os.path.exists(self.log_path):
+            return []
+        records, valid_length = load_json_zst_records(self.log_path)
+        if repair and valid_length < os.path.getsize(self.log_path):
+            logger.warning(f"Dropping an incomplete record at the end of {self.log_path}")
+            with open(self.log_path, "r+b") as f:
+                f.truncate(valid_length)
+        return records
+
+    def _run_record(self, i):
+        """Returns the run log record of run i."""
+        return {
+            "n": i,
+            "answer": self.answers[i],
+            "correct": self.correct[i],
+            "warning": self.warnings[i],
+            "manual_overwrite": self.manual_overwrite[i],
+            "llm_annotation": self.llm_annotation[i],
+            "messages": self._ordered_conversation(self.messages[i]),
+            "judgment": self.judgment[i],
+            "history": self._ordered_history(self.history[i]),
+            "detailed_cost": self.detailed_costs[i],
+        }
+
+    def _add_record(self, record):
+        """Adds a run read from the run log."""
+        self.validate_history(record["history"])
+        self.answers.append(record["answer"])
+        self.correct.append(record["correct"])
+        self.warnings.append(record["warning"])
+        self.manual_overwrite.append(record["manual_overwrite"])
+        self.llm_annotation.append(record["llm_annotation"])
+        self.messages.append(record["messages"])
+        self.judgment.append(record["judgment"])
+        self.history.append(record["history"])
+        self.detailed_costs.append(record["detailed_cost"])
+        self.update_aggregates()
 
     def from_dict(self, runs_dict):
         """Loads the object from a dictionary.
@@ -210,36 +430,8 @@ class Runs:
         Returns:
             dict: The ordered dictionary representation of problem runs.
         """
-        ordered_messages = []
-        for i in range(self.N):
-            convo = self.messages[i]
-            ordered_convo = []
-            for block in convo:
-                block_kv = sorted(block.items(), key=lambda x: self.message_keys_zorder.get(x[0], 10))
-                ordered_convo.append(OrderedDict(block_kv))
-            ordered_messages.append(ordered_convo)
-
-        ordered_history = []
-        for i in range(self.N):
-            h = self.history[i]
-            if h is None:
-                ordered_history.append(None)
-                continue
-            ordered_h = []
-            for step in h:
-                ordered_step = OrderedDict(sorted(step.items(), key=lambda x: self.history_keys_zorder.get(x[0], 10)))
-                if "messages" not in step:
-                    import code
-
-                    code.interact(local=dict(globals(), **locals()))
-                convo = step["messages"]
-                ordered_convo = []
-                for block in convo:
-                    block_kv = sorted(block.items(), key=lambda x: self.message_keys_zorder.get(x[0], 10))
-                    ordered_convo.append(OrderedDict(block_kv))
-                ordered_step["messages"] = ordered_convo
-                ordered_h.append(ordered_step)
-            ordered_history.append(ordered_h)
+        ordered_messages = [self._ordered_conversation(self.messages[i]) for i in range(self.N)]
+        ordered_history = [self._ordered_history(self.history[i]) for i in range(self.N)]
 
         return OrderedDict(
             [
@@ -263,23 +455,30 @@ class Runs:
             ]
         )
 
+    def _ordered_conversation(self, convo):
+        ordered_convo = []
+        for block in convo:
+            block_kv = sorted(block.items(), key=lambda x: self.message_keys_zorder.get(x[0], 10))
+            ordered_convo.append(OrderedDict(block_kv))
+        return ordered_convo
+
+    def _ordered_history(self, h):
+        if h is None:
+            return None
+        ordered_h = []
+        for step in h:
+            ordered_step = OrderedDict(sorted(step.items(), key=lambda x: self.history_keys_zorder.get(x[0], 10)))
+            if "messages" not in step:
+                import code
+
+                code.interact(local=dict(globals(), **locals()))
+            ordered_step["messages"] = self._ordered_conversation(step["messages"])
+            ordered_h.append(ordered_step)
+        return ordered_h
+
     def update_aggregates(self):
         self.N = len(self.messages)
-        self.cost = {}
-        for k in ["cost", "input_tokens", "output_tokens", "time", "n_retries", "request_time"]:
-            vals = [dc.get(k, None) for dc in self.detailed_costs]
-            if any(v is None for v in vals):
-                self.cost[k] = None
-            else:
-                self.cost[k] = sum(vals)
-        if not self.is_fa:
-            self.pass_at_1 = None
-        if self.N == 0:
-            self.pass_at_1 = None
-        elif any(isinstance(c, str) for c in self.correct):
-            self.pass_at_1 = "TODO Grading"
-        else:
-            self.pass_at_1 = sum(self.correct) / self.N
+        self.cost, self.pass_at_1 = aggregate_runs(self.detailed_costs, self.correct)
 
     def add_run(self, solver_response, grader_response):
         """
@@ -2,7 +2,15 @@ from .solver_response import SolverResponse
 from .base_solver import BaseSolver
 from .base_agent import BaseAgent
 from .pure_model_solver import PureModelSolver
-from .aristotle_solver import AristotleSolver
 from .selfcheck_agent import SelfcheckAgent
 from .deepseek_math import DeepSeekMathAgent
 from .agent_pool import AgentPool
+
+
+def __getattr__(name):
+    # AristotleSolver pulls in aristotlelib, so it is only imported when used
+    if name == "AristotleSolver":
+        from .aristotle_solver import AristotleSolver
+
+        return AristotleSolver
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
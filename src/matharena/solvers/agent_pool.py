@@ -52,7 +52,7 @@ class AgentPool(BaseSolver):
         return agent.solve(prompt_text)
 
     @override
-    def solve_batch(self, stmt_batch: list[tuple[str, Any]], batch_idx_to_problem_idx: dict[int, int], batch_idx_to_run_idx: dict[int, int]):
+    def solve_batch(self, stmt_batch: list[tuple[str, Any]], batch_idx_to_problem_idx: dict[int, int], batch_idx_to_run_idx: dict[int, int], sample_indices: list[int] | None = None):
         """
         Solves a batch of problems. Handles multithreading, launching one Agent per problem.
 
@@ -60,6 +60,8 @@ class AgentPool(BaseSolver):
             stmt_batch (list[tuple[str, Any]]): A batch of problem statements as (text, image) pairs.
             batch_idx_to_problem_idx (dict[int, int]): A mapping from batch indices to original problem indices.
             batch_idx_to_run_idx (dict[int, int]): A mapping from batch indices to run indices.
+            sample_indices (list[int], optional): Which sample of its problem each batch entry is, used to key the
+                response cache so that a resumed run does not reuse the responses of the runs it already has.
 
         Yields:
             solver_response: A SolverResponse object containing the batch_index, the conversation array, detailed cost, and history for each problem.
@@ -98,7 +98,7 @@ class AristotleSolver(BaseSolver):
         return SolverResponse(idx, conversation, detailed_cost, history=None)
 
     @override
-    def solve_batch(self, stmt_batch, batch_idx_to_problem_idx, batch_idx_to_run_idx):
+    def solve_batch(self, stmt_batch, batch_idx_to_problem_idx, batch_idx_to_run_idx, sample_indices=None):
         with ThreadPoolExecutor(max_workers=self.concurrent_requests) as executor:
             futures = [
                 executor.submit(
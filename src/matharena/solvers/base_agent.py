@@ -64,7 +64,11 @@ class BaseAgent:
         start_time = time.time()
         ret = list(
             client.run_queries(
-                [query], no_tqdm=True, custom_indices=[self.batch_idx], ignore_tool_calls=ignore_tool_calls
+                [query],
+                no_tqdm=True,
+                custom_indices=[self.batch_idx],
+                ignore_tool_calls=ignore_tool_calls,
+                sample_indices=[self.run_idx],
             )
         )
         _, conversation, detailed_cost = ret[0]
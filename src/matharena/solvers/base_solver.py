@@ -21,7 +21,7 @@ class BaseSolver:
         self.last_chance_prompt = last_chance_prompt
         self.lean_environment_override = default_api_client_args.get("lean_environment_override")
 
-    def solve_batch(self, stmt_batch: list[tuple[str, Any]], batch_idx_to_problem_idx: dict[int, int], batch_idx_to_run_idx: dict[int, int]):
+    def solve_batch(self, stmt_batch: list[tuple[str, Any]], batch_idx_to_problem_idx: dict[int, int], batch_idx_to_run_idx: dict[int, int], sample_indices: list[int] | None = None):
         """
         Solves a batch of problems.
 
@@ -29,6 +29,8 @@ class BaseSolver:
             stmt_batch (list[tuple[str, Any]]): A list of problem statements (text, image) to be solved.
             batch_idx_to_problem_idx (dict[int, int]): A mapping from batch indices to original problem indices.
             batch_idx_to_run_idx (dict[int, int]): A mapping from batch indices to run indices.
+            sample_indices (list[int], optional): Which sample of its problem each batch entry is, used to key the
+                response cache so that a resumed run does not reuse the responses of the runs it already has.
 
         Yields:
             solver_response: A SolverResponse object containing the index, conversation, detailed cost, and history for each problem.
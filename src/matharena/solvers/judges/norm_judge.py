@@ -4,7 +4,7 @@ from concurrent.futures import ThreadPoolExecutor
 from matharena.api_client import APIClient
 from matharena.solvers.judges.base_judge import BaseJudge
 from matharena.utils import normalize_conversation
-from matharena.tools.code_execution import execute_code
+from matharena.plugins import get_tool_function
 
 
 class NormalizeJudge(BaseJudge):
@@ -25,7 +25,7 @@ class NormalizeJudge(BaseJudge):
             for tool_name in self.solver_config["enabled_tools"]:
                 if tool_name == "execute_code":
                     spec = self.solver_config["tool_specs"]["execute_code"]
-                    tools.append((execute_code, spec["tool_spec"]))
+                    tools.append((get_tool_function("execute_code"), spec["tool_spec"]))
             model_config["tools"] = tools
             model_config["max_tool_calls"] = self.solver_config["max_tool_calls"]
 
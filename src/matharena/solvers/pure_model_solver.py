@@ -4,6 +4,7 @@ from collections import UserDict
 from typing import Any, override
 
 from matharena.api_client import APIClient
+from matharena.image_store import image_store
 from matharena.solvers import BaseSolver, SolverResponse
 
 
@@ -40,9 +41,11 @@ class PureModelSolver(BaseSolver):
         prompt = self.default_prompt_template.format_map(_PromptFields(prompt_fields))
         if image_b64 is not None:
             # NOTE: OpenAI format, needs to be mangled inside for Gemini, Grok
+            # The image is a reference into the image store; APIClient inserts the data into the requests it sends
+            # and the conversations it returns
             content = [
                 {"type": "input_text", "text": prompt},
-                {"type": "input_image", "image_url": f"data:image/png;base64,{image_b64}", "detail": "high"},
+                {"type": "input_image", "image_url": image_store.put(image_b64), "detail": "high"},
             ]
         else:
             content = prompt
@@ -52,7 +55,7 @@ class PureModelSolver(BaseSolver):
         return [message]
 
     @override
-    def solve_batch(self, stmt_batch: list[tuple[str, Any]], batch_idx_to_problem_idx: dict[int, int], batch_idx_to_run_idx: dict[int, int]):
+    def solve_batch(self, stmt_batch: list[tuple[str, Any]], batch_idx_to_problem_idx: dict[int, int], batch_idx_to_run_idx: dict[int, int], sample_indices: list[int] | None = None):
         """
         Solves a batch of problems.
 
@@ -60,6 +63,8 @@ class PureModelSolver(BaseSolver):
             stmt_batch (list[tuple[str, Any]]): A batch of problem statements as (text, image) pairs.
             batch_idx_to_problem_idx (dict[int, int]): A mapping from batch indices to original problem indices.
             batch_idx_to_run_idx (dict[int, int]): A mapping from batch indices to run indices.
+            sample_indices (list[int], optional): Which sample of its problem each batch entry is, used to key the
+                response cache so that a resumed run does not reuse the responses of the runs it already has.
 
         Yields:
             solver_response: A SolverResponse object containing the batch_index, the conversation array, detailed cost, and history for each problem.
@@ -68,7 +73,7 @@ class PureModelSolver(BaseSolver):
         queries = []
         for text, image_b64 in stmt_batch:
             queries.append(self.build_query(text, image_b64))
-        for idx, conversation, detailed_cost in self.client.run_queries(queries):
+        for idx, conversation, detailed_cost in self.client.run_queries(queries, sample_indices=sample_indices):
             # History is None for pure model solver
             yield SolverResponse(idx, conversation, detailed_cost, history=None)
 
@@ -0,0 +1,256 @@
+"""
+Watchdog and timing metrics for API calls: records time to first token, gaps between stream events and output
+throughput, and aborts streams that received nothing for their stall timeout so the request is retried early
+instead of holding its slot until the request timeout.
+"""
+
+import asyncio
+import threading
+import time
+
+from loguru import logger
+
+from matharena.plugins import lazy_import
+
+httpx = lazy_import("httpx")
+
+WATCHDOG_INTERVAL = 0.5  # seconds between stall checks of the sync watchdog thread
+
+
+class StreamStalledError(TimeoutError):
+    """Raised when a stream received no event within its stall timeout."""
+
+
+def has_token(event):
+    """Returns whether a stream event carries generated tokens (text, reasoning or tool call deltas)."""
+    event_type = getattr(event, "type", None)
+    if isinstance(event_type, str) and event_type.endswith("_delta") or str(event_type).endswith(".delta"):
+        return True  # Anthropic messages and OpenAI responses events
+    for choice in getattr(event, "choices", None) or []:
+        delta = getattr(choice, "delta", None)
+        if any(getattr(delta, attr, None) for attr in ["content", "reasoning", "reasoning_content", "tool_calls"]):
+            return True
+    return False
+
+
+class StreamTimer:
+    """Timing of one streamed call."""
+
+    def __init__(self, stall_timeout=None):
+        """
+        Args:
+            stall_timeout (float, optional): Seconds without any event after which the stream counts as stalled.
+                Defaults to None (never).
+        """
+        self.stall_timeout = stall_timeout
+        self.started_at = time.monotonic()
+        self.first_token_at = None
+        self.last_event_at = self.started_at
+        self.max_gap = 0.0
+        self.stalled = False
+
+    def event(self, event):
+        now = time.monotonic()
+        if has_token(event):
+            if self.first_token_at is None:
+                self.first_token_at = now
+            else:
+                self.max_gap = max(self.max_gap, now - self.last_event_at)
+        self.last_event_at = now
+
+    def remaining(self):
+        """Returns the seconds left until the stream counts as stalled (None without a stall timeout)."""
+        if self.stall_timeout is None:
+            return None
+        return self.stall_timeout - (time.monotonic() - self.last_event_at)
+
+    def stalled_error(self):
+        self.stalled = True
+        return StreamStalledError(f"No stream event for {self.stall_timeout} seconds, aborting the request.")
+
+
+class _Watchdog:
+    """Background thread that closes watched sync streams once they stalled, which unblocks their reader."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watched = {}  # StreamTimer -> stream
+        self._thread = None
+
+    def watch(self, timer, stream):
+        with self._lock:
+            self._watched[timer] = stream
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stream-watchdog", daemon=True)
+                self._thread.start()
+
+    def unwatch(self, timer):
+        with self._lock:
+            self._watched.pop(timer, None)
+
+    def _run(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            with self._lock:
+                stalled = [(timer, stream) for timer, stream in self._watched.items() if timer.remaining() <= 0]
+                for timer, _ in stalled:
+                    self._watched.pop(timer)
+            for timer, stream in stalled:
+                timer.stalled = True
+                try:
+                    stream.close()
+                except Exception as e:
+                    logger.warning(f"Could not close a stalled stream: {e}")
+
+
+_watchdog = _Watchdog()
+
+
+def stream_timeout(timeout, stall_timeout):
+    """Returns the request timeout of a streamed call: with a stall timeout, every read (including the wait for the
+    response headers) times out after stall_timeout seconds, so a connection that hangs before its first byte is
+    aborted like a stalled stream."""
+    if stall_timeout is None:
+        return timeout
+    return httpx.Timeout(timeout, read=stall_timeout)
+
+
+def _is_first_byte_timeout(e, timer):
+    return (
+        timer.stall_timeout is not None
+        and timer.remaining() <= 0
+        and (isinstance(e, TimeoutError) or "Timeout" in type(e).__name__)
+    )
+
+
+def open_stream(create, timer):
+    """Starts a sync SDK stream, raising StreamStalledError if its response headers took longer than the stall timeout.
+
+    Args:
+        create (callable): Sends the request and returns the SDK stream.
+        timer (StreamTimer): The timer of the stream, started before the request is sent.
+
+    Returns:
+        The stream returned by the SDK.
+    """
+    try:
+        return create()
+    except Exception as e:
+        if _is_first_byte_timeout(e, timer):
+            raise timer.stalled_error() from e
+        raise
+
+
+async def open_stream_async(create, timer):
+    """Starts an async SDK stream, raising StreamStalledError if its response headers took longer than the stall
+    timeout.
+
+    Args:
+        create (callable): Returns the awaitable that sends the request and resolves to the SDK stream.
+        timer (StreamTimer): The timer of the stream, started before the request is sent.
+
+    Returns:
+        The async stream returned by the SDK.
+    """
+    try:
+        remaining = timer.remaining()
+        if remaining is None:
+            return await create()
+        return await asyncio.wait_for(create(), max(0.0, remaining))
+    except Exception as e:
+        if _is_first_byte_timeout(e, timer):
+            raise timer.stalled_error() from e
+        raise
+
+
+def consume_stream(stream, timer):
+    """Reads a sync SDK stream to the end, aborting it if it stalls.
+
+    Args:
+        stream: The stream returned by the SDK.
+        timer (StreamTimer): Records the timing of the stream and holds its stall timeout.
+
+    Returns:
+        list: The events of the stream.
+    """
+    if timer.stall_timeout is not None:
+        _watchdog.watch(timer, stream)
+    events = []
+    try:
+        for event in stream:
+            timer.event(event)
+            events.append(event)
+    except Exception:
+        if timer.stalled:
+            raise timer.stalled_error()
+        raise
+    finally:
+        _watchdog.unwatch(timer)
+    if timer.stalled:
+        raise timer.stalled_error()
+    return events
+
+
+async def consume_stream_async(stream, timer):
+    """Reads an async SDK stream to the end, aborting it if it stalls.
+
+    Args:
+        stream: The async stream returned by the SDK.
+        timer (StreamTimer): Records the timing of the stream and holds its stall timeout.
+
+    Returns:
+        list: The events of the stream.
+    """
+    events = []
+    iterator = stream.__aiter__()
+    while True:
+        try:
+            remaining = timer.remaining()
+            if remaining is None:
+                event = await iterator.__anext__()
+            else:
+                event = await asyncio.wait_for(iterator.__anext__(), max(0.0, remaining))
+        except StopAsyncIteration:
+            return events
+        except asyncio.TimeoutError:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+            raise timer.stalled_error()
+        timer.event(event)
+        events.append(event)
+
+
+class RequestMetrics:
+    """Timing of all API calls made for one query."""
+
+    def __init__(self):
+        self.n_calls = 0
+        self.ttft = None  # of the first streamed call
+        self.max_gap = None
+        self.generation_time = 0.0  # seconds spent generating output, i.e. after the first token for streams
+        self.output_tokens = 0
+        self.n_stalls = 0
+
+    def add_call(self, started_at, ended_at, output_tokens, timer=None):
+        """Records a finished call; timer is the StreamTimer of a streamed call."""
+        self.n_calls += 1
+        self.output_tokens += output_tokens
+        generation_start = started_at
+        if timer is not None and timer.first_token_at is not None:
+            generation_start = timer.first_token_at
+            if self.ttft is None:
+                self.ttft = timer.first_token_at - timer.started_at
+            self.max_gap = max(self.max_gap or 0.0, timer.max_gap)
+        self.generation_time += ended_at - generation_start
+
+    def summary(self):
+        """Returns the metrics reported in detailed_cost."""
+        return {
+            "ttft": round(self.ttft, 3) if self.ttft is not None else None,
+            "tokens_per_second": (
+                round(self.output_tokens / self.generation_time, 1) if self.generation_time > 0 else None
+            ),
+            "max_token_gap": round(self.max_gap, 3) if self.max_gap is not None else None,
+            "stalled_streams": self.n_stalls,
+        }
@@ -0,0 +1,127 @@
+"""
+Local prompt token counting, used to check requests against the context limit and to estimate their cost before
+they are sent. Tokenizers are loaded once per model family; without one, tokens are approximated from text length.
+"""
+
+import threading
+
+from loguru import logger
+
+from matharena.image_store import IMAGE_REF_PREFIX
+from matharena.rate_limiter import CHARS_PER_TOKEN, IMAGE_TOKENS
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separator tokens added per message
+APPROXIMATION_ERROR = 0.25  # approximate counts can be off by this fraction in either direction
+
+# Prefix of the model name (without provider path) -> tiktoken encoding
+TIKTOKEN_ENCODINGS = [
+    ("gpt-3.5", "cl100k_base"),
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("gpt-4.5", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-5", "o200k_base"),
+    ("gpt-oss", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+]
+
+
+class TokenCounter:
+    """Counts the prompt tokens of a conversation with one tokenizer, or approximately if there is none."""
+
+    def __init__(self, name, encode=None):
+        """
+        Args:
+            name (str): The tokenizer name, for logging.
+            encode (callable, optional): Maps a string to its list of token ids. Defaults to counting characters.
+        """
+        self.name = name
+        self._encode = encode
+        self.exact = encode is not None
+
+    def count_text(self, text):
+        if self._encode is None:
+            return len(text) // CHARS_PER_TOKEN
+        return len(self._encode(text))
+
+    def count(self, messages, tools=None):
+        """Counts the tokens of the messages (and tool definitions) of a request.
+
+        Args:
+            messages (list): Messages in any API format; nested content parts and images are supported.
+            tools (list, optional): Tool definitions sent with the request.
+
+        Returns:
+            int: The number of prompt tokens.
+        """
+        n_tokens = MESSAGE_OVERHEAD_TOKENS * len(messages)
+        stack = [messages, tools]
+        while len(stack) > 0:
+            value = stack.pop()
+            if isinstance(value, dict):
+                stack.extend(value.values())
+            elif isinstance(value, (list, tuple)):
+                stack.extend(value)
+            elif isinstance(value, str):
+                if value.startswith(("data:image", IMAGE_REF_PREFIX)) or (len(value) > 10000 and " " not in value):
+                    n_tokens += IMAGE_TOKENS  # base64 image payloads are billed per image, not per character
+                else:
+                    n_tokens += self.count_text(value)
+        return n_tokens
+
+    def bounds(self, n_tokens):
+        """Returns (lower, upper) bounds on the true count of a request this counter counted as n_tokens."""
+        if self.exact:
+            return n_tokens, n_tokens
+        return int(n_tokens * (1 - APPROXIMATION_ERROR)), int(n_tokens * (1 + APPROXIMATION_ERROR))
+
+
+def _tiktoken_encoding(model):
+    name = model.split("/")[-1].lower()
+    for prefix, encoding in TIKTOKEN_ENCODINGS:
+        if name.startswith(prefix):
+            return encoding
+    return None
+
+
+def _load_counter(tokenizer):
+    """Loads a TokenCounter for a tiktoken encoding or a Hugging Face tokenizer name."""
+    if tokenizer.endswith("_base"):
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(tokenizer)
+        return TokenCounter(tokenizer, lambda text: encoding.encode(text, disallowed_special=()))
+    from transformers import AutoTokenizer
+
+    hf_tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+    return TokenCounter(tokenizer, lambda text: hf_tokenizer.encode(text, add_special_tokens=False))
+
+
+_COUNTERS = {}
+_COUNTERS_LOCK = threading.Lock()
+
+
+def get_token_counter(model, tokenizer=None):
+    """Returns the process-wide token counter for a model, loading its tokenizer on first use.
+
+    Args:
+        model (str): The model name; OpenAI model families map to their tiktoken encoding.
+        tokenizer (str, optional): A tiktoken encoding (e.g. "o200k_base") or Hugging Face tokenizer to use instead.
+
+    Returns:
+        TokenCounter: The counter shared by all models of the same family. Approximate if the tokenizer is unknown
+            or could not be loaded.
+    """
+    key = tokenizer or _tiktoken_encoding(model) or "approximate"
+    with _COUNTERS_LOCK:
+        if key not in _COUNTERS:
+            counter = TokenCounter("approximate")
+            if key != "approximate":
+                try:
+                    counter = _load_counter(key)
+                except Exception as e:
+                    logger.warning(f"Could not load tokenizer {key}, approximating token counts instead: {e}")
+            _COUNTERS[key] = counter
+        return _COUNTERS[key]
@@ -0,0 +1,224 @@
+"""
+Process-wide executor for tool functions, separate from the threads and slots that wait on API requests.
+Every tool has its own worker pool (concurrency limit), optional timeout and queue metrics.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from loguru import logger
+
+DEFAULT_TOOL_CONCURRENCY = 32
+
+
+class ToolTimeoutError(TimeoutError):
+    """Raised when a tool call did not finish within the timeout of its tool."""
+
+
+class ToolExecutor:
+    """Runs tool calls on per-tool thread pools and keeps queueing and run-time statistics per tool."""
+
+    def __init__(self, default_max_workers=DEFAULT_TOOL_CONCURRENCY):
+        """
+        Args:
+            default_max_workers (int, optional): Concurrency limit of tools that were not configured.
+                Defaults to DEFAULT_TOOL_CONCURRENCY.
+        """
+        self.default_max_workers = default_max_workers
+        self._lock = threading.Lock()
+        self._limits = {}
+        self._timeouts = {}
+        self._pools = {}
+        self._stats = {}
+
+    def configure(self, tool_name, max_workers=None, timeout=None):
+        """Sets the concurrency limit and/or timeout of a tool. The limit cannot change once the tool has run.
+
+        Args:
+            tool_name (str): The name of the tool function.
+            max_workers (int, optional): How many calls of this tool may run at the same time in this process.
+            timeout (float, optional): Seconds after which a call fails with ToolTimeoutError.
+        """
+        with self._lock:
+            if max_workers is not None:
+                if tool_name in self._pools and self._limits.get(tool_name) != max_workers:
+                    logger.warning(
+                        f"Tool {tool_name} already runs with {self._limits[tool_name]} workers, "
+                        f"ignoring the new limit {max_workers}."
+                    )
+                else:
+                    self._limits[tool_name] = max_workers
+            if timeout is not None:
+                self._timeouts[tool_name] = timeout
+
+    def limit(self, tool_name):
+        """Returns the concurrency limit of a tool."""
+        with self._lock:
+            return self._limits.get(tool_name, self.default_max_workers)
+
+    def _pool(self, tool_name):
+        # Must hold self._lock
+        if tool_name not in self._pools:
+            max_workers = self._limits.setdefault(tool_name, self.default_max_workers)
+            self._pools[tool_name] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=f"tool-{tool_name}"
+            )
+            self._stats[tool_name] = {
+                "calls": 0,
+                "queued": 0,
+                "running": 0,
+                "max_queued": 0,
+                "errors": 0,
+                "timeouts": 0,
+                "wait_time": 0.0,
+                "run_time": 0.0,
+            }
+        return self._pools[tool_name]
+
+    def submit(self, tool_name, fn, *args, **kwargs):
+        """Queues a call of a tool function on the pool of the tool.
+
+        Returns:
+            concurrent.futures.Future: The future of the call.
+        """
+        submitted_at = time.monotonic()
+
+        def _run():
+            started_at = time.monotonic()
+            with self._lock:
+                stats["queued"] -= 1
+                stats["running"] += 1
+                stats["wait_time"] += started_at - submitted_at
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    stats["errors"] += 1
+                raise
+            finally:
+                with self._lock:
+                    stats["running"] -= 1
+                    stats["run_time"] += time.monotonic() - started_at
+
+        with self._lock:
+            pool = self._pool(tool_name)
+            stats = self._stats[tool_name]
+            stats["calls"] += 1
+            stats["queued"] += 1
+            stats["max_queued"] = max(stats["max_queued"], stats["queued"])
+        return pool.submit(_run)
+
+    def _cancel(self, tool_name, future):
+        with self._lock:
+            if future.cancel():  # never started
+                self._stats[tool_name]["queued"] -= 1
+
+    def _timed_out(self, tool_name, future, timeout):
+        # A call that already started keeps its worker until it returns; only its caller stops waiting
+        self._cancel(tool_name, future)
+        with self._lock:
+            self._stats[tool_name]["timeouts"] += 1
+        return ToolTimeoutError(f"Tool {tool_name} did not finish within {timeout} seconds.")
+
+    def _result(self, tool_name, future, deadline):
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if not future.done():
+                raise self._timed_out(tool_name, future, self._timeouts.get(tool_name))
+            raise
+
+    def _deadline(self, tool_name):
+        timeout = self._timeouts.get(tool_name)
+        return None if timeout is None else time.monotonic() + timeout
+
+    def run(self, tool_name, fn, *args, **kwargs):
+        """Runs a tool call on the pool of the tool and blocks until it finished or timed out.
+
+        Returns:
+            The return value of fn.
+        """
+        deadline = self._deadline(tool_name)
+        return self._result(tool_name, self.submit(tool_name, fn, *args, **kwargs), deadline)
+
+    def run_many(self, calls, max_parallel=8):
+        """Runs several tool calls concurrently and blocks until all finished or timed out.
+
+        Args:
+            calls (list[tuple]): (tool_name, fn, args) triples.
+            max_parallel (int, optional): How many of these calls run at the same time. Defaults to 8.
+
+        Returns:
+            list: The return value of each call, in order; a call that raised gives its exception instead.
+        """
+        max_parallel = max(1, max_parallel)
+        results = []
+        for start in range(0, len(calls), max_parallel):
+            window = []
+            for tool_name, fn, args in calls[start : start + max_parallel]:
+                window.append((tool_name, self._deadline(tool_name), self.submit(tool_name, fn, *args)))
+            for tool_name, deadline, future in window:
+                try:
+                    results.append(self._result(tool_name, future, deadline))
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    async def run_async(self, tool_name, fn, *args, **kwargs):
+        """Runs a tool call on the pool of the tool without blocking the event loop.
+
+        Returns:
+            The return value of fn.
+        """
+        future = self.submit(tool_name, fn, *args, **kwargs)
+        timeout = self._timeouts.get(tool_name)
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                raise self._timed_out(tool_name, future, timeout)
+            raise
+        except asyncio.CancelledError:
+            self._cancel(tool_name, future)
+            raise
+
+    async def run_many_async(self, calls, max_parallel=8):
+        """Runs several tool calls concurrently without blocking the event loop.
+
+        Args:
+            calls (list[tuple]): (tool_name, fn, args) triples.
+            max_parallel (int, optional): How many of these calls run at the same time. Defaults to 8.
+
+        Returns:
+            list: The return value of each call, in order; a call that raised gives its exception instead.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+        async def _run_one(tool_name, fn, args):
+            async with semaphore:
+                try:
+                    return await self.run_async(tool_name, fn, *args)
+                except Exception as e:
+                    return e
+
+        return await asyncio.gather(*[_run_one(tool_name, fn, args) for tool_name, fn, args in calls])
+
+    def stats(self):
+        """Returns per-tool call counts, current queue/running sizes, timeouts and the mean wait and run times."""
+        with self._lock:
+            summary = {}
+            for tool_name, stats in self._stats.items():
+                summary[tool_name] = {
+                    "limit": self._limits[tool_name],
+                    **{k: v for k, v in stats.items() if k not in ["wait_time", "run_time"]},
+                    "mean_wait": round(stats["wait_time"] / max(1, stats["calls"]), 2),
+                    "mean_run": round(stats["run_time"] / max(1, stats["calls"]), 2),
+                }
+            return summary
+
+
+tool_executor = ToolExecutor()
@@ -0,0 +1,263 @@
+"""
+Lease-based work queue that lets several run.py processes, on one or more hosts, share one sweep. The queue is a
+directory on a filesystem all workers see, with one subdirectory per (competition, model, problem) holding the plan of
+that problem's run slots, a lease file per slot being worked on and a done file per finished slot. Workers claim
+slots under a lock on the problem's directory, renew their leases from a heartbeat thread, and take over slots whose
+lease expired (e.g. because the worker died). Lease expiry compares wall clocks, so hosts need synchronized clocks.
+"""
+
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from loguru import logger
+
+DEFAULT_LEASE_SECONDS = 600  # a lease not renewed for this long can be taken over by another worker
+DEFAULT_CLAIM_SIZE = 64  # run slots a worker claims per competition and model at a time
+MAX_ATTEMPTS = 3  # slots that failed this many times are given up
+
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """Holds an exclusive lock on path across threads, processes and (with POSIX locks on the shared filesystem, e.g.
+    NFS) hosts. The file is created if it does not exist."""
+    with _thread_locks_lock:
+        thread_lock = _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+    # POSIX locks belong to the process, so threads are serialized first; this also guarantees no other thread closes
+    # a descriptor of the file (which would drop the lock) while it is held
+    with thread_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    # Only written while holding the problem's lock, so a fixed temporary name is safe
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class WorkQueue:
+    """Claims, renews, completes and releases the run slots of one worker."""
+
+    def __init__(self, queue_dir, worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS, claim_size=DEFAULT_CLAIM_SIZE):
+        """
+        Args:
+            queue_dir (str): The queue directory, shared by all workers of the sweep.
+            worker_id (str, optional): Name of this worker in the leases and response journals; a worker restarted
+                with the same name takes back its leases and replays its journal. Defaults to host, process id and a
+                random suffix, which is new on every start.
+            lease_seconds (float, optional): Seconds after the last renewal after which a lease expires. Leases are
+                renewed every third of that. Defaults to DEFAULT_LEASE_SECONDS.
+            claim_size (int, optional): Slots claimed per competition and model at a time. Defaults to
+                DEFAULT_CLAIM_SIZE.
+        """
+        self.queue_dir = queue_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.claim_size = claim_size
+        self._lock = threading.Lock()
+        self._held = {}  # problem directory -> set of slots leased by this worker
+        self._thread = None
+
+    def _problem_dir(self, comp_name, solver_name, problem_idx):
+        return os.path.join(self.queue_dir, comp_name, solver_name, str(problem_idx))
+
+    @contextmanager
+    def _locked(self, problem_dir):
+        with file_lock(os.path.join(problem_dir, "lock")):
+            yield
+
+    def _lease(self):
+        return {"worker": self.worker_id, "expires_at": time.time() + self.lease_seconds}
+
+    def claim(self, comp_name, solver_name, problem_idx, n_existing, n_target, limit):
+        """Claims up to limit open run slots of a problem.
+
+        The first worker to see a problem plans its slots: n_existing..n_target-1, so runs that existed before the
+        sweep count as done. Slots are open if they are not done, not given up and not leased (or the lease expired).
+
+        Args:
+            comp_name (str): The competition.
+            solver_name (str): The model config.
+            problem_idx (int): The problem.
+            n_existing (int): Runs of the problem in its output file.
+            n_target (int): Runs per problem of the sweep.
+            limit (int): Maximum number of slots to claim (0 only plans the problem).
+
+        Returns:
+            list[int]: The claimed slots.
+        """
+        problem_dir = self._problem_dir(comp_name, solver_name, problem_idx)
+        claimed = []
+        with self._locked(problem_dir):
+            plan_path = os.path.join(problem_dir, "plan.json")
+            plan = _read_json(plan_path)
+            if plan is None:
+                plan = {"first_slot": n_existing, "n_target": n_target, "failures": {}}
+                _write_json(plan_path, plan)
+            elif plan["n_target"] != n_target:
+                plan["n_target"] = n_target  # e.g. a later sweep with a larger --n
+                _write_json(plan_path, plan)
+            held = set(self.held(comp_name, solver_name, problem_idx))
+            for slot in range(plan["first_slot"], plan["n_target"]):
+                if len(claimed) >= limit:
+                    break
+                if slot in held or plan["failures"].get(str(slot), 0) >= MAX_ATTEMPTS:
+                    continue
+                if self._try_lease(problem_dir, slot) == "claimed":
+                    claimed.append(slot)
+        self._hold(problem_dir, claimed)
+        return claimed
+
+    def claim_slot(self, comp_name, solver_name, problem_idx, slot):
+        """Claims one given run slot, e.g. to save a response of it journaled before a crash.
+
+        Returns:
+            str: "claimed", "done" if the slot is finished, or "leased" if another worker holds it.
+        """
+        problem_dir = self._problem_dir(comp_name, solver_name, problem_idx)
+        with self._locked(problem_dir):
+            status = self._try_lease(problem_dir, slot)
+        if status == "claimed":
+            self._hold(problem_dir, [slot])
+        return status
+
+    def _try_lease(self, problem_dir, slot):
+        # Must hold the problem's lock
+        if os.path.exists(os.path.join(problem_dir, f"{slot}.done")):
+            return "done"
+        lease_path = os.path.join(problem_dir, f"{slot}.lease")
+        lease = _read_json(lease_path)
+        if lease is not None and lease["worker"] != self.worker_id and lease["expires_at"] > time.time():
+            return "leased"
+        if lease is not None and lease["worker"] != self.worker_id:
+            logger.info(f"Taking over run slot {slot} of {problem_dir} from {lease['worker']} (lease expired).")
+        _write_json(lease_path, self._lease())
+        return "claimed"
+
+    def _hold(self, problem_dir, slots):
+        if len(slots) == 0:
+            return
+        with self._lock:
+            self._held.setdefault(problem_dir, set()).update(slots)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._heartbeat, name="work-queue", daemon=True)
+                self._thread.start()
+
+    @contextmanager
+    def completing(self, comp_name, solver_name, problem_idx, slot):
+        """Context for saving the run of a claimed slot: yields whether the run should be saved (False if another
+        worker already finished the slot after taking it over) and marks the slot done if the body succeeds. The
+        problem stays locked meanwhile, so no other worker can finish the slot at the same time."""
+        problem_dir = self._problem_dir(comp_name, solver_name, problem_idx)
+        with self._locked(problem_dir):
+            done_path = os.path.join(problem_dir, f"{slot}.done")
+            if os.path.exists(done_path):
+                logger.warning(f"Run slot {slot} of {problem_dir} was finished by another worker, dropping this run.")
+                self._forget(problem_dir, slot)
+                yield False
+                return
+            yield True
+            _write_json(done_path, {"worker": self.worker_id, "finished_at": time.time()})
+            self._remove_own_lease(problem_dir, slot)
+            self._forget(problem_dir, slot)
+
+    def release(self, comp_name, solver_name, problem_idx, slots, failed=False):
+        """Gives up claimed slots (e.g. at the end of a round) so any worker can claim them again.
+
+        Args:
+            failed (bool, optional): Whether the runs failed; slots that failed MAX_ATTEMPTS times are not claimed
+                again. Defaults to False.
+        """
+        problem_dir = self._problem_dir(comp_name, solver_name, problem_idx)
+        with self._locked(problem_dir):
+            if failed:
+                plan_path = os.path.join(problem_dir, "plan.json")
+                plan = _read_json(plan_path)
+                for slot in slots:
+                    plan["failures"][str(slot)] = plan["failures"].get(str(slot), 0) + 1
+                    if plan["failures"][str(slot)] >= MAX_ATTEMPTS:
+                        logger.warning(f"Run slot {slot} of {problem_dir} failed {MAX_ATTEMPTS} times, giving up.")
+                _write_json(plan_path, plan)
+            for slot in slots:
+                self._remove_own_lease(problem_dir, slot)
+                self._forget(problem_dir, slot)
+
+    def held(self, comp_name, solver_name, problem_idx):
+        """Returns the slots of a problem currently leased by this worker."""
+        with self._lock:
+            return sorted(self._held.get(self._problem_dir(comp_name, solver_name, problem_idx), set()))
+
+    def outstanding(self, comp_name, solver_name):
+        """Returns the number of planned slots of a competition and model that are neither done nor given up."""
+        n_outstanding = 0
+        solver_dir = os.path.join(self.queue_dir, comp_name, solver_name)
+        if not os.path.isdir(solver_dir):
+            return 0
+        for name in os.listdir(solver_dir):
+            problem_dir = os.path.join(solver_dir, name)
+            plan = _read_json(os.path.join(problem_dir, "plan.json"))
+            if plan is None:
+                continue
+            for slot in range(plan["first_slot"], plan["n_target"]):
+                if plan["failures"].get(str(slot), 0) >= MAX_ATTEMPTS:
+                    continue
+                if not os.path.exists(os.path.join(problem_dir, f"{slot}.done")):
+                    n_outstanding += 1
+        return n_outstanding
+
+    def _remove_own_lease(self, problem_dir, slot):
+        # Must hold the problem's lock
+        lease_path = os.path.join(problem_dir, f"{slot}.lease")
+        lease = _read_json(lease_path)
+        if lease is not None and lease["worker"] == self.worker_id:
+            os.remove(lease_path)
+
+    def _forget(self, problem_dir, slot):
+        with self._lock:
+            self._held.get(problem_dir, set()).discard(slot)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._lock:
+                held = {problem_dir: set(slots) for problem_dir, slots in self._held.items() if len(slots) > 0}
+            for problem_dir, slots in held.items():
+                try:
+                    self._renew(problem_dir, slots)
+                except Exception as e:
+                    logger.warning(f"Could not renew the leases in {problem_dir}: {e}")
+
+    def _renew(self, problem_dir, slots):
+        with self._locked(problem_dir):
+            for slot in slots:
+                lease_path = os.path.join(problem_dir, f"{slot}.lease")
+                lease = _read_json(lease_path)
+                if lease is None or lease["worker"] != self.worker_id:
+                    # Taken over after this worker missed renewals; its run is dropped if the other worker finishes
+                    logger.warning(f"Lost the lease of run slot {slot} in {problem_dir}.")
+                    self._forget(problem_dir, slot)
+                    continue
+                _write_json(lease_path, self._lease())
@@ -0,0 +1,43 @@
+"""
+Checks that importing the matharena entry points stays fast and loads no provider SDK or tool dependency before a
+config uses it (see scripts/benchmark/import_time.py).
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME_SCRIPT = os.path.join(REPO_ROOT, "scripts", "benchmark", "import_time.py")
+MAX_SECONDS = 3.0
+
+HEAVY_DEPENDENCIES = [
+    "anthropic",
+    "openai",
+    "together",
+    "transformers",
+    "vllm",
+    "docker",
+    "modal",
+    "fitz",
+    "lean_explore",
+]
+
+
+@pytest.mark.parametrize("module", ["matharena.runner", "matharena.api_client"])
+def test_import_time(module):
+    process = subprocess.run(
+        [sys.executable, IMPORT_TIME_SCRIPT, "--modules", module, "--max-seconds", str(MAX_SECONDS)],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    report = json.loads(process.stdout)
+    assert module in report, f"Could not import {module}:\n{process.stderr}"
+    eager = [dep for dep in HEAVY_DEPENDENCIES if dep in report[module]["eager_dependencies"]]
+    assert eager == [], f"{module} imports {', '.join(eager)} at module load"
+    assert report[module]["seconds"] <= MAX_SECONDS, f"Importing {module} took {report[module]['seconds']}s"
+    assert process.returncode == 0, process.stderr